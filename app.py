@@ -1,21 +1,42 @@
 #!usr/bin/env python
+import time
+
+# taken before any other import, for the startup times --profile reports
+STARTED = time.perf_counter()
+
+import argparse
+import atexit
+import json
+import os
+import sys
 import pymysql
 import getpass as gp
 
-# variables for state management
-nuid = -1
-global_flag = True
-not_connected_to_db = True
-validated_flag = False
-counter = 0
+from booking_service import BookingService, BookingError, parse_date, weekly_slots
+from db import format_db_error
+
+IMPORT_SECONDS = time.perf_counter() - STARTED
 
-# CRUD functions, and various other helper functions
+# Command line front end for the booking service
+# All database work lives in booking_service.BookingService, this module only handles prompting and printing
 
-# Utility function to check that an UPDATE, INSERT or DELETE operation was successful
-# Returns True if the procedure updates the rows needed, False otherwise
-def check_rows_affected(cur) -> bool:
-    affected_rows = cur.rowcount
-    return affected_rows > 0
+# rooms shown per page when searching
+ROOMS_PAGE_SIZE = 10
+
+# functions timed as phases in --profile mode, by phase name
+PROFILE_PHASES = {'connect': 'connect_service',
+                  'validate_nuid': 'sign_in',
+                  'view_bookings': 'show_bookings',
+                  'update_booking': 'update_booking_menu',
+                  'create_booking': 'create_booking_menu',
+                  'delete_booking': 'delete_booking_menu',
+                  'sign_into_booking': 'sign_into_booking_menu',
+                  'add_club': 'add_club_menu',
+                  'print_user_bookings': 'print_user_bookings',
+                  'print_available_rooms': 'print_available_rooms',
+                  'print_available_timeslots': 'print_available_timeslots',
+                  'print_suggestions': 'print_suggestions',
+                  'print_batch_results': 'print_batch_results'}
 
 
 # Convert yes/no responses to boolean values
@@ -23,291 +44,24 @@ def yn_to_bool(choice: str) -> bool:
     return choice.lower() == 'yes'
 
 
-# Creates an entry in the student table
-# Returns 0 if the student was successfully added, -1 otherwise
-def create_user(cxn, nuid: int, name: str) -> int:
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure create_user
-        try:
-            cur.callproc('create_user', [name, nuid])
-        except:
-            print("Error creating user. Please try again.\n")
-            cxn.rollback()
-
-        # we check rows affected to make sure insert worked (or not)
-        if check_rows_affected(cur):
-            # commit change
-            cxn.commit()
-            cur.close()
-            return 0
-        else:
-            print("Error in creating user.\n")
-            return -1
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
-
-
-# Add a club association 
-# Returns 0 if the student was successfully added, -1 otherwise
-def add_club_officer(cxn, nuid: int, club_name: str) -> int: 
-    try:
-        # create cursor
-        cur = cxn.cursor()
-
-        # call DB procedure add_club_officer
-        try:
-            cur.callproc('add_club_officer', [nuid, club_name])
-        except:
-            # because apparently, you can't add a new user and then add a club to them within the same session...
-            print("Error adding club association. Please try again.\n")
-            cxn.rollback()
-
-        # we check rows affected
-        if check_rows_affected(cur):
-            # commit change
-            cxn.commit()
-            cur.close()
-            return 0
-        else:
-            print("Error in updating club association.\n")
-            return -1
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
-
-
-# Validate a user's entered NUID
-# Returns True if the user's NUID is in the data, False otherwise
-def validate_nuid(cxn, nuid: int) -> bool:
-    res_rows = []
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure validate_student
-        cur.callproc('validate_student', [nuid])
-        res_rows = cur.fetchall()
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-    # If we return no rows, student doesn't exist
-    return len(res_rows) > 0
-
-
-# Validates a user's entered booking number
-# Returns True if the booking exists for the given student, False otherwise
-def validate_booking_num(cxn, booking_num: int) -> bool:
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure to check if booking num in user's list of bookings
-        cur.callproc('validate_booking_num', [booking_num])
-        cxn.commit()
-        affected_rows = cur.rowcount
-        cur.close()
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-    return affected_rows > 0
-    
-
-# Returns a list of the bookings associated with their NUID that they signed in with
-def view_bookings(cxn) -> list:
-    returned_rows = []
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure get_user_bookings
-        cur.callproc('get_user_bookings', [nuid])
-        returned_rows = cur.fetchall()
-        cur.close()
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-    return returned_rows
-
-# Returns a list of the other available days/timeslots for a given room, based on the booking number
-# originally provided by the user
-def display_other_bookings(cxn, booking_num: int) -> list:
-    returned_rows = []
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure display_other_times
-        cur.callproc('display_other_times', [booking_num])
-        returned_rows = cur.fetchmany(size=15)
-        cur.close()
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-    return returned_rows
-
-# Updates a user's booking based on the criteria entered (either update date, time, or both)
-# Returns 0 upon success of operation, and -1 on error
-def update_booking(cxn, booking_num: int, date: str, timeslot: int) -> int:
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # validate booking number, exit if error
-        if validate_booking_num(cxn, booking_num) is False:
-            print("Error: Could not validate booking number %s\n" % (booking_num))
-            return -1
-        # Otherwise, the booking exists for the user, and we can proceed
-        # call DB procedure to update booking based on parameters
-        if date is None:
-            # we're only updating the timeslot, same date
-            try:
-                cur.callproc('update_booking', [booking_num, date, timeslot])
-            except:
-                print("Error updating. Please try again.\n")
-                cxn.rollback()
-
-            # we check affected row counts to make sure update worked
-            if check_rows_affected(cur):
-                # commit change
-                cxn.commit()
-                cur.close()
-                return 0
-            else:
-                print("Error in updating the timeslot.\n")
-                return -1
-        elif timeslot is None:
-            # we're only updating the date, same timeslot
-            try:
-                cur.callproc('update_booking', [booking_num, date, timeslot])
-            except:
-                print("Error updating. Please try again.\n")
-                cxn.rollback()
-            
-            if check_rows_affected(cur):
-                # commit change
-                cxn.commit()
-                cur.close()
-                return 0
-            else:
-                print("Error in updating the date.\n")
-                return -1
-        else:
-            # we are updating both
-            try:
-                cur.callproc('update_booking', [booking_num, date, timeslot])
-            except:
-                print("Error updating. Please try again.\n")
-                cxn.rollback()
-
-            if check_rows_affected(cur):
-                cxn.commit()
-                cur.close()
-                return 0
-            else:
-                print("Error in updating either time/date of booking.\n")
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
-    
-
-# Returns a list of rooms that match a user's criteria (capacity, start time, date, projector, club association)
-def find_rooms_with_criteria(cxn, args: list) -> list:
-    returned_rows = []
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure to find_rooms_with_criteria
-        cur.callproc('find_room_with_criteria', args)
-        # For simplicity sake, we only return 10 rows, otherwise it clutters everything up
-        returned_rows = cur.fetchmany(size=10)
-        cur.close()
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-    return returned_rows
-
-
-# Creates a booking for the user
-# Returns 0 on success, or -1 on error
-def create_booking(cxn, args: list) -> int: 
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # call DB procedure create_booking
-        try:
-            cur.callproc('create_booking', args)
-        except:
-            print("Error in creating booking. Please try again.\n")
-            cxn.rollback()
-
-        if check_rows_affected(cur):
-            # commit change
-            cxn.commit()
-            cur.close()
-            return 0
-        else:
-            print("Error: Could not create booking.\n")
-            return -1
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
-
-
-# Deletes a booking for a user, provided it exists
-# Returns 0 on success, and -1 on error
-def delete_booking(cxn, booking_num: int) -> int:
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # validate booking num first
-        if validate_booking_num(cxn, booking_num) is False:
-            return -1
-        # call DB procedure delete_booking
-        try:
-            cur.callproc('delete_booking', [booking_num])
-        except:
-            print("Error in deleting booking. Please try again.\n")
-            cxn.rollback()
-
-        if check_rows_affected(cur):
-            # commit change
-            cxn.commit()
-            cur.close()
-            return 0
-        else:
-            print("Error: Could not delete booking.\n")
-            return -1
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
+# Convert an optional numeric response to an int, empty input means "no change"
+def optional_int(choice: str):
+    choice = choice.strip()
+    return int(choice) if choice != '' else None
 
 
-# Signs a user into one of their bookings, letting them also specify room condition
-# Returns 0 on success, and -1 on error
-def sign_into_booking(cxn, booking_num: int) -> int:
-    try:
-        # create cursor
-        cur = cxn.cursor()
-        # validate booking number first
-        if validate_booking_num(cxn, booking_num) is False:
-            return -1
-
-        # call DB procedure check_into_room
+# Prompts until the answer is a date in YYYY-MM-DD format
+# Returns the date, or None for a blank answer when blank is allowed
+def input_date(prompt: str, allow_blank: bool = True):
+    while True:
         try:
-            cur.callproc('check_into_room', [booking_num, nuid])
-        except:
-            print("Error signing into booking. Please try again.\n")
-            cxn.rollback()
-
-        if check_rows_affected(cur):
-            # commit change
-            cxn.commit()
-            cur.close()
-            return 0
+            day = parse_date(input(prompt))
+        except ValueError:
+            day = None
         else:
-            print("Error: You've already signed into this booking!\n")
-            return -1
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        return -1
-
-
-# Sign out of the application (aka close DB connection)
-def sign_out(cxn) -> None:
-    cxn.close()
+            if day is not None or allow_blank:
+                return day
+        print("Please enter the date in YYYY-MM-DD format, e.g. 2026-11-20.\n")
 
 
 # Prints the menu of available choices to the user
@@ -320,53 +74,102 @@ def print_menu() -> None:
     print("6: Add club association\n")
     print("7: Sign out")
 
-# Given a list of a user's bookings, prints them out for the user to see
-def print_user_bookings(records: list) -> None:
-    for row in records:
-        date_string = row["date"].strftime('%m/%d/%Y')
-        time_string = str(row["start_hour"]) + ':00'
-        print('Booking ID:', str(row["booking_id"]), '\n', row["building_name"], 'Room', str(row["room_number"]), 'starting at', time_string, 'on', date_string, 'for club', str(row["organization_name"]))
+# Formats a date as MM/DD/YYYY, cheaper than strftime when done for every row of a listing
+def format_date(day) -> str:
+    return '%02d/%02d/%d' % (day.month, day.day, day.year)
 
 
-# Given a list of available rooms, prints them out for the user
-def print_available_rooms(records: list) -> None:
-    for row in records:
-        formatted_string = row["building"] + ' Room ' + str(row["room_number"]) + ', Capacity: ' + str(row["capacity"])
-        print(formatted_string)
+# Writes the lines of a listing to stdout in one buffered write, rather than a print per row
+def write_lines(lines: list) -> None:
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
+# Given a list of a user's bookings, prints them out for the user to see
+def print_user_bookings(records: list) -> None:
+    write_lines(['Booking ID: %s \n %s Room %s starting at %s:00 on %s for club %s'
+                 % (row["booking_id"], row["building_name"], row["room_number"], row["start_hour"],
+                    format_date(row["date"]), row["organization_name"])
+                 for row in records])
 
-# Given a list of available time slots, prints them out for the user
-def print_available_timeslots(records: list) -> None:
-    for row in records:
-        formatted_string = row["building_name"] + ' Room ' + str(row["room_number"]) + ' starting at ' + str(row["start_hour"]) + ':00'
-        print(formatted_string)
 
+# Given a list of suggestions from suggest_rooms, prints them out numbered from 1 for the user
+def print_suggestions(records: list) -> None:
+    write_lines(['%d: %s Room %s, Capacity: %s, at %s:00 on %s (differs in: %s)'
+                 % (i, row["building"], row["room_number"], row["capacity"], row["start_hour"],
+                    format_date(row["date"]), ', '.join(row["relaxed"]) or 'nothing')
+                 for i, row in enumerate(records, 1)])
 
-# Main loop:
-# Prompt connection to DB
-username = input("Enter DB username: \n")
-password = gp.getpass("Enter DB password: \n")
 
-while(not_connected_to_db):
-    try:
-        cxn = pymysql.connect(host='localhost', 
-                            user=username,
-                            password=password,
-                            database='final_project',
-                            charset='utf8mb4',
-                            cursorclass=pymysql.cursors.DictCursor)
-        not_connected_to_db = False
-        break
-    except pymysql.err.OperationalError as e:
-        print('Error: %d: %s' % (e.args[0], e.args[1]))
-        print("Credentials incorrect. Please try again.\n")
-        username = input("Enter username for DB connection: \n")
-        password = gp.getpass("Enter DB password: \n")
-        continue
-
-
-# Connect to DB
-while(global_flag):
-    while(not validated_flag):
+# Given a list of available rooms, prints them out for the user
+def print_available_rooms(records: list) -> None:
+    write_lines(['%s Room %s, Capacity: %s' % (row["building"], row["room_number"], row["capacity"])
+                 for row in records])
+
+# Given a room and its free (date, start_hour) slots from free_times, prints them out for the user
+def print_available_timeslots(building_name: str, room_number: int, slots: list) -> None:
+    room = '%s Room %s on ' % (building_name, room_number)
+    write_lines(['%s%s starting at %s:00' % (room, format_date(date), start_hour) for date, start_hour in slots])
+
+
+# Given the per-slot results of a batch booking, prints what happened to each slot
+def print_batch_results(records: list) -> None:
+    write_lines(['%s %s:00: %s%s' % (format_date(row["date"]), row["start_hour"], row["status"],
+                                     '' if row["booking_id"] is None else ' (booking %s)' % row["booking_id"])
+                 for row in records])
+
+
+# Prompts for DB credentials until a connection can be made
+# With FINAL_PROJECT_SQLITE set to a directory of generated CSVs, runs on an embedded SQLite copy of them
+# instead, no server or credentials needed (the copy is deleted on exit)
+# Returns a BookingService backed by a connection pool
+def connect_service() -> BookingService:
+    data_dir = os.environ.get('FINAL_PROJECT_SQLITE')
+    if data_dir:
+        from sqlite_backend import SQLiteBackend
+        backend = SQLiteBackend(data_dir=data_dir)
+        atexit.register(backend.close)
+        return BookingService(backend.pool())
+
+    username = input("Enter DB username: \n")
+    password = gp.getpass("Enter DB password: \n")
+
+    while True:
+        try:
+            return BookingService.connect(host='localhost', user=username, password=password)
+        except pymysql.err.OperationalError as e:
+            print(format_db_error(e))
+            print("Credentials incorrect. Please try again.\n")
+            username = input("Enter username for DB connection: \n")
+            password = gp.getpass("Enter DB password: \n")
+
+
+# Times every stored procedure call if FINAL_PROJECT_SQL_LOG (a file to log each call to, as JSON lines)
+# or FINAL_PROJECT_METRICS (a file to write the metrics to on sign out) is set; FINAL_PROJECT_SERVER_TIMING=1
+# also reads server side execution times from the performance schema
+# always starts it regardless (--profile needs the stored procedure times)
+# Returns the Instrumentation, or None when it is off
+def start_instrumentation(service: BookingService, always: bool = False):
+    log_path = os.environ.get('FINAL_PROJECT_SQL_LOG')
+    if not log_path and not os.environ.get('FINAL_PROJECT_METRICS') and not always:
+        return None
+    # imported only when needed, logging is a noticeable part of the startup time otherwise
+    import logging
+    import instrumentation
+    if log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        instrumentation.logger.addHandler(handler)
+        instrumentation.logger.setLevel(logging.INFO)
+    timing = instrumentation.Instrumentation(server_timing=os.environ.get('FINAL_PROJECT_SERVER_TIMING') == '1')
+    service.pool.instrumentation = timing
+    return timing
+
+
+# Registers or signs in a user, exits the program if the NUID cannot be validated
+def sign_in(service: BookingService) -> None:
+    counter = 0
+    while service.nuid is None:
         if counter >= 1:
             choice = input("Choose 2 to confirm NUID.\n")
         else:
@@ -378,184 +181,297 @@ while(global_flag):
             user_nuid = input("Please enter your NUID:\n")
             user_name = input("Please enter your full name:\n")
 
-            if create_user(cxn, int(user_nuid), user_name) == 0:
-                print("User was successfully added.\n")
-                cxn.close()
-
-                # not connected to DB anymore
-                not_connected_to_db = True
-                # use old creds to re-open connection, hopefully will see new user
-                try:
-                    cxn = pymysql.connect(host='localhost', 
-                        user=username,
-                        password=password,
-                        database='final_project',
-                        charset='utf8mb4',
-                        cursorclass=pymysql.cursors.DictCursor)
-                    not_connected_to_db = True
-                    counter += 1
-                except pymysql.err.OperationalError as e:
-                    print('Error: %d: %s' % (e.args[0], e.args[1]))
-            else:
+            try:
+                service.register(int(user_nuid), user_name)
+            except BookingError as e:
+                print(e)
                 print("Error: could not register.\n")
                 exit(1)
+            print("User was successfully added.\n")
+            counter += 1
         elif choice == '2':
             # sign in, prompt for NUID
-            nuid = input("Please enter your NUID: \n")
+            user_nuid = input("Please enter your NUID: \n")
 
-            if validate_nuid(cxn, nuid) is False:
-                print("Error: could not validate NUID %s.\n" % (nuid))
+            if service.sign_in(int(user_nuid)) is False:
+                print("Error: could not validate NUID %s.\n" % (user_nuid))
                 exit(1)
-            validated_flag = True
         print("Signed in successfully.\n")
 
-    # Successfully validated with NUID, so we can print menu
-    print("------------------------\n")
-    print_menu()
-    print("------------------------\n")
-    menu_item = input("Select the number of the operation you want to do: \n")
 
-    # View bookings
-    if menu_item == '1':
-        bookings = view_bookings(cxn)
-        print("Your bookings: \n")
+# Shows the user their bookings, returns them (possibly empty)
+def show_bookings(service: BookingService) -> list:
+    print("Your bookings: \n")
+    bookings = service.get_bookings()
+    if len(bookings) != 0:
         print_user_bookings(bookings)
+    else:
+        print("You don't have any bookings yet!\n")
+    return bookings
+
+
+# Menu option 2
+def update_booking_menu(service: BookingService) -> None:
+    bookings = show_bookings(service)
+    if len(bookings) == 0:
+        return
+
+    # Select booking number
+    booking_num = int(input("Select booking number to update: \n"))
+
+    # the user's bookings were just listed, so the number can be checked without another round trip
+    listed = [row for row in bookings if row["booking_id"] == booking_num]
+    if len(listed) == 0:
+        print("Error: Could not validate booking num.\n")
+        return
+
+    # show user available timeslots for that room, a week at a time
+    from_date = input_date("Show free times for the week starting on (YYYY-MM-DD, blank for the booking's date): \n")
+    other_available_slots = service.free_times(booking_num, from_date)
+    if len(other_available_slots) != 0:
+        print_available_timeslots(listed[0]["building_name"], listed[0]["room_number"], other_available_slots)
+    else:
+        print("No other free times that week.\n")
 
-    # Update booking
-    elif menu_item == '2':
-        # Show user their bookings
-        print("Your bookings: \n")
-        bookings = view_bookings(cxn)
-
-        if len(bookings) != 0:
-            print_user_bookings(bookings)
-
-            # Select booking number
-            booking_num = input("Select booking number to update: \n")
+    # Get new day and time from user, could be None
+    new_day = input_date("New day in YYYY-MM-DD format: \n")
+    new_time = optional_int(input("New start hour of booking, from 0 - 23: \n"))
 
-            # show user available timeslots for that room
-            if validate_booking_num(cxn, int(booking_num)) == 0:
-                print("Error: Could not validate booking num.\n")
+    # Update booking based on inputs
+    try:
+        # refused if the booking changed after it was listed above
+        if service.update_booking(booking_num, new_day, new_time, listed[0]["version"]):
+            print("Successfully updated booking %s.\n" % (booking_num))
+        else:
+            print("Booking %s is already at that day and time, nothing to update.\n" % (booking_num))
+    except BookingError as e:
+        print(e)
+        print("Error updating booking %s.\n" % (booking_num))
+
+
+# Menu option 3
+def create_booking_menu(service: BookingService) -> None:
+    # Tell user what things they can select
+    print("Please provide answers to the following booking criteria: room capacity, ADA compliancy, desired starting hour of reservation, desired date of reservation, projector, if this booking is associated with a club, and desired campus.\n")
+
+    capacity = input("Capacity: \n")
+    ada_compliant = input("Do you want an ADA compliant room? \n")
+    start_hr = input("Starting hour, from 0-23: \n")
+    day = input_date("Date, in YYYY-MM-DD format: \n", allow_blank=False)
+    projector = input("Projector? \n")
+    club_affiliation = input("Is this booking associated with a club? \n")
+    campus = input("Campus of desired room:\n")
+    if not service.reference.is_valid_campus(campus):
+        print("Unknown campus %s. Campuses are: %s.\n" % (campus, ', '.join(service.reference.campuses())))
+        return
+
+    # find rooms that match entered criteria, a page at a time
+    found_any = False
+    try:
+        for page in service.find_rooms_pages(int(capacity), yn_to_bool(ada_compliant), int(start_hr), day,
+                                             yn_to_bool(projector), yn_to_bool(club_affiliation), campus,
+                                             page_size=ROOMS_PAGE_SIZE):
+            # Show user available options
+            if not found_any:
+                print("Available options: \n")
+                found_any = True
+            print_available_rooms(page)
+            if len(page) < ROOMS_PAGE_SIZE or not yn_to_bool(input("Show more rooms? \n")):
                 break
+    except BookingError as e:
+        print(e)
 
-            # call display_other_times
-            other_available_slots = display_other_bookings(cxn, int(booking_num))
-            print_available_timeslots(other_available_slots)
-
-            # Get new day and time from user, could be None
-            new_day = input("New day in YYYY-MM-DD format: \n")
-            new_time = input("New start hour of booking, from 0 - 23: \n")
+    if found_any:
+        # Prompt user to select room number, building name, start hour and date
+        print("Please provide the following criteria to create a booking based on the available options shown above: room number, building name, and club to associate with the booking\n")
 
-            # Update booking based on inputs
-            if update_booking(cxn, int(booking_num), new_day, int(new_time)) == 0:
-                print("Successfully updated booking %s.\n" % (booking_num))
-            else:
-                print("Error updating booking %s.\n" % (booking_num))
-        else:
-            print("You don't have any bookings yet!\n")
-
-    # Create booking
-    elif menu_item == '3':
-        # Tell user what things they can select
-        print("Please provide answers to the following booking criteria: room capacity, ADA compliancy, desired starting hour of reservation, desired date of reservation, projector, if this booking is associated with a club, and desired campus.\n")
-        
-        capacity = input("Capacity: \n")
-        ada_compliant = input("Do you want an ADA compliant room? \n")
-        start_hr = input("Starting hour, from 0-23: \n")
-        day = input("Date, in YYYY-MM-DD format: \n")
-        projector = input("Projector? \n")
-        club_affiliation = input("Is this booking associated with a club? \n")
-        campus = input("Campus of desired room:\n")
-
-        # create list of arguments
-        args = (int(capacity), yn_to_bool(ada_compliant), int(start_hr), day, yn_to_bool(projector), yn_to_bool(club_affiliation), campus)
-        
-        # find rooms that match entered criteria
-        compatible_options = find_rooms_with_criteria(cxn, args)
-
-        if len(compatible_options) != 0:
-            # Show user available options
-            print("Available options: \n")
-            print_available_rooms(compatible_options)
-
-            # Prompt user to select room number, building name, start hour and date
-            print("Please provide the following criteria to create a booking based on the available options shown above: room number, building name, and club to associate with the booking\n")
-
-            room_num = input("Room number: \n")
-            building_name = input("Building name: \n")
-            
-            if yn_to_bool(club_affiliation) is True:
-                club_name = input("Club name: \n")
-            else:
-                club_name = None
-
-            # create list of args for create_booking DB procedure
-            args_c = (int(nuid), int(room_num), building_name, int(start_hr), day, club_name)
-
-            # actually create booking
-            if create_booking(cxn, args_c) == 0:
-                print("Successfully created booking!\n")
-            else:
-                print("Error in creating booking.\n")
-        else:
+        room_num = input("Room number: \n")
+        building_name = input("Building name: \n")
+    else:
+        # offer the closest alternatives instead of making the user guess new criteria
+        try:
+            suggestions = service.suggest_rooms(int(capacity), yn_to_bool(ada_compliant), int(start_hr), day,
+                                                yn_to_bool(projector), yn_to_bool(club_affiliation), campus)
+        except BookingError as e:
+            print(e)
+            suggestions = []
+        if len(suggestions) == 0:
             print("No results for entered criteria found.\n")
+            return
+        print("No exact matches. Closest alternatives: \n")
+        print_suggestions(suggestions)
+        choice = optional_int(input("Book which alternative? (blank to cancel) \n"))
+        if choice is None or not 1 <= choice <= len(suggestions):
+            return
+        picked = suggestions[choice - 1]
+        room_num, building_name = picked["room_number"], picked["building"]
+        start_hr, day = picked["start_hour"], picked["date"].isoformat()
+
+    if yn_to_bool(club_affiliation) is True:
+        club_name = input("Club name: \n")
+    else:
+        club_name = None
+
+    # clubs can book the same room for several hours in a row and/or every week
+    last_hr = optional_int(input("Book consecutive hours through which start hour? (blank for just one hour) \n"))
+    weeks = optional_int(input("Repeat every week for how many weeks? (blank for just this date) \n"))
 
-    # Delete booking
-    elif menu_item == '4':
-        # Show user their bookings
-        bookings = view_bookings(cxn)
+    # actually create booking
+    try:
+        if last_hr is None and weeks is None:
+            booking_id = service.create_booking(int(room_num), building_name, int(start_hr), day, club_name)
+            print("Successfully created booking %s!\n" % (booking_id))
+            return
+        hours = range(int(start_hr), (last_hr if last_hr is not None else int(start_hr)) + 1)
+        results = service.create_bookings(int(room_num), building_name, weekly_slots(day, hours, weeks or 1), club_name)
+        print_batch_results(results)
+    except BookingError as e:
+        print(e)
+        print("Error in creating booking.\n")
+
+
+# Menu option 4
+def delete_booking_menu(service: BookingService) -> None:
+    if len(show_bookings(service)) == 0:
+        return
+
+    # Ask user for booking num to delete
+    b_num = input("Confirm booking number to delete: \n")
+
+    # Actually delete booking
+    try:
+        service.delete_booking(int(b_num))
+        print("Booking %s was successfully deleted!\n" % (b_num))
+    except BookingError as e:
+        print(e)
+        print("Error in deleting booking %s.\n" % (b_num))
 
-        if len(bookings) != 0:
-            print("Your bookings: \n")
-            print_user_bookings(bookings)
 
-            # Ask user for booking num to delete
-            b_num = input("Confirm booking number to delete: \n")
+# Menu option 5
+def sign_into_booking_menu(service: BookingService) -> None:
+    if len(show_bookings(service)) == 0:
+        return
 
-            # Actually delete booking
-            if delete_booking(cxn, int(b_num)) == 0:
-                print("Booking %s was successfully deleted!\n" % (b_num))
-            else:
-                print("Error in deleting booking %s.\n" % (b_num))
-        else:
-            print("You don't have any bookings yet!\n")
+    # Ask user for booking num
+    b_num = input("Confirm booking number to check into: \n")
 
-    # Sign into booking
-    elif menu_item == '5':
-        # Show user their bookings
-        print("Your bookings: \n")
-        bookings = view_bookings(cxn)
+    # check into room
+    try:
+        service.sign_into_booking(int(b_num))
+        print("Successfully signed into booking %s.\n" % (b_num))
+    except BookingError as e:
+        print(e)
+        print("Error signing into booking %s.\n" % (b_num))
 
-        if len(bookings) != 0:
-            print_user_bookings(bookings)
 
-            # Ask user for booking num
-            b_num = input("Confirm booking number to check into: \n")
+# Menu option 6
+def add_club_menu(service: BookingService) -> None:
+    # Ask user for club name
+    club_name = input("Enter club name to add to user:\n")
 
-            # check into room
-            if sign_into_booking(cxn, int(b_num)) == 0:
-                print("Successfully signed into booking %s.\n" % (b_num))
-            else:
-                print("Error signing into booking %s.\n" % (b_num))
+    try:
+        service.add_club_officer(club_name)
+        print("Successfully added club affiliation!\n")
+    except BookingError as e:
+        print(e)
+        print("Error: Could not add club association.\n")
+
+
+# Main loop, profiler is the profiling.SessionProfiler in --profile mode
+def run_session(profiler=None) -> None:
+    # Prompt connection to DB
+    service = connect_service()
+    timing = start_instrumentation(service, always=profiler is not None)
+    if profiler is not None:
+        profiler.registry = timing.registry
+    # campuses, clubs and rooms are checked locally from here on, loaded on first use so signing in is not kept waiting
+    service.use_reference_cache(preload=False)
+    sign_in(service)
+
+    while True:
+        # Successfully validated with NUID, so we can print menu
+        print("------------------------\n")
+        print_menu()
+        print("------------------------\n")
+        if profiler is not None:
+            profiler.ready()
+        menu_item = input("Select the number of the operation you want to do: \n")
+
+        # View bookings
+        if menu_item == '1':
+            show_bookings(service)
+        # Update booking
+        elif menu_item == '2':
+            update_booking_menu(service)
+        # Create booking
+        elif menu_item == '3':
+            create_booking_menu(service)
+        # Delete booking
+        elif menu_item == '4':
+            delete_booking_menu(service)
+        # Sign into booking
+        elif menu_item == '5':
+            sign_into_booking_menu(service)
+        # add club association to user
+        elif menu_item == '6':
+            add_club_menu(service)
+        # quit/sign out
+        elif menu_item == '7':
+            # close db connections
+            service.close()
+            if timing is not None and os.environ.get('FINAL_PROJECT_METRICS'):
+                with open(os.environ['FINAL_PROJECT_METRICS'], 'w') as file:
+                    json.dump(timing.registry.snapshot(), file, indent=2)
+            print("Signing out...\n")
+            break
+        # default if wrong input
         else:
-            print("You don't have any bookings yet!\n")
+            print("Invalid operation number, please re-enter.\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Command line client for booking rooms')
+    parser.add_argument('--profile', metavar='SCRIPT',
+                        help='replay the answers in SCRIPT instead of reading input, and report where the time went')
+    parser.add_argument('--profile-output', help='write the --profile report to this file instead of stderr')
+    parser.add_argument('--profile-stats', help='also write the raw cProfile data to this file')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --profile, also trace memory allocations (much slower)')
+    parser.add_argument('--record', metavar='SCRIPT', help='save every answer (except passwords) to SCRIPT to replay')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.profile is None:
+        if args.record is None:
+            run_session()
+            return
+        import profiling
+        with open(args.record, 'w') as script:
+            globals()['input'] = profiling.recording_input(script)
+            run_session()
+        return
+
+    import profiling
+    profiler = profiling.SessionProfiler(args.profile, STARTED, IMPORT_SECONDS, args.trace_memory)
+    profiler.install(sys.modules[__name__], PROFILE_PHASES)
+    profiler.start()
+    try:
+        run_session(profiler)
+    except profiling.ScriptExhausted as e:
+        print(e, file=sys.stderr)
+    finally:
+        profiler.stop()
+        report = json.dumps(profiler.report(), indent=2)
+        if args.profile_output:
+            with open(args.profile_output, 'w') as file:
+                file.write(report + '\n')
+        else:
+            print(report, file=sys.stderr)
+        if args.profile_stats:
+            profiler.dump_stats(args.profile_stats)
 
-    # add club association to user
-    elif menu_item == '6':
-        # Ask user for club name
-        club_name = input("Enter club name to add to user:\n")
 
-        if add_club_officer(cxn, nuid, club_name) == 0:
-            print("Successfully added club affiliation!\n")
-        else:
-            print("Error: Could not add club association.\n")
-    # quit/sign out
-    elif menu_item == '7':
-        # close db connection
-        sign_out(cxn)
-        print("Signing out...\n")
-        global_flag = False
-    # default if wrong input
-    else:
-        print("Invalid operation number, please re-enter.\n")
-    
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!usr/bin/env python
+import argparse
+import datetime
+import getpass as gp
+import json
+import os
+import random
+import statistics
+import time
+
+from db import ConnectionPool
+
+# Archival job for past bookings
+# Moves bookings older than --keep-days (and their signs_in rows) into bookings_archive / signs_in_archive,
+# batch_size rows per transaction, so the hot tables only hold current and future bookings no matter how
+# many semesters of history there are. Partitioning bookings by date is not an option because InnoDB does
+# not allow partitioned tables to have (or be referenced by) foreign keys.
+#
+# usage:
+#   python archiver.py run --user root --keep-days 30
+#   python archiver.py bench --user root --keep-days 30 --campus Boston --steps 4
+#       measures search latency, then archives in --steps steps up to the --keep-days cutoff and measures again
+#       after each one, so the latency is seen at several sizes of the hot tables
+
+
+# Moves every booking dated before cutoff into the archive, one batch per transaction
+# pause seconds are slept between batches to leave room for the booking hot path
+# Returns the number of bookings moved
+def archive_before(pool, cutoff: datetime.date, batch_size: int = 5000, pause: float = 0.0) -> int:
+    total = 0
+    while True:
+        with pool.cursor() as cur:
+            cur.callproc('archive_bookings', [cutoff, batch_size])
+            moved = cur.fetchone()['moved']
+        total += moved
+        if moved < batch_size:
+            return total
+        if pause > 0:
+            time.sleep(pause)
+
+
+# Returns the number of rows in the hot and archive booking tables
+def table_sizes(pool) -> dict:
+    with pool.cursor() as cur:
+        cur.execute('SELECT (SELECT COUNT(*) FROM bookings) AS bookings, '
+                    '(SELECT COUNT(*) FROM bookings_archive) AS bookings_archive')
+        return cur.fetchone()
+
+
+# Returns up to `count` dates from today onwards that room_availability has not been built for, so searches on them
+# run the bookings anti-join, whose cost is what the hot table size changes: booked dates first, then any others
+def unmaterialized_dates(pool, count: int = 14) -> list:
+    today = datetime.date.today()
+    with pool.cursor() as cur:
+        cur.execute("""SELECT DISTINCT date FROM bookings
+                           WHERE date >= %s AND date NOT IN (SELECT date FROM room_availability_dates)
+                           ORDER BY date LIMIT %s""", (today, count))
+        dates = [row['date'] for row in cur.fetchall()]
+        cur.execute('SELECT date FROM room_availability_dates WHERE date >= %s', (today,))
+        materialized = {row['date'] for row in cur.fetchall()}
+    day = today
+    while len(dates) < count:
+        if day not in materialized and day not in dates:
+            dates.append(day)
+        day += datetime.timedelta(days=1)
+    return dates
+
+
+# Returns the cutoffs that archive the hot bookings in `steps` equal date ranges, ending at cutoff
+def archive_steps(pool, cutoff: datetime.date, steps: int) -> list:
+    with pool.cursor() as cur:
+        cur.execute('SELECT MIN(date) AS date FROM bookings')
+        first = cur.fetchone()['date']
+    if first is None or first >= cutoff:
+        return [cutoff]
+    span = (cutoff - first).days
+    return sorted({first + datetime.timedelta(days=span * n // steps) for n in range(1, steps)} | {cutoff})
+
+
+# Times `searches` random find_room_with_criteria and display_other_times calls, on dates from today onwards
+# that room_availability does not cover (see unmaterialized_dates)
+# Returns latency percentiles in milliseconds
+def search_latency(pool, campus: str, searches: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    dates = unmaterialized_dates(pool)
+    with pool.cursor() as cur:
+        cur.execute('SELECT booking_id FROM bookings WHERE date >= %s ORDER BY booking_id LIMIT 100', (today,))
+        booking_ids = [row['booking_id'] for row in cur.fetchall()]
+
+    find_times, other_times = [], []
+    for _ in range(searches):
+        day = rng.choice(dates)
+        args = (rng.randint(10, 60), rng.random() < 0.5, rng.randint(8, 20), day, rng.random() < 0.5, False, campus)
+        with pool.cursor() as cur:
+            start = time.perf_counter()
+            cur.callproc('find_room_with_criteria', args)
+            cur.fetchall()
+            find_times.append(time.perf_counter() - start)
+        if booking_ids:
+            with pool.cursor() as cur:
+                start = time.perf_counter()
+                cur.callproc('display_other_times', [rng.choice(booking_ids), None, None, None, None, None])
+                cur.fetchall()
+                other_times.append(time.perf_counter() - start)
+
+    def summary(times: list) -> dict:
+        if len(times) < 2:
+            return {}
+        quantiles = statistics.quantiles(times, n=100)
+        return {'p50_ms': round(quantiles[49] * 1000, 3), 'p95_ms': round(quantiles[94] * 1000, 3)}
+
+    return {'find_room_with_criteria': summary(find_times), 'display_other_times': summary(other_times)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Move past bookings into the archive tables')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--keep-days', type=int, default=30, help='bookings from this many days ago onwards stay hot')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('run', help='archive old bookings')
+    bench = commands.add_parser('bench', help='measure search latency before and after archiving')
+    bench.add_argument('--campus', default='Boston')
+    bench.add_argument('--searches', type=int, default=200)
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--steps', type=int, default=4, help='archive in this many steps, measuring after each')
+    args = parser.parse_args()
+
+    password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+    pool = ConnectionPool(host=args.host, user=args.user, password=password, max_size=1)
+    cutoff = datetime.date.today() - datetime.timedelta(days=args.keep_days)
+    try:
+        if args.command == 'run':
+            start = time.perf_counter()
+            moved = archive_before(pool, cutoff, args.batch_size, args.pause)
+            print('Archived %d bookings dated before %s in %.2fs' % (moved, cutoff, time.perf_counter() - start))
+        else:
+            report = [dict(table_sizes(pool), cutoff=None, archived=0,
+                           **search_latency(pool, args.campus, args.searches, args.seed))]
+            for step in archive_steps(pool, cutoff, args.steps):
+                archived = archive_before(pool, step, args.batch_size, args.pause)
+                report.append(dict(table_sizes(pool), cutoff=step.isoformat(), archived=archived,
+                                   **search_latency(pool, args.campus, args.searches, args.seed)))
+            print(json.dumps(report, indent=2))
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
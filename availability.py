@@ -0,0 +1,211 @@
+import bisect
+import datetime
+import heapq
+import math
+import threading
+import time
+
+# In-process availability index for find_room_with_criteria
+# Rooms are grouped by (campus, ada, projector, club_only, start_hour), and each group keeps its rooms sorted
+# by (capacity, building, room_number) so "capacity >= n" and "after this page" are bisects. Bookings are kept
+# as a set of booked room indexes per (date, start_hour), so checking whether a candidate room is free is a
+# single set lookup, and booking or freeing a room is a single add or discard.
+# The index is loaded once from the database and then kept up to date by BookingService on every
+# create/update/delete, with a periodic full reload to pick up bookings made by other processes.
+# Searches run from many threads at once: a reload replaces the whole snapshot of rooms, groups and bookings
+# in one assignment, and each search reads that snapshot once, so it never mixes an old and a new load.
+#
+# suggest() ranks near misses when a search has no exact match: nearby hours and dates, rooms a little smaller
+# than asked for, and rooms without the projector that was asked for all stay candidates, each relaxation
+# adding to a score (lower is closer), and the k best are kept with a heap in a single pass.
+
+# score added per hour away from the requested start hour, and per day away from the requested date
+HOUR_PENALTY = 1.0
+DAY_PENALTY = 1.5
+# score added for a room with no projector when one was asked for
+PROJECTOR_PENALTY = 2.0
+# score added per unit of the fraction of seats missing (a room 10% too small adds 0.4)
+CAPACITY_PENALTY = 4.0
+# at most this much is added for a room much bigger than needed, so right-sized rooms come first
+OVERSIZE_PENALTY = 0.5
+# score added for a room outside the preferred building, when there is one
+BUILDING_PENALTY = 0.5
+
+
+# One load of the index, replaced as a whole by AvailabilityIndex.reload
+class _Snapshot:
+    def __init__(self):
+        # room index -> (building, room_number, capacity)
+        self.rooms = []
+        # (building, room_number) -> room index
+        self.room_ids = {}
+        # (campus, ada, projector, club_only, start_hour) -> (sorted (capacity, building, room_number) keys,
+        # room indexes in the same order)
+        self.groups = {}
+        # (date, start_hour) -> set of booked room indexes
+        self.booked = {}
+        self.loaded_at = None
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._snapshot = _Snapshot()
+        # serializes book/unbook, searches only read
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_at(self) -> float:
+        return self._snapshot.loaded_at
+
+    # Builds an index from get_room_timeslots rows (one per room and start hour) and get_bookings_since rows
+    @classmethod
+    def from_rows(cls, timeslot_rows, booking_rows) -> 'AvailabilityIndex':
+        index = cls()
+        snapshot = index._snapshot
+        groups = {}
+        for row in timeslot_rows:
+            key = (row['building'], row['room_number'])
+            room_id = snapshot.room_ids.get(key)
+            if room_id is None:
+                room_id = len(snapshot.rooms)
+                snapshot.room_ids[key] = room_id
+                snapshot.rooms.append((row['building'], row['room_number'], row['capacity']))
+            group = (row['campus'], bool(row['ada']), bool(row['projector']), bool(row['club_only']), row['start_hour'])
+            groups.setdefault(group, []).append(((row['capacity'], row['building'], row['room_number']), room_id))
+
+        for group, members in groups.items():
+            members.sort()
+            snapshot.groups[group] = ([key for key, _ in members], [room_id for _, room_id in members])
+
+        for row in booking_rows:
+            room_id = snapshot.room_ids.get((row['building_name'], row['room_number']))
+            if room_id is not None:
+                snapshot.booked.setdefault((row['date'], row['start_hour']), set()).add(room_id)
+        snapshot.loaded_at = time.monotonic()
+        return index
+
+    # Loads the index through a connection pool
+    # Only bookings from `since` onwards (default: today) are loaded, older ones can never be searched for
+    @classmethod
+    def load(cls, pool, since: datetime.date = None) -> 'AvailabilityIndex':
+        since = since or datetime.date.today()
+        with pool.cursor() as cur:
+            cur.callproc('get_room_timeslots')
+            timeslot_rows = cur.fetchall()
+        with pool.cursor() as cur:
+            cur.callproc('get_bookings_since', [since])
+            booking_rows = cur.fetchall()
+        return cls.from_rows(timeslot_rows, booking_rows)
+
+    # Reloads the index from the database in place, so every service sharing it sees the fresh copy
+    def reload(self, pool, since: datetime.date = None) -> None:
+        fresh = type(self).load(pool, since)
+        with self._lock:
+            self._snapshot = fresh._snapshot
+
+    # Returns True if the index was loaded more than max_age seconds ago
+    def is_stale(self, max_age: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    # Returns the rooms matching the criteria that are not booked, ordered by (capacity, building, room_number)
+    # like find_room_page; after is the (capacity, building, room_number) of the last row of the previous page
+    # Rows look like the ones find_room_with_criteria returns: building, room_number, capacity
+    def find(self, capacity: int, ada: bool, start_hour: int, date: datetime.date, projector: bool,
+             club: bool, campus: str, limit: int = None, after: tuple = None) -> list:
+        snapshot = self._snapshot
+        group = snapshot.groups.get((campus, bool(ada), bool(projector), bool(club), start_hour))
+        if group is None:
+            return []
+        keys, room_ids = group
+        booked = snapshot.booked.get((date, start_hour), ())
+
+        first = bisect.bisect_left(keys, (capacity,))
+        if after is not None:
+            first = max(first, bisect.bisect_right(keys, tuple(after)))
+        results = []
+        for room_id in room_ids[first:]:
+            if room_id in booked:
+                continue
+            building, room_number, room_capacity = snapshot.rooms[room_id]
+            results.append({'building': building, 'room_number': room_number, 'capacity': room_capacity})
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    # Returns the k free (room, date, start hour) combinations closest to the criteria, best first
+    # Looks at start hours within hour_window of start_hour, dates within day_window of date (never before today),
+    # rooms with at least (1 - capacity_slack) * capacity seats and rooms with or without a projector. ADA and
+    # club_only are never relaxed. Rows have building, room_number, capacity, projector, date, start_hour,
+    # score and relaxed (the names of the criteria that were not met exactly).
+    def suggest(self, capacity: int, ada: bool, start_hour: int, date: datetime.date, projector: bool, club: bool,
+                campus: str, k: int = 5, hour_window: int = 2, day_window: int = 3, capacity_slack: float = 0.2,
+                building: str = None) -> list:
+        min_capacity = math.ceil(capacity * (1 - capacity_slack))
+        today = datetime.date.today()
+        snapshot = self._snapshot
+
+        def candidates():
+            for day_offset in range(-day_window, day_window + 1):
+                day = date + datetime.timedelta(days=day_offset)
+                if day < today:
+                    continue
+                for hour in range(max(0, start_hour - hour_window), min(23, start_hour + hour_window) + 1):
+                    booked = snapshot.booked.get((day, hour), ())
+                    for has_projector in (True, False):
+                        group = snapshot.groups.get((campus, bool(ada), has_projector, bool(club), hour))
+                        if group is None:
+                            continue
+                        keys, room_ids = group
+                        base = abs(day_offset) * DAY_PENALTY + abs(hour - start_hour) * HOUR_PENALTY
+                        if projector and not has_projector:
+                            base += PROJECTOR_PENALTY
+                        for i in range(bisect.bisect_left(keys, (min_capacity,)), len(keys)):
+                            if room_ids[i] in booked:
+                                continue
+                            room_capacity, room_building, room_number = keys[i]
+                            if room_capacity < capacity:
+                                score = base + (capacity - room_capacity) / capacity * CAPACITY_PENALTY
+                            else:
+                                score = base + min((room_capacity - capacity) / max(capacity, 1), 1.0) * OVERSIZE_PENALTY
+                            if building is not None and room_building != building:
+                                score += BUILDING_PENALTY
+                            yield score, day, hour, room_building, room_number, room_capacity, has_projector
+
+        results = []
+        for score, day, hour, room_building, room_number, room_capacity, has_projector in \
+                heapq.nsmallest(k, candidates()):
+            relaxed = []
+            if hour != start_hour:
+                relaxed.append('start_hour')
+            if day != date:
+                relaxed.append('date')
+            if room_capacity < capacity:
+                relaxed.append('capacity')
+            if projector and not has_projector:
+                relaxed.append('projector')
+            if building is not None and room_building != building:
+                relaxed.append('building')
+            results.append({'building': room_building, 'room_number': room_number, 'capacity': room_capacity,
+                            'projector': has_projector, 'date': day, 'start_hour': hour,
+                            'score': round(score, 3), 'relaxed': relaxed})
+        return results
+
+    # Marks a room as booked for a date and start hour
+    def book(self, building: str, room_number: int, date: datetime.date, start_hour: int) -> None:
+        with self._lock:
+            snapshot = self._snapshot
+            room_id = snapshot.room_ids.get((building, room_number))
+            if room_id is not None:
+                snapshot.booked.setdefault((date, start_hour), set()).add(room_id)
+
+    # Marks a room as free again for a date and start hour
+    def unbook(self, building: str, room_number: int, date: datetime.date, start_hour: int) -> None:
+        with self._lock:
+            snapshot = self._snapshot
+            room_id = snapshot.room_ids.get((building, room_number))
+            booked = snapshot.booked.get((date, start_hour))
+            if room_id is None or booked is None:
+                return
+            booked.discard(room_id)
+            if not booked:
+                del snapshot.booked[(date, start_hour)]
@@ -0,0 +1,316 @@
+#!usr/bin/env python
+import argparse
+import datetime
+import getpass as gp
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+from bulk_load import bulk_load
+from db import ConnectionPool, format_db_error
+
+# Benchmark suite for the stored procedures behind app.py
+# Every operation calls the procedure BookingService uses for it (update_user_booking, find_room_page,
+# list_free_times, ...), so the numbers are the ones app.py and server.py actually pay.
+# `prepare` generates a scaled dataset with roomGenerator.py and bulk loads it into the local final_project
+# database; `run` drives every operation from --concurrency threads and prints p50/p95/p99 latency and
+# throughput per operation as JSON. Passing the JSON of an earlier run as --baseline fails the run (exit
+# status 1) when an operation's p95 got more than --max-regression slower, so regressions show up before
+# they are deployed.
+#
+# Bookings made by the benchmark are dated from BENCH_START onwards, well past any generated data, and are
+# removed again when the run finishes.
+#
+# usage:
+#   python bench.py prepare --user root --seed 42 --students 50000 --days 60 --buildings-per-campus 50
+#   python bench.py run --user root --concurrency 16 --requests 2000 --output bench.json
+#   python bench.py run --user root --baseline bench.json
+#   python bench.py run --sqlite bench_data       # against an embedded SQLite copy of bench_data, no server needed
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# first date of the benchmark's own bookings, and how many days after it they are spread over
+BENCH_START = datetime.date(2099, 1, 1)
+BENCH_DAYS = 365
+
+# the operations in the order they run: create_booking makes the bookings that the three after it use up
+OPERATIONS = ['create_booking', 'update_booking', 'check_into_room', 'delete_booking',
+              'validate_student', 'get_user_bookings', 'find_room_with_criteria', 'find_room_page',
+              'display_other_times', 'list_free_times']
+
+# rows per room search, as in app.py
+PAGE_SIZE = 10
+
+
+def bench_date(rng: random.Random) -> datetime.date:
+    return BENCH_START + datetime.timedelta(days=rng.randrange(BENCH_DAYS))
+
+
+# Real ids and values from the loaded database for the operations to use
+class Workload:
+    def __init__(self, pool, seed: int, sample_size: int = 1000):
+        self.seed = seed
+        with pool.cursor() as cur:
+            cur.execute('SELECT nuid FROM students ORDER BY RAND(%s) LIMIT %s', (seed, sample_size))
+            self.nuids = [row['nuid'] for row in cur.fetchall()]
+            cur.execute('SELECT name FROM campuses')
+            self.campuses = [row['name'] for row in cur.fetchall()]
+            # positions to start later pages of a room search from
+            cur.execute('SELECT capacity, building, room_number FROM rooms ORDER BY RAND(%s) LIMIT %s',
+                        (seed, sample_size))
+            self.rooms = cur.fetchall()
+            cur.execute('SELECT room_number, building_name, start_hour FROM timeslots ORDER BY RAND(%s) LIMIT %s',
+                        (seed, sample_size))
+            self.timeslots = cur.fetchall()
+            cur.execute('SELECT booking_id FROM bookings WHERE date < %s ORDER BY booking_id DESC LIMIT %s',
+                        (BENCH_START, sample_size))
+            self.booking_ids = [row['booking_id'] for row in cur.fetchall()]
+        if not self.nuids or not self.timeslots or not self.booking_ids:
+            raise SystemExit('bench: students, timeslots and bookings must not be empty, run `bench.py prepare` first')
+
+        # (booking_id, nuid) of bookings made by create_booking, for update/check in/delete to use
+        self.created = []
+        self._lock = threading.Lock()
+
+    def add_created(self, booking_id: int, nuid: int) -> None:
+        with self._lock:
+            # new and moved bookings go to the back of the queue, the next operation takes from the front
+            self.created.append((booking_id, nuid))
+
+    def take_created(self):
+        with self._lock:
+            return self.created.pop(0) if self.created else None
+
+    # Returns (procedure, args, created booking used) for one request of an operation,
+    # or None if there is no created booking left to use
+    def request(self, operation: str, rng: random.Random):
+        if operation == 'validate_student':
+            return 'validate_student', [rng.choice(self.nuids)], None
+        if operation == 'get_user_bookings':
+            return 'get_user_bookings', [rng.choice(self.nuids)], None
+        if operation in ('find_room_with_criteria', 'find_room_page'):
+            # the first page of a search, or a later page starting after a random room
+            after = rng.choice(self.rooms) if operation == 'find_room_page' else None
+            return 'find_room_page', [rng.randint(10, 60), rng.random() < 0.5, rng.randint(8, 20),
+                                      datetime.date.today() + datetime.timedelta(days=rng.randint(0, 13)),
+                                      rng.random() < 0.5, False, rng.choice(self.campuses),
+                                      after['capacity'] if after else None, after['building'] if after else None,
+                                      after['room_number'] if after else None, PAGE_SIZE], None
+        if operation == 'display_other_times':
+            return 'display_other_times', [rng.choice(self.booking_ids), None, None, None, None, None], None
+        if operation == 'list_free_times':
+            return 'list_free_times', [rng.choice(self.booking_ids), None, None], None
+        if operation == 'create_booking':
+            slot = rng.choice(self.timeslots)
+            return 'create_booking', [rng.choice(self.nuids), slot['room_number'], slot['building_name'],
+                                      slot['start_hour'], bench_date(rng), None], None
+
+        created = self.take_created()
+        if created is None:
+            return None
+        booking_id, nuid = created
+        if operation == 'update_booking':
+            # a new date in the benchmark range, the hour stays one the room can be booked for
+            return 'update_user_booking', [nuid, booking_id, bench_date(rng), None, None], created
+        if operation == 'check_into_room':
+            return 'check_into_user_booking', [nuid, booking_id], created
+        if operation == 'delete_booking':
+            return 'delete_user_booking', [nuid, booking_id], created
+        raise ValueError('unknown operation %r' % (operation,))
+
+
+# Runs `requests` calls of one operation from `concurrency` threads
+# Returns latency percentiles and throughput; the time to pick arguments is not counted
+def run_operation(pool, workload: Workload, operation: str, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker(worker_num: int) -> None:
+        rng = random.Random('%d-%s-%d' % (workload.seed, operation, worker_num))
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            request = workload.request(operation, rng)
+            if request is None:
+                return
+            procedure, args, created = request
+            start = time.perf_counter()
+            try:
+                with pool.cursor() as cur:
+                    cur.callproc(procedure, args)
+                    rows = cur.fetchall()
+                elapsed = time.perf_counter() - start
+            except pymysql.err.MySQLError as e:
+                with lock:
+                    errors.append(format_db_error(e))
+                continue
+            with lock:
+                latencies.append(elapsed)
+            if procedure == 'create_booking' and rows and rows[0]['status'] == 'created':
+                workload.add_created(rows[0]['booking_id'], args[0])
+            elif procedure == 'update_user_booking':
+                # moved bookings are still there for check_into_room and delete_booking
+                workload.add_created(*created)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, n) for n in range(concurrency)]:
+            future.result()
+    return latency_summary(latencies, time.perf_counter() - start, errors)
+
+
+# p50/p95/p99 latency in milliseconds and throughput for one operation
+def latency_summary(latencies: list, elapsed: float, errors: list) -> dict:
+    if len(latencies) == 0:
+        return {'requests': 0, 'errors': len(errors)}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    summary = {'requests': len(latencies),
+               'errors': len(errors),
+               'seconds': round(elapsed, 3),
+               'throughput_rps': round(len(latencies) / elapsed, 1),
+               'p50_ms': round(quantiles[49] * 1000, 3),
+               'p95_ms': round(quantiles[94] * 1000, 3),
+               'p99_ms': round(quantiles[98] * 1000, 3)}
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+# Removes every booking (and sign in) the benchmark made
+def clean_up(pool) -> None:
+    with pool.cursor() as cur:
+        cur.execute('DELETE FROM signs_in WHERE booking_id IN (SELECT booking_id FROM bookings WHERE date >= %s)',
+                    (BENCH_START,))
+        cur.execute('DELETE FROM bookings WHERE date >= %s', (BENCH_START,))
+
+
+# Returns the operations whose p95 is more than max_regression (a fraction) above the baseline's
+def regressions(report: dict, baseline: dict, max_regression: float) -> list:
+    slower = []
+    for operation, summary in report['operations'].items():
+        before = baseline.get('operations', {}).get(operation, {}).get('p95_ms')
+        after = summary.get('p95_ms')
+        if before and after and after > before * (1 + max_regression):
+            slower.append((operation, before, after))
+    return slower
+
+
+def run(pool, args) -> dict:
+    workload = Workload(pool, args.seed)
+    with pool.cursor() as cur:
+        cur.execute('SELECT (SELECT COUNT(*) FROM rooms) AS rooms, (SELECT COUNT(*) FROM timeslots) AS timeslots, '
+                    '(SELECT COUNT(*) FROM students) AS students, (SELECT COUNT(*) FROM bookings) AS bookings')
+        dataset = cur.fetchone()
+
+    operations = args.operations or OPERATIONS
+    if 'create_booking' not in operations and set(operations) & {'update_booking', 'check_into_room', 'delete_booking'}:
+        raise SystemExit('bench: update_booking, check_into_room and delete_booking need create_booking')
+    report = {'concurrency': args.concurrency, 'requests': args.requests, 'seed': args.seed,
+              'dataset': dataset, 'operations': {}}
+    try:
+        for operation in OPERATIONS:
+            if operation in operations:
+                # create_booking makes enough bookings for check_into_room and delete_booking to each use up
+                requests = args.requests * 2 if operation == 'create_booking' else args.requests
+                report['operations'][operation] = run_operation(pool, workload, operation, requests,
+                                                                args.concurrency)
+    finally:
+        clean_up(pool)
+    return report
+
+
+def prepare(password: str, args) -> None:
+    generator = [sys.executable, os.path.join(DATA_DIR, 'roomGenerator.py'), '--out-dir', args.data_dir,
+                 '--seed', str(args.seed), '--buildings-per-campus', str(args.buildings_per_campus),
+                 '--students', str(args.students), '--days', str(args.days)]
+    subprocess.run(generator, check=True)
+
+    cxn = pymysql.connect(host=args.host, user=args.user, password=password, database='final_project',
+                          charset='utf8mb4')
+    try:
+        for table, filename, count, seconds in bulk_load(cxn, args.data_dir, truncate=True):
+            print('%-14s %-24s %10d rows %8.2fs' % (table, filename, count, seconds))
+    finally:
+        cxn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the final_project stored procedures')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--seed', type=int, default=42)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    prep = commands.add_parser('prepare', help='generate and load a scaled dataset (replaces all data)')
+    prep.add_argument('--data-dir', default='bench_data')
+    prep.add_argument('--buildings-per-campus', type=int, default=50)
+    prep.add_argument('--students', type=int, default=50000)
+    prep.add_argument('--days', type=int, default=60)
+
+    bench = commands.add_parser('run', help='benchmark every operation against the loaded dataset')
+    bench.add_argument('--concurrency', type=int, default=8)
+    bench.add_argument('--requests', type=int, default=1000, help='requests per operation')
+    bench.add_argument('--operations', nargs='+', choices=OPERATIONS, help='only run these operations')
+    bench.add_argument('--output', help='also write the JSON report to this file')
+    bench.add_argument('--baseline', help='JSON report of an earlier run to compare p95 latency against')
+    bench.add_argument('--max-regression', type=float, default=0.2,
+                       help='fail if p95 is this fraction slower than the baseline')
+    bench.add_argument('--sqlite', metavar='DATA_DIR',
+                       help='run against an embedded SQLite database loaded from the CSVs in DATA_DIR')
+    args = parser.parse_args()
+
+    backend = None
+    if args.command == 'run' and args.sqlite:
+        from sqlite_backend import SQLiteBackend
+        backend = SQLiteBackend(data_dir=args.sqlite)
+        pool = backend.pool(max_size=args.concurrency, acquire_timeout=60)
+    else:
+        password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+    if args.command == 'prepare':
+        try:
+            prepare(password, args)
+        except pymysql.err.MySQLError as e:
+            raise SystemExit(format_db_error(e))
+        return
+
+    if backend is None:
+        pool = ConnectionPool(host=args.host, user=args.user, password=password, max_size=args.concurrency,
+                              acquire_timeout=60)
+    try:
+        report = run(pool, args)
+    except pymysql.err.MySQLError as e:
+        raise SystemExit(format_db_error(e))
+    finally:
+        pool.close()
+        if backend is not None:
+            backend.close()
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = regressions(report, json.load(file), args.max_regression)
+        for operation, before, after in slower:
+            print('REGRESSION: %s p95 %.3fms -> %.3fms' % (operation, before, after))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Per-session cache of the signed in user's bookings
+# The list is loaded once (get_user_bookings) together with the student's booking_version, and after that
+# each read costs one tiny get_booking_version call instead of re-reading every booking. BookingService
+# applies its own creates/updates/deletes to the cached list and advances the expected version by one per
+# change, so if anyone else changed the student's bookings in the meantime the versions no longer match
+# and the list is reloaded.
+# Server requests for the same NUID share one cache from several threads, so every read and change of the
+# list and version holds the cache's lock; the database calls are made outside it.
+
+import threading
+
+
+class UserBookingCache:
+    def __init__(self):
+        # booking_id -> row with booking_id, building_name, room_number, start_hour, date, organization_name, version
+        self._rows = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    # Returns the cached bookings, reloading them through the pool if the student's booking_version moved
+    def get(self, pool, nuid: int) -> list:
+        with self._lock:
+            version = self.version
+        if version is not None:
+            with pool.cursor() as cur:
+                cur.callproc('get_booking_version', [nuid])
+                row = cur.fetchone()
+            with self._lock:
+                if row is not None and row['booking_version'] == self.version:
+                    return self._sorted()
+        return self.load(pool, nuid)
+
+    # Reads the version and the bookings in the same transaction, so they describe the same snapshot
+    # and returns them in date order
+    def load(self, pool, nuid: int) -> list:
+        with pool.cursor() as cur:
+            cur.callproc('get_booking_version', [nuid])
+            row = cur.fetchone()
+            cur.callproc('get_user_bookings', [nuid])
+            bookings = cur.fetchall()
+        with self._lock:
+            self._rows = {booking['booking_id']: booking for booking in bookings}
+            self.version = row['booking_version'] if row is not None else None
+            return self._sorted()
+
+    # Returns the cached bookings in date order
+    def rows(self) -> list:
+        with self._lock:
+            return self._sorted()
+
+    # Forces a reload on the next read
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version = None
+
+    # Callers hold the lock
+    def _sorted(self) -> list:
+        return sorted(self._rows.values(), key=lambda row: (row['date'], row['start_hour'], row['booking_id']))
+
+    # The signed in user made one change to their own bookings, callers hold the lock
+    def _changed(self) -> None:
+        if self.version is not None:
+            self.version += 1
+
+    def added(self, row: dict) -> None:
+        with self._lock:
+            self._rows[row['booking_id']] = row
+            self._changed()
+
+    def moved(self, booking_id: int, date, start_hour: int, version: int) -> None:
+        with self._lock:
+            row = self._rows.get(booking_id)
+            if row is None:
+                self.version = None
+                return
+            self._rows[booking_id] = dict(row, date=date, start_hour=start_hour, version=version)
+            self._changed()
+
+    def removed(self, booking_id: int) -> None:
+        with self._lock:
+            if self._rows.pop(booking_id, None) is None:
+                self.version = None
+                return
+            self._changed()
@@ -0,0 +1,427 @@
+import base64
+import datetime
+import json
+
+import pymysql
+
+from availability import AvailabilityIndex
+from booking_cache import UserBookingCache
+from db import ConnectionPool, format_db_error
+from reference_cache import ReferenceCache
+
+# Importable, non-interactive booking API
+# A BookingService owns a connection pool and the NUID of the user it is acting for, and wraps each
+# stored procedure in finalProject.sql with a typed method. Nothing here reads from input() or prints,
+# failures are reported by raising BookingError so the CLI, a server or a benchmark can decide what to do.
+
+
+class BookingError(Exception):
+    pass
+
+
+# Raised when the slot being booked was taken by someone else
+class BookingConflict(BookingError):
+    pass
+
+
+# Utility function to check that an UPDATE, INSERT or DELETE operation was successful
+# Returns True if the procedure updates the rows needed, False otherwise
+def check_rows_affected(cur) -> bool:
+    return cur.rowcount > 0
+
+
+class BookingService:
+    # availability is an optional shared AvailabilityIndex, see use_availability_index()
+    # reference is an optional shared ReferenceCache, see use_reference_cache()
+    def __init__(self, pool, nuid: int = None, availability: AvailabilityIndex = None,
+                 reference: ReferenceCache = None):
+        self.pool = pool
+        self.nuid = nuid
+        self.availability = availability
+        self.reference = reference
+        # the signed in user's bookings, see get_bookings()
+        self.bookings = UserBookingCache()
+        # seconds before the availability index is reloaded to pick up bookings made by other processes
+        self.availability_max_age = 300.0
+        # snapshot for suggest_rooms when no availability index is in use, loaded on first use
+        self.suggestion_snapshot = None
+
+    # Builds a service with its own connection pool
+    @classmethod
+    def connect(cls, host: str, user: str, password: str, **pool_kwargs) -> 'BookingService':
+        return cls(ConnectionPool(host=host, user=user, password=password, **pool_kwargs))
+
+    # Returns a service acting for another user that shares this service's connection pool
+    def for_user(self, nuid: int) -> 'BookingService':
+        user = type(self)(self.pool, nuid, self.availability, self.reference)
+        user.availability_max_age = self.availability_max_age
+        user.suggestion_snapshot = self.suggestion_snapshot
+        return user
+
+    # Answers room searches from an in-process AvailabilityIndex instead of find_room_with_criteria
+    # The index is reloaded from the database once it is older than max_age seconds
+    def use_availability_index(self, max_age: float = 300.0) -> None:
+        self.availability = AvailabilityIndex.load(self.pool)
+        self.availability_max_age = max_age
+
+    # Validates campuses, clubs and rooms against a cached copy of the reference tables before any query is sent
+    # The cache is loaded now (on first use with preload=False) and reloaded once it is older than ttl seconds
+    def use_reference_cache(self, ttl: float = 3600.0, preload: bool = True) -> None:
+        self.reference = ReferenceCache(self.pool, ttl)
+        if preload:
+            self.reference.campuses()
+
+    # Raises BookingError if the campus, club or room is unknown, without a round trip
+    # Returns (campus, club_name, building_name) spelled as in the reference tables, so the availability index and the
+    # booking cache see the same names as the database; returns them unchanged when the reference cache is not in use
+    def _check_reference(self, campus: str = None, club_name: str = None, building_name: str = None,
+                         room_number: int = None) -> tuple:
+        if self.reference is None:
+            return campus, club_name, building_name
+        if campus is not None:
+            known = self.reference.campus(campus)
+            if known is None:
+                raise BookingError('Unknown campus %s. Campuses are: %s.' % (campus, ', '.join(self.reference.campuses())))
+            campus = known
+        if club_name is not None:
+            known = self.reference.club(club_name)
+            if known is None:
+                raise BookingError('Unknown club %s.' % (club_name))
+            club_name = known
+        if building_name is not None:
+            room = self.reference.room(building_name, room_number)
+            if room is None:
+                raise BookingError('%s Room %s does not exist.' % (building_name, room_number))
+            building_name = room['building']
+        return campus, club_name, building_name
+
+    # Returns the availability index, reloading it first if it is stale, or None if it is not in use
+    def _availability(self):
+        if self.availability is not None and self.availability.is_stale(self.availability_max_age):
+            self.availability.reload(self.pool)
+        return self.availability
+
+    # Closes the connection pool, after this the service (and every service sharing the pool) is unusable
+    def close(self) -> None:
+        self.pool.close()
+
+    # Runs a stored procedure on a pooled cursor
+    # Returns (rows affected, result rows)
+    def _call(self, procedure: str, args):
+        try:
+            with self.pool.cursor() as cur:
+                cur.callproc(procedure, args)
+                rows = cur.fetchall()
+                return cur.rowcount, list(rows)
+        except pymysql.err.MySQLError as e:
+            raise BookingError(format_db_error(e)) from e
+
+    # Runs a paginated stored procedure and returns its page of rows
+    # Rows are streamed off the wire with an unbuffered cursor rather than buffered by the driver first
+    def _fetch_page(self, procedure: str, args) -> list:
+        try:
+            with self.pool.cursor(pymysql.cursors.SSDictCursor) as cur:
+                cur.callproc(procedure, args)
+                return list(cur.fetchall_unbuffered())
+        except pymysql.err.MySQLError as e:
+            raise BookingError(format_db_error(e)) from e
+
+    def _require_user(self) -> int:
+        if self.nuid is None:
+            raise BookingError('No user is signed in.')
+        return self.nuid
+
+    # Users
+
+    # Creates an entry in the student table, raises BookingError if the student could not be added
+    def register(self, nuid: int, name: str) -> None:
+        affected, _ = self._call('create_user', [name, nuid])
+        if affected <= 0:
+            raise BookingError('Error in creating user.')
+
+    # Returns True if the NUID is in the data, False otherwise
+    def is_student(self, nuid: int) -> bool:
+        _, rows = self._call('validate_student', [nuid])
+        return len(rows) > 0
+
+    # Signs in as the given NUID
+    # Returns True if the NUID is in the data (and the service now acts for it), False otherwise
+    def sign_in(self, nuid: int) -> bool:
+        if not self.is_student(nuid):
+            return False
+        self.nuid = int(nuid)
+        self.bookings = UserBookingCache()
+        return True
+
+    # Adds the signed in user as an officer of the given club
+    def add_club_officer(self, club_name: str) -> None:
+        _, club_name, _ = self._check_reference(club_name=club_name)
+        affected, _ = self._call('add_club_officer', [self._require_user(), club_name])
+        if affected <= 0:
+            raise BookingError('Error in updating club association.')
+
+    # Bookings
+
+    # Returns the bookings of the signed in user, in date order
+    # Served from the per-session cache, which is only re-read if the user's bookings changed elsewhere
+    def get_bookings(self) -> list:
+        try:
+            return self.bookings.get(self.pool, self._require_user())
+        except pymysql.err.MySQLError as e:
+            raise BookingError(format_db_error(e)) from e
+
+    # Returns True if the booking number exists, False otherwise
+    def validate_booking(self, booking_num: int) -> bool:
+        _, rows = self._call('validate_booking_num', [booking_num])
+        return len(rows) > 0
+
+    # Yields pages of free (date, start_hour) slots for the room of the given booking between from_date and
+    # to_date (by default the week starting on the booking's date), page_size slots at a time
+    # Pages are fetched lazily with keyset pagination, so only the pages that are consumed are computed
+    def other_times_pages(self, booking_num: int, from_date=None, to_date=None, page_size: int = 50):
+        after_date, after_hour = None, None
+        while True:
+            rows = self._fetch_page('display_other_times', [booking_num, parse_date(from_date), parse_date(to_date),
+                                                             after_date, after_hour, page_size])
+            if len(rows) == 0:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            after_date, after_hour = rows[-1]['date'], rows[-1]['start_hour']
+
+    # Returns every free slot for the room of the given booking between from_date and to_date
+    # (by default the week starting on the booking's date), in one round trip
+    def other_times(self, booking_num: int, from_date=None, to_date=None) -> list:
+        _, rows = self._call('display_other_times', [booking_num, parse_date(from_date), parse_date(to_date),
+                                                      None, None, None])
+        return rows
+
+    # Like other_times, for listing: returns just (date, start_hour) tuples, in order
+    # list_free_times leaves out the room (the caller has it from the booking) and the rows are read with a
+    # plain tuple cursor, so a long range costs neither the repeated columns on the wire nor a dict per row
+    def free_times(self, booking_num: int, from_date=None, to_date=None) -> list:
+        try:
+            with self.pool.cursor(pymysql.cursors.Cursor) as cur:
+                cur.callproc('list_free_times', [booking_num, parse_date(from_date), parse_date(to_date)])
+                return list(cur.fetchall())
+        except pymysql.err.MySQLError as e:
+            raise BookingError(format_db_error(e)) from e
+
+    # Returns the first limit rooms that match the given criteria, ordered by capacity, building and room number
+    def find_rooms(self, capacity: int, ada: bool, start_hour: int, date, projector: bool,
+                   club: bool, campus: str, limit: int = 10) -> list:
+        rows, _ = self.find_rooms_page(capacity, ada, start_hour, date, projector, club, campus, page_size=limit)
+        return rows
+
+    # Returns one page of rooms that match the given criteria, and the cursor token for the next page
+    # (None on the last page); pass cursor=None for the first page
+    # Each page is a bounded keyset query (find_room_page), however far the caller pages
+    def find_rooms_page(self, capacity: int, ada: bool, start_hour: int, date, projector: bool, club: bool,
+                        campus: str, cursor: str = None, page_size: int = 10) -> tuple:
+        campus, _, _ = self._check_reference(campus=campus)
+        after = decode_cursor(cursor) if cursor is not None else None
+        availability = self._availability()
+        if availability is not None:
+            rows = availability.find(capacity, ada, start_hour, parse_date(date), projector, club, campus,
+                                     page_size, after)
+        else:
+            after_capacity, after_building, after_room = after if after is not None else (None, None, None)
+            rows = self._fetch_page('find_room_page', (capacity, ada, start_hour, parse_date(date), projector, club,
+                                                       campus, after_capacity, after_building, after_room, page_size))
+        next_cursor = encode_cursor(rows[-1]) if len(rows) == page_size else None
+        return rows, next_cursor
+
+    # Yields pages of rooms that match the given criteria, fetching each page only when it is asked for
+    def find_rooms_pages(self, capacity: int, ada: bool, start_hour: int, date, projector: bool, club: bool,
+                         campus: str, page_size: int = 10):
+        cursor = None
+        while True:
+            rows, cursor = self.find_rooms_page(capacity, ada, start_hour, date, projector, club, campus,
+                                                cursor, page_size)
+            if len(rows) > 0:
+                yield rows
+            if cursor is None:
+                return
+
+    # Returns up to k near matches for a search with no (or too few) exact matches, closest first
+    # Adjacent hours, nearby dates, slightly smaller rooms and rooms without a projector are ranked in one pass over
+    # an in-memory snapshot (see AvailabilityIndex.suggest) instead of the user retrying searches one by one.
+    # Uses the availability index if it is in use, otherwise a snapshot loaded on the first call and reloaded
+    # once it is older than availability_max_age
+    def suggest_rooms(self, capacity: int, ada: bool, start_hour: int, date, projector: bool, club: bool,
+                      campus: str, k: int = 5, building: str = None) -> list:
+        campus, _, _ = self._check_reference(campus=campus)
+        snapshot = self._availability()
+        if snapshot is None:
+            if self.suggestion_snapshot is None:
+                self.suggestion_snapshot = AvailabilityIndex.load(self.pool)
+            elif self.suggestion_snapshot.is_stale(self.availability_max_age):
+                self.suggestion_snapshot.reload(self.pool)
+            snapshot = self.suggestion_snapshot
+        return snapshot.suggest(capacity, ada, start_hour, parse_date(date), projector, club, campus, k,
+                                building=building)
+
+    # Books a room for the signed in user
+    # Returns the new booking's id, raises BookingConflict if the room is already booked at that time
+    def create_booking(self, room_number: int, building_name: str, start_hour: int,
+                       date, club_name: str = None) -> int:
+        _, club_name, building_name = self._check_reference(club_name=club_name, building_name=building_name,
+                                                            room_number=room_number)
+        args = (self._require_user(), room_number, building_name, start_hour, date, club_name)
+        _, rows = self._call('create_booking', args)
+        status = rows[0]['status'] if len(rows) > 0 else None
+        if status == 'conflict':
+            # somebody else holds the slot, make sure searches stop offering it
+            if self.availability is not None:
+                self.availability.book(building_name, room_number, parse_date(date), start_hour)
+            raise BookingConflict('%s Room %s is already booked at %s:00 on %s.'
+                                  % (building_name, room_number, start_hour, date))
+        if status == 'invalid':
+            raise BookingError('%s Room %s cannot be booked at %s:00, or the student or club does not exist.'
+                               % (building_name, room_number, start_hour))
+        if status != 'created':
+            raise BookingError('Could not create booking.')
+        if self.availability is not None:
+            self.availability.book(building_name, room_number, parse_date(date), start_hour)
+        booking_id = int(rows[0]['booking_id'])
+        self.bookings.added({'booking_id': booking_id, 'building_name': building_name, 'room_number': room_number,
+                             'start_hour': start_hour, 'date': parse_date(date), 'organization_name': club_name,
+                             'version': 0})
+        return booking_id
+
+    # Books one room for many (date, start_hour) slots in a single round trip and transaction
+    # Returns one dict per distinct slot with date, start_hour, status ('created', 'conflict', 'invalid' or
+    # 'skipped') and booking_id. With all_or_nothing, raises BookingConflict and books nothing unless every
+    # slot could be booked.
+    def create_bookings(self, room_number: int, building_name: str, slots, club_name: str = None,
+                        all_or_nothing: bool = False) -> list:
+        _, club_name, building_name = self._check_reference(club_name=club_name, building_name=building_name,
+                                                            room_number=room_number)
+        slots_json = json.dumps([{'date': parse_date(date).isoformat(), 'hour': int(hour)} for date, hour in slots])
+        args = (self._require_user(), room_number, building_name, club_name, slots_json, all_or_nothing)
+        try:
+            with self.pool.cursor() as cur:
+                cur.callproc('create_bookings_batch', args)
+                results = list(cur.fetchall())
+                failed = [result for result in results if result['status'] != 'created']
+                if all_or_nothing and len(failed) > 0:
+                    # raising inside the block rolls back anything a concurrent caller made us skip
+                    raise BookingConflict('%d of %d slots could not be booked.' % (len(failed), len(results)))
+        except pymysql.err.MySQLError as e:
+            raise BookingError(format_db_error(e)) from e
+
+        for result in results:
+            if result['status'] in ('created', 'conflict') and self.availability is not None:
+                self.availability.book(building_name, room_number, result['date'], result['start_hour'])
+            if result['status'] == 'created':
+                self.bookings.added({'booking_id': result['booking_id'], 'building_name': building_name,
+                                     'room_number': room_number, 'start_hour': result['start_hour'],
+                                     'date': result['date'], 'organization_name': club_name, 'version': 0})
+        return results
+
+    # Moves one of the signed in user's bookings to a new date, a new start hour, or both
+    # (None leaves that field as is), checking ownership and updating in one round trip
+    # expected_version is the booking's version from get_bookings; if the booking has changed since then the
+    # move is refused with a BookingConflict instead of overwriting the other change
+    # Returns True if the booking was moved, False if the date and hour are already the booking's (nothing changed)
+    def update_booking(self, booking_num: int, date=None, start_hour: int = None, expected_version: int = None) -> bool:
+        _, rows = self._call('update_user_booking', [self._require_user(), booking_num, parse_date(date), start_hour,
+                                                     expected_version])
+        result = rows[0]
+        if result['status'] == 'not_found':
+            raise BookingError('Could not validate booking number %s.' % (booking_num))
+        if result['status'] == 'stale':
+            self.bookings.invalidate()
+            raise BookingConflict('Booking %s was changed since it was listed, please check it and try again.'
+                                  % (booking_num))
+        if result['status'] == 'busy':
+            raise BookingConflict('Booking %s is being changed by another request, please try again.' % (booking_num))
+        if result['status'] == 'conflict':
+            raise BookingConflict('%s Room %s is already booked at %s:00 on %s.'
+                                  % (result['building_name'], result['room_number'], result['new_hour'], result['new_date']))
+        if result['status'] == 'invalid':
+            raise BookingError('%s Room %s cannot be booked at %s:00.'
+                               % (result['building_name'], result['room_number'], result['new_hour']))
+        if result['status'] == 'unchanged':
+            return False
+        if self.availability is not None:
+            self.availability.unbook(result['building_name'], result['room_number'], result['old_date'], result['old_hour'])
+            self.availability.book(result['building_name'], result['room_number'], result['new_date'], result['new_hour'])
+        self.bookings.moved(booking_num, result['new_date'], result['new_hour'], result['version'])
+        return True
+
+    # Deletes one of the signed in user's bookings, provided it has not been signed into,
+    # checking ownership and deleting in one round trip
+    def delete_booking(self, booking_num: int) -> None:
+        _, rows = self._call('delete_user_booking', [self._require_user(), booking_num])
+        result = rows[0]
+        if result['status'] == 'not_found':
+            raise BookingError('Could not validate booking number %s.' % (booking_num))
+        if result['status'] == 'signed_in':
+            raise BookingError('Booking %s has already been signed into and cannot be deleted.' % (booking_num))
+        if self.availability is not None:
+            self.availability.unbook(result['building_name'], result['room_number'], result['date'], result['start_hour'])
+        self.bookings.removed(booking_num)
+
+    # Signs the signed in user into one of their bookings, checking ownership and inserting in one round trip
+    def sign_into_booking(self, booking_num: int) -> None:
+        _, rows = self._call('check_into_user_booking', [self._require_user(), booking_num])
+        status = rows[0]['status']
+        if status == 'not_found':
+            raise BookingError('Could not validate booking number %s.' % (booking_num))
+        if status == 'already_signed_in':
+            raise BookingError("You've already signed into this booking!")
+
+    # Signs many students into their bookings at once, e.g. for a kiosk or door scanner, with no user signed in
+    # scans are (booking_id, nuid) pairs; repeated scans of a booking count once. Each chunk of batch_size
+    # bookings is applied by one check_into_bookings_batch call in one transaction.
+    # Returns one dict per distinct booking, in the order first scanned, with booking_id, nuid and status
+    # ('signed_in', 'already_signed_in' or 'not_found')
+    def sign_into_bookings(self, scans, batch_size: int = 1000) -> list:
+        distinct = {}
+        for booking_id, nuid in scans:
+            distinct.setdefault(int(booking_id), int(nuid))
+        scanned = list(distinct.items())
+
+        statuses = {}
+        for start in range(0, len(scanned), batch_size):
+            chunk = scanned[start:start + batch_size]
+            scans_json = json.dumps([{'booking_id': booking_id, 'nuid': nuid} for booking_id, nuid in chunk])
+            _, rows = self._call('check_into_bookings_batch', [scans_json])
+            for row in rows:
+                statuses[row['booking_id']] = row['status']
+        return [{'booking_id': booking_id, 'nuid': nuid, 'status': statuses.get(booking_id, 'not_found')}
+                for booking_id, nuid in scanned]
+
+
+# Returns (date, start_hour) slots for a recurring booking: every `hours` start hour on first_date and on the
+# same weekday for the following weeks - 1 weeks, e.g. weekly_slots(tuesday, [18], 12) or weekly_slots(day, range(14, 18))
+def weekly_slots(first_date, hours, weeks: int = 1) -> list:
+    first_date = parse_date(first_date)
+    return [(first_date + datetime.timedelta(weeks=week), hour) for week in range(weeks) for hour in hours]
+
+
+# Encodes the position after a room search row as an opaque cursor token
+def encode_cursor(row: dict) -> str:
+    key = json.dumps([row['capacity'], row['building'], row['room_number']])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+# Decodes a cursor token from encode_cursor back to (capacity, building, room_number)
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        capacity, building, room_number = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise BookingError('Invalid page cursor.')
+    return int(capacity), building, int(room_number)
+
+
+# Parses a YYYY-MM-DD string (or passes a date through), returning None for empty input
+def parse_date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    value = value.strip()
+    if value == '':
+        return None
+    return datetime.date.fromisoformat(value)
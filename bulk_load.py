@@ -0,0 +1,226 @@
+#!usr/bin/env python
+import argparse
+import csv
+import getpass as gp
+import os
+import tempfile
+import time
+
+import pymysql
+
+from db import format_db_error
+
+# Bulk loader for the reference CSVs (campuses, buildings, organizations) and the roomGenerator.py outputs
+# (rooms, timeslots, students, bookings). Files are parsed a row at a time, '//' comment lines are skipped and
+# true/false/empty values are converted, then each table is loaded with large batched INSERTs (or
+# LOAD DATA LOCAL INFILE with --load-data) inside one transaction, with foreign key and unique checks
+# switched off until the end.
+# room_availability (see rebuild_availability.py) is derived from rooms, timeslots and bookings, so it is emptied
+# along with everything else by --truncate (searches then use the bookings anti-join until it is rebuilt), and
+# otherwise rebuilt for its materialized dates from today onwards once the load has committed.
+# The load sets @bulk_load, which turns off the per-row bookings triggers (booking_version, room_availability and
+# usage_stale_dates, see finalProject.sql). What they would have maintained is restored in bulk instead: new
+# bookings start at version 0, room_availability is rebuilt as above, and every day already summarized for the
+# usage reports is marked stale so the next `reporting.py summarize` run brings it up to date.
+#
+# usage:
+#   python roomGenerator.py --seed 42 --students 50000 --days 120 --out-dir scaled/
+#   python bulk_load.py --user root --data-dir scaled/ --truncate
+
+# campuses.csv, buildings.csv and organizations.csv live next to this script
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (table, CSV file, reference data or generated), in foreign key order
+TABLES = [
+    ('campuses', 'campuses.csv', True),
+    ('buildings', 'buildings.csv', True),
+    ('buildings', 'generated_buildings.csv', False),
+    ('organizations', 'organizations.csv', True),
+    ('rooms', 'rooms.csv', False),
+    ('timeslots', 'timeslots.csv', False),
+    ('students', 'students.csv', False),
+    ('bookings', 'bookings.csv', False),
+]
+
+# rows per INSERT statement
+BATCH_ROWS = 5000
+
+
+# Converts one CSV value to what MySQL expects: booleans to 1/0 and empty values to NULL
+def convert_value(value: str):
+    lowered = value.lower()
+    if lowered == 'true':
+        return 1
+    if lowered == 'false':
+        return 0
+    if value == '':
+        return None
+    return value
+
+
+# Yields (header, row iterator) for a CSV in this repo's format: header row, '//' comment lines,
+# and quoted values with spaces after the commas
+def read_csv(path: str):
+    with open(path, newline='') as file:
+        lines = (line for line in file if not line.lstrip().startswith('//') and line.strip() != '')
+        reader = csv.reader(lines, skipinitialspace=True)
+        header = [column.strip() for column in next(reader)]
+        yield header, ([convert_value(value.strip()) for value in row] for row in reader)
+
+
+# Inserts rows with executemany, BATCH_ROWS at a time (pymysql turns each batch into one multi-row INSERT)
+# Returns the number of rows loaded
+def insert_batches(cur, table: str, header: list, rows) -> int:
+    statement = 'INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(header), ', '.join(['%s'] * len(header)))
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            cur.executemany(statement, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cur.executemany(statement, batch)
+        count += len(batch)
+    return count
+
+
+# Formats one value for LOAD DATA's default text format: a bare \N for NULL, and backslashes, tabs and
+# line breaks escaped with a backslash (the csv module would escape the backslash of \N too, loading the
+# literal string instead of NULL)
+def load_data_value(value) -> str:
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+# Writes rows to file as LOAD DATA's tab separated, newline terminated lines
+def write_load_data(file, rows) -> None:
+    for row in rows:
+        file.write('\t'.join(load_data_value(value) for value in row) + '\n')
+
+
+# Writes the cleaned rows to a temporary tab separated file and loads it with LOAD DATA LOCAL INFILE
+# Returns the number of rows loaded
+def load_data_infile(cur, table: str, header: list, rows) -> int:
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.tsv', delete=False, newline='') as tmp:
+        write_load_data(tmp, rows)
+    try:
+        cur.execute("LOAD DATA LOCAL INFILE %%s INTO TABLE %s FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' (%s)"
+                    % (table, ', '.join(header)), (tmp.name,))
+        return cur.rowcount
+    finally:
+        os.remove(tmp.name)
+
+
+# Rebuilds room_availability for the dates from today onwards that it has been built for, so rooms and timeslots
+# that were just loaded show up on them too
+# Returns [('room_availability', None, free slots, seconds)], or [] if no future date is materialized
+def rebuild_materialized(cxn, cur) -> list:
+    cur.execute('SELECT MIN(date), MAX(date) FROM room_availability_dates WHERE date >= CURDATE()')
+    first, last = cur.fetchone()
+    if first is None:
+        return []
+    start = time.perf_counter()
+    cur.callproc('rebuild_room_availability', [first, last])
+    slots = cur.fetchone()[1]
+    while cur.nextset():
+        pass
+    cxn.commit()
+    return [('room_availability', '(rebuilt)', slots, time.perf_counter() - start)]
+
+
+# Marks every day summarize_usage_day has already summarized stale, the days that have bookings and the ones with
+# usage rows left from bookings that are no longer there (after --truncate)
+# Returns [('usage_stale_dates', None, days marked, seconds)], or [] before the first summarize run
+def mark_usage_stale(cur) -> list:
+    cur.execute("SELECT through_date FROM report_watermark WHERE name = 'usage'")
+    row = cur.fetchone()
+    if row is None:
+        return []
+    start = time.perf_counter()
+    days = cur.execute("""INSERT IGNORE INTO usage_stale_dates(date)
+                              SELECT DISTINCT date FROM bookings WHERE date <= %s
+                              UNION SELECT DISTINCT date FROM room_day_usage""", (row[0],))
+    return [('usage_stale_dates', '(marked)', days, time.perf_counter() - start)]
+
+
+# Loads every CSV that exists into its table inside a single transaction
+# Returns a list of (table, file, rows, seconds)
+def bulk_load(cxn, data_dir: str, use_load_data: bool = False, truncate: bool = False) -> list:
+    results = []
+    with cxn.cursor() as cur:
+        cur.execute('SET FOREIGN_KEY_CHECKS = 0')
+        cur.execute('SET UNIQUE_CHECKS = 0')
+        # skip the per-row bookings triggers, their work is redone in bulk below
+        cur.execute('SET @bulk_load = 1')
+        try:
+            if truncate:
+                # TRUNCATE commits on its own, so do it before the load transaction starts
+                for table in ['room_availability', 'room_availability_dates', 'signs_in', 'club_officer'] \
+                        + list(dict.fromkeys(t for t, _, _ in reversed(TABLES))):
+                    cur.execute('TRUNCATE TABLE %s' % table)
+
+            cxn.begin()
+            for table, filename, reference in TABLES:
+                path = os.path.join(DATA_DIR if reference else data_dir, filename)
+                if not os.path.exists(path):
+                    continue
+                start = time.perf_counter()
+                for header, rows in read_csv(path):
+                    if use_load_data:
+                        count = load_data_infile(cur, table, header, rows)
+                    else:
+                        count = insert_batches(cur, table, header, rows)
+                results.append((table, filename, count, time.perf_counter() - start))
+            results.extend(mark_usage_stale(cur))
+            cxn.commit()
+            if not truncate:
+                results.extend(rebuild_materialized(cxn, cur))
+        except Exception:
+            cxn.rollback()
+            raise
+        finally:
+            cur.execute('SET @bulk_load = NULL')
+            cur.execute('SET UNIQUE_CHECKS = 1')
+            cur.execute('SET FOREIGN_KEY_CHECKS = 1')
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Bulk load the reference and generated CSVs into final_project')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--data-dir', default='.', help='directory with the roomGenerator.py output')
+    parser.add_argument('--load-data', action='store_true',
+                        help='use LOAD DATA LOCAL INFILE instead of batched INSERTs (needs local_infile on the server)')
+    parser.add_argument('--truncate', action='store_true', help='empty every table before loading')
+    args = parser.parse_args()
+
+    password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+    try:
+        cxn = pymysql.connect(host=args.host, user=args.user, password=password, database='final_project',
+                              charset='utf8mb4', local_infile=args.load_data)
+    except pymysql.err.OperationalError as e:
+        raise SystemExit(format_db_error(e))
+
+    start = time.perf_counter()
+    try:
+        results = bulk_load(cxn, args.data_dir, args.load_data, args.truncate)
+    except pymysql.err.MySQLError as e:
+        raise SystemExit(format_db_error(e))
+    finally:
+        cxn.close()
+    elapsed = time.perf_counter() - start
+
+    total = 0
+    for table, filename, count, seconds in results:
+        total += count
+        print('%-14s %-24s %10d rows %8.2fs %12.0f rows/sec' % (table, filename, count, seconds, count / max(seconds, 1e-9)))
+    print('%-39s %10d rows %8.2fs %12.0f rows/sec' % ('total', total, elapsed, total / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
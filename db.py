@@ -0,0 +1,187 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+
+# Connection pooling for the final_project database
+# Every data-access helper borrows a connection from the pool through ConnectionPool.cursor(),
+# which hands back a cursor that is committed (or rolled back) and closed when the block exits,
+# and returns the connection to the pool instead of tearing it down.
+
+# Errors that mean the connection itself is unusable, and should be thrown away rather than reused
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+# Formats a pymysql error the same way everywhere in the app
+def format_db_error(e: Exception) -> str:
+    if len(e.args) >= 2:
+        return 'Error: %s: %s' % (e.args[0], e.args[1])
+    return 'Error: %s' % (e,)
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+# A bounded pool of pymysql connections
+# - at most max_size connections are ever open at once, callers block (up to acquire_timeout) when all are in use
+# - idle connections are pinged before reuse if they have been idle longer than health_check_interval seconds
+# - connections that raise an OperationalError/InterfaceError are discarded and replaced on the next acquire
+class ConnectionPool:
+    def __init__(self, host: str, user: str, password: str, database: str = 'final_project',
+                 max_size: int = 5, min_size: int = 1, acquire_timeout: float = 10.0,
+                 health_check_interval: float = 30.0, connect_timeout: int = 10,
+                 cursorclass=pymysql.cursors.DictCursor, connect=None, instrumentation=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.cursorclass = cursorclass
+        # connection factory, overridable so other backends can reuse the pooling logic
+        self._connect_fn = connect
+        # instrumentation.Instrumentation that times every stored procedure call, None to skip it entirely
+        self.instrumentation = instrumentation
+        # idle connections, as (connection, time it was returned to the pool)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._num_open = 0
+        self._closed = False
+
+        # open min_size connections up front, this also surfaces bad credentials immediately
+        for _ in range(min_size):
+            cxn = self._open()
+            self._idle.put((cxn, time.monotonic()))
+
+    # Opens a brand new connection and counts it against max_size
+    def _open(self):
+        with self._lock:
+            if self._num_open >= self.max_size:
+                return None
+            self._num_open += 1
+        try:
+            if self._connect_fn is not None:
+                return self._connect_fn()
+            return pymysql.connect(host=self.host,
+                                   user=self.user,
+                                   password=self.password,
+                                   database=self.database,
+                                   charset='utf8mb4',
+                                   connect_timeout=self.connect_timeout,
+                                   cursorclass=self.cursorclass)
+        except Exception:
+            with self._lock:
+                self._num_open -= 1
+            raise
+
+    # Closes a connection and frees its slot in the pool
+    def _discard(self, cxn) -> None:
+        try:
+            cxn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._num_open -= 1
+
+    # Returns True if an idle connection is still usable, reconnecting it in place if the server dropped it
+    def _is_healthy(self, cxn, idle_since: float) -> bool:
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            cxn.ping(reconnect=True)
+            return True
+        except Exception:
+            return False
+
+    # Borrows a connection from the pool
+    # Reuses a healthy idle connection if there is one, otherwise opens a new one if under max_size,
+    # otherwise waits for another caller to release one
+    def acquire(self):
+        if self._closed:
+            raise PoolExhaustedError('Connection pool is closed')
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                cxn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                cxn = self._open()
+                if cxn is not None:
+                    return cxn
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError('No database connection available after %.1fs' % self.acquire_timeout)
+                try:
+                    cxn, idle_since = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            if self._is_healthy(cxn, idle_since):
+                return cxn
+            self._discard(cxn)
+
+    # Returns a connection to the pool, or throws it away if it is broken
+    def release(self, cxn, broken: bool = False) -> None:
+        if broken or self._closed:
+            self._discard(cxn)
+        else:
+            self._idle.put((cxn, time.monotonic()))
+
+    # Context manager that borrows a connection for the duration of the block
+    @contextmanager
+    def connection(self):
+        cxn = self.acquire()
+        broken = False
+        try:
+            yield cxn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(cxn, broken)
+
+    # Context manager that yields a cursor on a pooled connection
+    # The transaction is committed if the block finishes, rolled back if it raises,
+    # and the cursor is always closed before the connection goes back to the pool
+    @contextmanager
+    def cursor(self, cursorclass=None):
+        with self.connection() as cxn:
+            cur = cxn.cursor(cursorclass) if cursorclass is not None else cxn.cursor()
+            instrumentation = self.instrumentation
+            instrumented = instrumentation is not None and instrumentation.enabled
+            if instrumented:
+                cur = instrumentation.wrap(cur)
+            try:
+                yield cur
+                if instrumented:
+                    cur.commit(cxn)
+                else:
+                    cxn.commit()
+            except CONNECTION_ERRORS:
+                raise
+            except Exception:
+                try:
+                    cxn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                if instrumented:
+                    cur.finish()
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+
+    # Closes every idle connection, connections still checked out are closed when released
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                cxn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(cxn)
@@ -15,7 +15,8 @@ CREATE TABLE IF NOT EXISTS buildings(
     zipcode int,
     num_floors int,
     campus VARCHAR(64),
-    FOREIGN KEY (campus) REFERENCES campuses(name) ON DELETE CASCADE ON UPDATE CASCADE);
+    FOREIGN KEY (campus) REFERENCES campuses(name) ON DELETE CASCADE ON UPDATE CASCADE,
+    INDEX idx_buildings_campus (campus, name));
     
 CREATE TABLE IF NOT EXISTS rooms(
 	room_number int,
@@ -25,12 +26,16 @@ CREATE TABLE IF NOT EXISTS rooms(
     club_only boolean,
     building  VARCHAR(64),
     FOREIGN KEY (building) REFERENCES buildings(name) ON DELETE CASCADE ON UPDATE CASCADE,
-    PRIMARY KEY (room_number, building));
+    PRIMARY KEY (room_number, building),
+    -- covering index for find_room_with_criteria, InnoDB appends the primary key
+    INDEX idx_rooms_search (ada, projector, club_only, capacity));
 
 -- starts empty
 CREATE TABLE IF NOT EXISTS students(
 	nuid int PRIMARY KEY,
-    name VARCHAR(128));
+    name VARCHAR(128),
+    -- bumped by the bookings triggers below whenever one of the student's bookings changes
+    booking_version int NOT NULL DEFAULT 0);
 
 CREATE TABLE IF NOT EXISTS organizations(
 	name VARCHAR(64) PRIMARY KEY,
@@ -42,6 +47,7 @@ CREATE TABLE IF NOT EXISTS timeslots(
     start_hour int,
 	FOREIGN KEY (room_number, building_name) REFERENCES rooms(room_number, building) ON DELETE CASCADE ON UPDATE CASCADE,
     PRIMARY KEY (room_number, building_name, start_hour),
+    INDEX idx_timeslots_hour (start_hour, building_name, room_number),
     CONSTRAINT valid_hour CHECK (start_hour >= 0 AND start_hour < 24));
 
 -- Starts empty
@@ -61,7 +67,11 @@ CREATE TABLE IF NOT EXISTS bookings(
     date date,
     booking_id int AUTO_INCREMENT PRIMARY KEY,
     organization_name VARCHAR(64),
+    -- bumped by every move, so a move can check nobody else changed the booking since it was read
+    version int NOT NULL DEFAULT 0,
     UNIQUE (room_number, building_name, start_hour, date),
+    INDEX idx_bookings_nuid_date (nuid, date, start_hour),
+    INDEX idx_bookings_date_hour (date, start_hour, building_name, room_number),
     FOREIGN KEY (nuid) REFERENCES students(nuid) ON DELETE CASCADE ON UPDATE CASCADE,
     FOREIGN KEY (organization_name) REFERENCES organizations(name) ON DELETE CASCADE ON UPDATE CASCADE,
     FOREIGN KEY (room_number, building_name, start_hour) 
@@ -76,7 +86,238 @@ CREATE TABLE IF NOT EXISTS signs_in(
     FOREIGN KEY (booking_id) REFERENCES bookings(booking_id),
     PRIMARY KEY (booking_id));
     
-    
+
+-- bookings_archive and signs_in_archive: past bookings and their sign ins, moved out of the hot tables by archive_bookings
+-- same columns as bookings and signs_in, without foreign keys so rooms and students can change underneath history
+CREATE TABLE IF NOT EXISTS bookings_archive(
+	nuid int,
+    room_number int,
+    building_name  VARCHAR(64),
+    start_hour int,
+    date date,
+    booking_id int PRIMARY KEY,
+    organization_name VARCHAR(64),
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_bookings_archive_nuid_date (nuid, date),
+    INDEX idx_bookings_archive_date (date));
+
+CREATE TABLE IF NOT EXISTS signs_in_archive(
+	nuid int NOT NULL,
+    booking_id int PRIMARY KEY);
+
+-- room_availability: free rooms per (campus, date, start hour), with the room attributes find_room_with_criteria filters on
+-- maintained by the bookings_availability_* triggers for every date in room_availability_dates, rebuilt with rebuild_room_availability
+-- the primary key puts every equality filter first and capacity last, so a search is a single range scan
+CREATE TABLE IF NOT EXISTS room_availability(
+	campus VARCHAR(64),
+    date date,
+    start_hour int,
+    ada boolean,
+    projector boolean,
+    club_only boolean,
+    capacity int,
+    building VARCHAR(64),
+    room_number int,
+    PRIMARY KEY (campus, date, start_hour, ada, projector, club_only, capacity, building, room_number),
+    UNIQUE INDEX idx_room_availability_slot (building, room_number, date, start_hour),
+    -- for rebuild_room_availability, which deletes whole dates
+    INDEX idx_room_availability_date (date));
+
+-- dates that room_availability has been built for, searches on other dates fall back to the bookings anti-join
+CREATE TABLE IF NOT EXISTS room_availability_dates(
+	date date PRIMARY KEY);
+
+-- room_day_usage and hourly_demand: utilization summaries written by summarize_usage_day (see reporting.py), bookings and
+-- how many of them were signed into per room and day, and per campus, day and start hour; reports read these instead of bookings
+CREATE TABLE IF NOT EXISTS room_day_usage(
+	date date,
+    building_name VARCHAR(64),
+    room_number int,
+    booked_hours int NOT NULL,
+    signed_in_hours int NOT NULL,
+    PRIMARY KEY (date, building_name, room_number));
+
+CREATE TABLE IF NOT EXISTS hourly_demand(
+	date date,
+    campus VARCHAR(64),
+    start_hour int,
+    bookings int NOT NULL,
+    signed_in int NOT NULL,
+    PRIMARY KEY (date, campus, start_hour));
+
+-- report_watermark: the last day each summary has been brought up to
+CREATE TABLE IF NOT EXISTS report_watermark(
+	name VARCHAR(64) PRIMARY KEY,
+    through_date date NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP);
+
+-- usage_stale_dates: summarized days whose bookings or sign ins changed afterwards, written by the usage_stale_* triggers
+-- and summarized again (and removed) by summarize_usage_day
+CREATE TABLE IF NOT EXISTS usage_stale_dates(
+	date date PRIMARY KEY);
+
+-- TRIGGERS
+-- every bookings and signs_in trigger below does nothing while @bulk_load is set in the session: bulk_load.py sets
+-- @bulk_load = 1 for its load and then restores what the triggers maintain itself, in one pass instead of one per row
+
+-- bookings_version_*: bump the owning student's booking_version on every change to their bookings,
+-- so clients caching a student's bookings can tell whether their copy is still current
+-- skipped by bulk loads, new bookings start at version 0 anyway
+DROP TRIGGER IF EXISTS bookings_version_insert;
+DELIMITER $$
+CREATE TRIGGER bookings_version_insert AFTER INSERT ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_version_update;
+DELIMITER $$
+CREATE TRIGGER bookings_version_update AFTER UPDATE ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_version_delete;
+DELIMITER $$
+CREATE TRIGGER bookings_version_delete AFTER DELETE ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = OLD.nuid;
+	END IF;
+END $$
+DELIMITER ;
+
+-- bookings_availability_*: keep room_availability in step with bookings, in the same transaction as the booking change
+-- a booked slot is removed from room_availability, a freed slot is put back if its date is materialized
+-- skipped by bulk loads, which rebuild room_availability afterwards
+DROP TRIGGER IF EXISTS bookings_availability_insert;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_insert AFTER INSERT ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		DELETE FROM room_availability
+			WHERE building = NEW.building_name AND room_number = NEW.room_number
+				AND date = NEW.date AND start_hour = NEW.start_hour;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_availability_update;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_update AFTER UPDATE ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		DELETE FROM room_availability
+			WHERE building = NEW.building_name AND room_number = NEW.room_number
+				AND date = NEW.date AND start_hour = NEW.start_hour;
+		IF EXISTS (SELECT * FROM room_availability_dates WHERE date = OLD.date) THEN
+			INSERT IGNORE INTO room_availability(campus, date, start_hour, ada, projector, club_only, capacity, building, room_number)
+				SELECT buildings.campus, OLD.date, OLD.start_hour, rooms.ada, rooms.projector, rooms.club_only,
+						rooms.capacity, rooms.building, rooms.room_number
+					FROM rooms JOIN buildings ON rooms.building = buildings.name
+					WHERE rooms.building = OLD.building_name AND rooms.room_number = OLD.room_number;
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_availability_delete;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_delete AFTER DELETE ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		IF EXISTS (SELECT * FROM room_availability_dates WHERE date = OLD.date) THEN
+			INSERT IGNORE INTO room_availability(campus, date, start_hour, ada, projector, club_only, capacity, building, room_number)
+				SELECT buildings.campus, OLD.date, OLD.start_hour, rooms.ada, rooms.projector, rooms.club_only,
+						rooms.capacity, rooms.building, rooms.room_number
+					FROM rooms JOIN buildings ON rooms.building = buildings.name
+					WHERE rooms.building = OLD.building_name AND rooms.room_number = OLD.room_number;
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+-- usage_stale_*: record the date of every booking or sign in change on a day summarize_usage_day has already summarized
+-- (on or before the usage watermark) in usage_stale_dates, so the next summarize run brings that day up to date
+-- archive_bookings moves rows without changing any numbers, so its deletes (the row is in the archive already) are skipped
+-- skipped by bulk loads, which mark every summarized day stale afterwards
+DROP TRIGGER IF EXISTS usage_stale_bookings_insert;
+DELIMITER $$
+CREATE TRIGGER usage_stale_bookings_insert AFTER INSERT ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		IF NEW.date <= (SELECT through_date FROM report_watermark WHERE name = 'usage') THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (NEW.date);
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS usage_stale_bookings_update;
+DELIMITER $$
+CREATE TRIGGER usage_stale_bookings_update AFTER UPDATE ON bookings FOR EACH ROW
+BEGIN
+	DECLARE watermark DATE;
+	IF @bulk_load IS NULL THEN
+		SELECT through_date INTO watermark FROM report_watermark WHERE name = 'usage';
+		IF OLD.date <= watermark THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (OLD.date);
+		END IF;
+		IF NEW.date <= watermark THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (NEW.date);
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS usage_stale_bookings_delete;
+DELIMITER $$
+CREATE TRIGGER usage_stale_bookings_delete AFTER DELETE ON bookings FOR EACH ROW
+BEGIN
+	IF @bulk_load IS NULL THEN
+		IF OLD.date <= (SELECT through_date FROM report_watermark WHERE name = 'usage')
+				AND NOT EXISTS (SELECT * FROM bookings_archive WHERE booking_id = OLD.booking_id) THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (OLD.date);
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS usage_stale_signs_in_insert;
+DELIMITER $$
+CREATE TRIGGER usage_stale_signs_in_insert AFTER INSERT ON signs_in FOR EACH ROW
+BEGIN
+	DECLARE day DATE;
+	IF @bulk_load IS NULL THEN
+		SELECT date INTO day FROM bookings WHERE booking_id = NEW.booking_id;
+		IF day <= (SELECT through_date FROM report_watermark WHERE name = 'usage') THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (day);
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS usage_stale_signs_in_delete;
+DELIMITER $$
+CREATE TRIGGER usage_stale_signs_in_delete AFTER DELETE ON signs_in FOR EACH ROW
+BEGIN
+	DECLARE day DATE;
+	IF @bulk_load IS NULL THEN
+		SELECT date INTO day FROM bookings WHERE booking_id = OLD.booking_id;
+		IF day <= (SELECT through_date FROM report_watermark WHERE name = 'usage')
+				AND NOT EXISTS (SELECT * FROM signs_in_archive WHERE booking_id = OLD.booking_id) THEN
+			INSERT IGNORE INTO usage_stale_dates(date) VALUES (day);
+		END IF;
+	END IF;
+END $$
+DELIMITER ;
+
 -- DATABASE PROCEDURES AND FUNCTIONS
 
 -- validate_student: Given a user's NUID, Check if their NUID is in the Students table
@@ -90,54 +331,115 @@ BEGIN
 END$$
 DELIMITER ;
 
--- get_user_bookings: Given a user's NUID, return all bookings associated with them
+-- get_user_bookings: Given a user's NUID, return all bookings associated with them, in date order
+-- only the columns the booking list shows are returned
 DROP PROCEDURE IF EXISTS get_user_bookings;
 DELIMITER $$
 CREATE PROCEDURE get_user_bookings(nuid INT)
 BEGIN
-	SELECT * FROM bookings WHERE bookings.nuid = nuid;
+	SELECT booking_id, building_name, room_number, start_hour, date, organization_name, version FROM bookings
+		WHERE bookings.nuid = nuid
+		ORDER BY date, start_hour, booking_id;
+END$$
+DELIMITER ;
+
+-- get_booking_version: Given a user's NUID, return the version of their bookings (students.booking_version)
+-- usage: a cached booking list is still current if the version has not changed since it was loaded
+DROP PROCEDURE IF EXISTS get_booking_version;
+DELIMITER $$
+CREATE PROCEDURE get_booking_version(user_nuid INT)
+BEGIN
+	SELECT booking_version FROM students WHERE nuid = user_nuid;
 END$$
 DELIMITER ;
 
 -- update_booking: Given a booking number, update the booking's date or time (or both!)
+-- NULL keeps the current value; date and time change together in one statement, so the booking never
+-- passes through a half-moved (new date, old hour) state that could collide with another booking
 DROP PROCEDURE IF EXISTS update_booking;
 DELIMITER $$
 CREATE PROCEDURE update_booking(booking_num INT, booking_date DATE, booking_time INT)
 BEGIN
-	-- If both date and time are provided, update both fields
-	IF booking_date IS NOT NULL AND booking_time IS NOT NULL THEN
-		UPDATE bookings SET date = booking_date
-			WHERE bookings.booking_id = booking_num;
-		UPDATE bookings SET start_hour = booking_time
-			WHERE bookings.booking_id = booking_num;
-	-- If a time is not provided but a date is, update the date only
-	ELSEIF booking_date IS NOT NULL AND booking_time IS NULL THEN
-		UPDATE bookings SET date = booking_date
-			WHERE bookings.booking_id = booking_num;
-	-- If a time is provided but a date is not, update the time only
-	ELSEIF booking_date IS NULL AND booking_time IS NOT NULL THEN
-		UPDATE bookings SET start_hour = booking_time
-			WHERE bookings.booking_id = booking_num;
-    END IF;
+	UPDATE bookings
+		SET date = IFNULL(booking_date, date), start_hour = IFNULL(booking_time, start_hour), version = version + 1
+		WHERE bookings.booking_id = booking_num
+			AND (booking_date IS NOT NULL OR booking_time IS NOT NULL);
 END $$
 DELIMITER ;
 
--- display_other_times: given a booking number display other days and times that the room is available
+-- display_other_times: given a booking number, display the days and times between from_date and to_date that the booking's room is free
+-- from_date defaults to the booking's date and to_date to six days after from_date, so by default this returns a week
+-- results are ordered by (date, start_hour); pass the last (date, start_hour) of a page as after_date/after_hour to get the next one
+-- page_size NULL returns every remaining free slot in the range
+-- usage: each lookup is a timeslots primary key range scan for the room plus a probe of the bookings (room_number, building_name, start_hour, date) unique key
 DROP PROCEDURE IF EXISTS display_other_times;
 DELIMITER $$
-CREATE PROCEDURE display_other_times(booking_num INT)
+CREATE PROCEDURE display_other_times(booking_num INT, from_date DATE, to_date DATE, after_date DATE, after_hour INT, page_size INT)
 BEGIN
     -- get the booking's room number and building name
     DECLARE room_num INT;
-    DECLARE building_name VARCHAR(64);
-    SELECT room_number, building_name INTO room_num, building_name FROM bookings WHERE booking_id = booking_num;
-    
-    -- get all timeslots for the room that are not booked
-    SELECT * FROM timeslots
-        WHERE NOT EXISTS (SELECT * FROM bookings 
-                            WHERE bookings.room_number = timeslots.room_number 
-                                AND bookings.building_name = timeslots.building_name 
-                                    AND bookings.start_hour = timeslots.start_hour);
+    DECLARE b_name VARCHAR(64);
+    DECLARE booking_date DATE;
+    DECLARE max_rows INT DEFAULT IFNULL(page_size, 2147483647);
+    SELECT room_number, building_name, date INTO room_num, b_name, booking_date
+        FROM bookings WHERE booking_id = booking_num;
+    SET from_date = IFNULL(from_date, booking_date);
+    SET to_date = IFNULL(to_date, DATE_ADD(from_date, INTERVAL 6 DAY));
+
+    -- get all timeslots for the room on each day in the range that are not booked
+    WITH RECURSIVE days(day) AS (
+        SELECT from_date
+        UNION ALL
+        SELECT DATE_ADD(day, INTERVAL 1 DAY) FROM days WHERE day < to_date
+    )
+    SELECT timeslots.building_name, timeslots.room_number, days.day AS date, timeslots.start_hour
+        FROM timeslots
+            JOIN days
+        WHERE timeslots.room_number = room_num
+            AND timeslots.building_name = b_name
+            AND (after_date IS NULL OR (days.day, timeslots.start_hour) > (after_date, after_hour))
+            AND NOT EXISTS (SELECT * FROM bookings
+                                WHERE bookings.room_number = timeslots.room_number
+                                    AND bookings.building_name = timeslots.building_name
+                                        AND bookings.start_hour = timeslots.start_hour
+                                            AND bookings.date = days.day)
+        ORDER BY days.day, timeslots.start_hour
+        LIMIT max_rows;
+END $$
+DELIMITER ;
+
+-- list_free_times: the listing view of display_other_times, the (date, start_hour) pairs between from_date and to_date that the booking's room is free
+-- the room is the same on every row, so it is not repeated: the caller already has it from the booking it listed
+-- from_date defaults to the booking's date and to_date to six days after from_date; results are ordered by (date, start_hour)
+-- usage: same plan as display_other_times
+DROP PROCEDURE IF EXISTS list_free_times;
+DELIMITER $$
+CREATE PROCEDURE list_free_times(booking_num INT, from_date DATE, to_date DATE)
+BEGIN
+    DECLARE room_num INT;
+    DECLARE b_name VARCHAR(64);
+    DECLARE booking_date DATE;
+    SELECT room_number, building_name, date INTO room_num, b_name, booking_date
+        FROM bookings WHERE booking_id = booking_num;
+    SET from_date = IFNULL(from_date, booking_date);
+    SET to_date = IFNULL(to_date, DATE_ADD(from_date, INTERVAL 6 DAY));
+
+    WITH RECURSIVE days(day) AS (
+        SELECT from_date
+        UNION ALL
+        SELECT DATE_ADD(day, INTERVAL 1 DAY) FROM days WHERE day < to_date
+    )
+    SELECT days.day AS date, timeslots.start_hour
+        FROM timeslots
+            JOIN days
+        WHERE timeslots.room_number = room_num
+            AND timeslots.building_name = b_name
+            AND NOT EXISTS (SELECT * FROM bookings
+                                WHERE bookings.room_number = timeslots.room_number
+                                    AND bookings.building_name = timeslots.building_name
+                                        AND bookings.start_hour = timeslots.start_hour
+                                            AND bookings.date = days.day)
+        ORDER BY days.day, timeslots.start_hour;
 END $$
 DELIMITER ;
 
@@ -158,23 +460,36 @@ DELIMITER ;
 
 -- find_room_with_criteria: Given criteria (capacity, ADA compliant, start time, date, projector, and club association), finds all
 -- rooms that satisfy the user's wants
+-- dates that have been materialized are answered with one range scan of room_availability, other dates fall back to
+-- joining rooms and timeslots and excluding booked rooms
 DROP PROCEDURE IF EXISTS find_room_with_criteria;
 DELIMITER $$
 CREATE PROCEDURE find_room_with_criteria(cap INT, p_ada BOOL, time INT, day DATE, p_projector BOOL, club BOOL, p_campus VARCHAR(64))
 BEGIN
-    SELECT rooms.building, rooms.room_number, rooms.capacity FROM rooms
-		JOIN timeslots
-			ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
-				WHERE rooms.capacity >= cap
-					AND rooms.ada = p_ada
-						AND rooms.projector = p_projector
-							AND rooms.club_only = club
-								AND timeslots.start_hour = time
-									AND rooms.building IN (SELECT name FROM buildings WHERE buildings.campus = p_campus)
-										AND NOT EXISTS (SELECT * FROM bookings WHERE bookings.building_name = rooms.building 
-																AND bookings.room_number = rooms.room_number 
-																	AND bookings.date = day
-																		AND bookings.start_hour = time);
+	IF EXISTS (SELECT * FROM room_availability_dates WHERE date = day) THEN
+		SELECT building, room_number, capacity FROM room_availability
+			WHERE campus = p_campus
+				AND date = day
+					AND start_hour = time
+						AND ada = p_ada
+							AND projector = p_projector
+								AND club_only = club
+									AND capacity >= cap;
+	ELSE
+		SELECT rooms.building, rooms.room_number, rooms.capacity FROM rooms
+			JOIN timeslots
+				ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
+					WHERE rooms.capacity >= cap
+						AND rooms.ada = p_ada
+							AND rooms.projector = p_projector
+								AND rooms.club_only = club
+									AND timeslots.start_hour = time
+										AND rooms.building IN (SELECT name FROM buildings WHERE buildings.campus = p_campus)
+											AND NOT EXISTS (SELECT * FROM bookings WHERE bookings.building_name = rooms.building 
+																	AND bookings.room_number = rooms.room_number 
+																		AND bookings.date = day
+																			AND bookings.start_hour = time);
+	END IF;
 END $$
 DELIMITER ;
 
@@ -207,29 +522,27 @@ CREATE FUNCTION is_officer_of_club(user_nuid INT, club_name VARCHAR(64))
 DELIMITER ;
 
 -- create_booking: Add a new row in the bookings table
+-- usage: returns one row (status, booking_id)
+--   status 'created'  - booking_id is the new booking's id (from AUTO_INCREMENT)
+--   status 'conflict' - the room is already booked for that date and hour
+--   status 'invalid'  - the room has no such timeslot, or the student or organization does not exist
+-- the unique key on (room_number, building_name, start_hour, date) decides races between concurrent callers
 DROP PROCEDURE IF EXISTS create_booking;
 DELIMITER $$
 CREATE PROCEDURE create_booking(user_nuid INT, r_num INT, b_name VARCHAR(64), s_hour INT, day DATE, org_name VARCHAR(64))
 BEGIN
-    -- id of last row for inserting into bookings table
-    DECLARE last_booking_id INT DEFAULT -1;
-	-- error handler, just in case
-	DECLARE duplicate_entry_for_key TINYINT DEFAULT FALSE;
-	DECLARE EXIT HANDLER FOR 1062
-		SET duplicate_entry_for_key = TRUE;
-        
-	-- get last booking_id inserted into table
-    SELECT MAX(booking_id) FROM bookings INTO last_booking_id;
-			
-	INSERT INTO bookings(nuid, room_number, building_name, start_hour, date, booking_id, organization_name)
-		VALUES(user_nuid, r_num, b_name, s_hour, day, last_booking_id + 1, org_name);
-	IF duplicate_entry_for_key = TRUE THEN
-		SELECT 'Row was not inserted - duplicate key encountered.'
-			AS message;
-		SIGNAL SQLSTATE '23000' SET MESSAGE_TEXT = 'Row not inserted - duplicate key encountered.';
-	ELSE
-		SELECT '1 row was inserted';
-	END IF;
+	DECLARE status VARCHAR(16) DEFAULT 'created';
+	-- duplicate key: someone else holds this room, date and hour
+	DECLARE CONTINUE HANDLER FOR 1062
+		SET status = 'conflict';
+	-- foreign key failure: no such timeslot, student or organization
+	DECLARE CONTINUE HANDLER FOR 1452
+		SET status = 'invalid';
+
+	INSERT INTO bookings(nuid, room_number, building_name, start_hour, date, organization_name)
+		VALUES(user_nuid, r_num, b_name, s_hour, day, org_name);
+
+	SELECT status, IF(status = 'created', LAST_INSERT_ID(), NULL) AS booking_id;
 END $$
 DELIMITER ;
 
@@ -241,7 +554,7 @@ BEGIN
 	-- delete from the bookings table if not in signs_in
     DELETE FROM bookings
         WHERE booking_id = booking_num
-        AND booking_num NOT IN (SELECT booking_id FROM signs_in);
+        AND NOT EXISTS (SELECT * FROM signs_in WHERE signs_in.booking_id = booking_num);
 END $$
 DELIMITER ;
 
@@ -301,4 +614,491 @@ BEGIN
 			VALUES(user_nuid, club_name);
 	END IF;
 END $$
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+-- get_room_timeslots: returns every room's attributes and campus once per start hour it can be booked for
+-- usage: loaded once by the in-process availability index (availability.py)
+DROP PROCEDURE IF EXISTS get_room_timeslots;
+DELIMITER $$
+CREATE PROCEDURE get_room_timeslots()
+BEGIN
+	SELECT rooms.building, rooms.room_number, rooms.capacity, rooms.ada, rooms.projector, rooms.club_only,
+			buildings.campus, timeslots.start_hour
+		FROM rooms
+			JOIN buildings ON rooms.building = buildings.name
+			JOIN timeslots ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name;
+END $$
+DELIMITER ;
+
+-- get_bookings_since: returns the room, date and start hour of every booking on or after the given date
+-- usage: loaded by the in-process availability index (availability.py)
+DROP PROCEDURE IF EXISTS get_bookings_since;
+DELIMITER $$
+CREATE PROCEDURE get_bookings_since(day DATE)
+BEGIN
+	SELECT building_name, room_number, date, start_hour FROM bookings
+		WHERE date >= day;
+END $$
+DELIMITER ;
+
+-- update_user_booking: moves one of a student's bookings to a new date, start hour, or both (NULL keeps the current value)
+-- checks that the booking belongs to the student and moves it with a single optimistic UPDATE: no row is locked
+-- while reading, and the move only applies if the booking's version is still the one that was read
+-- (and, if expected_version is given, the one the caller last saw)
+-- the UPDATE waits at most one second (not innodb_lock_wait_timeout) for a row another transaction holds
+-- usage: returns one row (status, building_name, room_number, old_date, old_hour, new_date, new_hour, version)
+--   status 'updated'   - the booking was moved, version is its new version
+--   status 'unchanged' - the new date and hour are the booking's current ones (or both NULL), nothing changed
+--   status 'not_found' - there is no such booking for this student
+--   status 'stale'     - the booking was changed by someone else since it was read, version is the current one
+--   status 'conflict'  - the room is already booked at the new date and hour
+--   status 'invalid'   - the room has no timeslot at the new hour
+--   status 'busy'      - another transaction held the booking or the new slot for too long (or deadlocked), nothing changed
+DROP PROCEDURE IF EXISTS update_user_booking;
+DELIMITER $$
+CREATE PROCEDURE update_user_booking(user_nuid INT, booking_num INT, booking_date DATE, booking_time INT, expected_version INT)
+BEGIN
+	DECLARE status VARCHAR(16) DEFAULT 'updated';
+	DECLARE b_name VARCHAR(64);
+	DECLARE r_num INT;
+	DECLARE old_date DATE;
+	DECLARE old_hour INT;
+	DECLARE old_version INT;
+	DECLARE saved_lock_wait_timeout INT DEFAULT @@SESSION.innodb_lock_wait_timeout;
+	DECLARE CONTINUE HANDLER FOR 1062
+		SET status = 'conflict';
+	DECLARE CONTINUE HANDLER FOR 1452
+		SET status = 'invalid';
+	DECLARE CONTINUE HANDLER FOR 1205, 1213
+		SET status = 'busy';
+	-- the session is a pooled connection, never hand it back with the short timeout
+	DECLARE EXIT HANDLER FOR SQLEXCEPTION
+	BEGIN
+		SET SESSION innodb_lock_wait_timeout = saved_lock_wait_timeout;
+		RESIGNAL;
+	END;
+
+	-- consistent read, takes no locks
+	SELECT building_name, room_number, date, start_hour, version INTO b_name, r_num, old_date, old_hour, old_version
+		FROM bookings
+		WHERE booking_id = booking_num AND nuid = user_nuid;
+
+	IF r_num IS NULL THEN
+		SET status = 'not_found';
+	ELSEIF expected_version IS NOT NULL AND expected_version <> old_version THEN
+		SET status = 'stale';
+	ELSEIF IFNULL(booking_date, old_date) = old_date AND IFNULL(booking_time, old_hour) = old_hour THEN
+		SET status = 'unchanged';
+	ELSE
+		SET SESSION innodb_lock_wait_timeout = 1;
+		UPDATE bookings
+			SET date = IFNULL(booking_date, old_date), start_hour = IFNULL(booking_time, old_hour), version = version + 1
+			WHERE booking_id = booking_num AND nuid = user_nuid AND version = old_version;
+		-- no row matched: the booking was moved (or deleted) between the read and the update
+		IF status = 'updated' AND ROW_COUNT() = 0 THEN
+			SET status = 'stale';
+		END IF;
+		SET SESSION innodb_lock_wait_timeout = saved_lock_wait_timeout;
+	END IF;
+
+	SELECT status, b_name AS building_name, r_num AS room_number, old_date, old_hour,
+			IFNULL(booking_date, old_date) AS new_date, IFNULL(booking_time, old_hour) AS new_hour,
+			IF(status = 'updated', old_version + 1, old_version) AS version;
+END $$
+DELIMITER ;
+
+-- delete_user_booking: deletes one of a student's bookings, provided it has not been signed into yet
+-- checks that the booking belongs to the student and deletes it in a single call
+-- usage: returns one row (status, building_name, room_number, date, start_hour)
+--   status 'deleted'   - the booking was deleted
+--   status 'not_found' - there is no such booking for this student
+--   status 'signed_in' - the booking has already been signed into and is kept
+DROP PROCEDURE IF EXISTS delete_user_booking;
+DELIMITER $$
+CREATE PROCEDURE delete_user_booking(user_nuid INT, booking_num INT)
+BEGIN
+	DECLARE status VARCHAR(16) DEFAULT 'deleted';
+	DECLARE b_name VARCHAR(64);
+	DECLARE r_num INT;
+	DECLARE b_date DATE;
+	DECLARE b_hour INT;
+
+	SELECT building_name, room_number, date, start_hour INTO b_name, r_num, b_date, b_hour
+		FROM bookings
+		WHERE booking_id = booking_num AND nuid = user_nuid
+		FOR UPDATE;
+
+	IF r_num IS NULL THEN
+		SET status = 'not_found';
+	ELSEIF EXISTS (SELECT * FROM signs_in WHERE booking_id = booking_num) THEN
+		SET status = 'signed_in';
+	ELSE
+		DELETE FROM bookings WHERE booking_id = booking_num;
+	END IF;
+
+	SELECT status, b_name AS building_name, r_num AS room_number, b_date AS date, b_hour AS start_hour;
+END $$
+DELIMITER ;
+
+-- check_into_user_booking: signs a student into one of their bookings
+-- checks that the booking belongs to the student and inserts into signs_in in a single statement
+-- usage: returns one row (status)
+--   status 'signed_in'         - the student is now signed in
+--   status 'not_found'         - there is no such booking for this student
+--   status 'already_signed_in' - the booking was already signed into
+DROP PROCEDURE IF EXISTS check_into_user_booking;
+DELIMITER $$
+CREATE PROCEDURE check_into_user_booking(user_nuid INT, booking_num INT)
+BEGIN
+	DECLARE status VARCHAR(32) DEFAULT 'signed_in';
+	DECLARE CONTINUE HANDLER FOR 1062
+		SET status = 'already_signed_in';
+
+	INSERT INTO signs_in(nuid, booking_id)
+		SELECT nuid, booking_id FROM bookings
+			WHERE booking_id = booking_num AND nuid = user_nuid;
+
+	IF status = 'signed_in' AND ROW_COUNT() = 0 THEN
+		SET status = 'not_found';
+	END IF;
+
+	SELECT status;
+END $$
+DELIMITER ;
+
+-- get_reference_data: returns the rarely changing reference data as four result sets, in one round trip
+-- campuses, buildings with their campus, organizations, and rooms with their attributes
+-- usage: loaded by the process-level reference data cache (reference_cache.py)
+DROP PROCEDURE IF EXISTS get_reference_data;
+DELIMITER $$
+CREATE PROCEDURE get_reference_data()
+BEGIN
+	SELECT name FROM campuses;
+	SELECT name, campus FROM buildings;
+	SELECT name FROM organizations;
+	SELECT building, room_number, capacity, ada, projector, club_only FROM rooms;
+END $$
+DELIMITER ;
+
+-- create_bookings_batch: books one room for many (date, start hour) slots in a single call, e.g. a weekly club meeting
+-- slots is a JSON array like [{"date": "2024-04-02", "hour": 18}, ...]; duplicate slots are booked once
+-- availability of every slot is checked with set-based queries, then all free slots are inserted with one INSERT ... SELECT
+-- if all_or_nothing is TRUE nothing is inserted unless every slot is free
+-- usage: returns one row per slot (date, start_hour, status, booking_id)
+--   status 'created'  - booked, booking_id is the new booking
+--   status 'conflict' - the room is already booked then, booking_id is the existing booking
+--   status 'invalid'  - the room has no timeslot at that hour, or the student or organization does not exist
+--   status 'skipped'  - all_or_nothing was set and another slot was not free
+DROP PROCEDURE IF EXISTS create_bookings_batch;
+DELIMITER $$
+CREATE PROCEDURE create_bookings_batch(user_nuid INT, r_num INT, b_name VARCHAR(64), org_name VARCHAR(64), slots JSON, all_or_nothing BOOL)
+BEGIN
+	DROP TEMPORARY TABLE IF EXISTS batch_slots;
+	CREATE TEMPORARY TABLE batch_slots(
+		date DATE,
+		start_hour INT,
+		status VARCHAR(16) DEFAULT 'pending',
+		booking_id INT,
+		PRIMARY KEY (date, start_hour));
+
+	INSERT IGNORE INTO batch_slots(date, start_hour)
+		SELECT slot.date, slot.hour
+			FROM JSON_TABLE(slots, '$[*]' COLUMNS(date DATE PATH '$.date', hour INT PATH '$.hour')) AS slot;
+
+	-- hours the room cannot be booked for
+	UPDATE batch_slots
+		LEFT JOIN timeslots ON timeslots.room_number = r_num
+			AND timeslots.building_name = b_name
+				AND timeslots.start_hour = batch_slots.start_hour
+		SET batch_slots.status = 'invalid'
+		WHERE timeslots.start_hour IS NULL;
+
+	-- slots someone already holds
+	UPDATE batch_slots
+		JOIN bookings ON bookings.room_number = r_num
+			AND bookings.building_name = b_name
+				AND bookings.start_hour = batch_slots.start_hour
+					AND bookings.date = batch_slots.date
+		SET batch_slots.status = 'conflict', batch_slots.booking_id = bookings.booking_id
+		WHERE batch_slots.status = 'pending';
+
+	IF all_or_nothing AND EXISTS (SELECT * FROM batch_slots WHERE status <> 'pending') THEN
+		UPDATE batch_slots SET status = 'skipped' WHERE status = 'pending';
+	ELSE
+		-- IGNORE: a slot taken by a concurrent caller since the check above is skipped instead of failing the batch
+		INSERT IGNORE INTO bookings(nuid, room_number, building_name, start_hour, date, organization_name)
+			SELECT user_nuid, r_num, b_name, start_hour, date, org_name FROM batch_slots
+				WHERE status = 'pending';
+
+		UPDATE batch_slots
+			JOIN bookings ON bookings.room_number = r_num
+				AND bookings.building_name = b_name
+					AND bookings.start_hour = batch_slots.start_hour
+						AND bookings.date = batch_slots.date
+			SET batch_slots.status = IF(bookings.nuid = user_nuid, 'created', 'conflict'),
+				batch_slots.booking_id = bookings.booking_id
+			WHERE batch_slots.status = 'pending';
+
+		-- anything still pending was skipped by the insert for a foreign key failure (unknown student or organization)
+		UPDATE batch_slots SET status = 'invalid' WHERE status = 'pending';
+	END IF;
+
+	SELECT date, start_hour, status, booking_id FROM batch_slots ORDER BY date, start_hour;
+	DROP TEMPORARY TABLE batch_slots;
+END $$
+DELIMITER ;
+
+-- check_into_bookings_batch: signs many students into their bookings in one call, e.g. a kiosk or door scanner at the top of the hour
+-- scans is a JSON array like [{"booking_id": 12, "nuid": 1234}, ...]; repeated scans of the same booking are applied once
+-- ownership and earlier sign ins are checked with set-based queries, then every remaining scan is inserted with one INSERT IGNORE ... SELECT
+-- usage: returns one row per distinct booking (booking_id, nuid, status)
+--   status 'signed_in'         - the student is now signed in
+--   status 'already_signed_in' - the booking was already signed into
+--   status 'not_found'         - there is no such booking for this student
+DROP PROCEDURE IF EXISTS check_into_bookings_batch;
+DELIMITER $$
+CREATE PROCEDURE check_into_bookings_batch(scans JSON)
+BEGIN
+	DROP TEMPORARY TABLE IF EXISTS batch_scans;
+	CREATE TEMPORARY TABLE batch_scans(
+		booking_id INT PRIMARY KEY,
+		nuid INT,
+		status VARCHAR(32) DEFAULT 'pending');
+
+	INSERT IGNORE INTO batch_scans(booking_id, nuid)
+		SELECT scan.booking_id, scan.nuid
+			FROM JSON_TABLE(scans, '$[*]' COLUMNS(booking_id INT PATH '$.booking_id', nuid INT PATH '$.nuid')) AS scan;
+
+	-- bookings that do not exist or belong to someone else
+	UPDATE batch_scans
+		LEFT JOIN bookings ON bookings.booking_id = batch_scans.booking_id
+			AND bookings.nuid = batch_scans.nuid
+		SET batch_scans.status = 'not_found'
+		WHERE bookings.booking_id IS NULL;
+
+	UPDATE batch_scans
+		JOIN signs_in ON signs_in.booking_id = batch_scans.booking_id
+		SET batch_scans.status = 'already_signed_in'
+		WHERE batch_scans.status = 'pending';
+
+	-- IGNORE: a booking signed into by a concurrent scan, or deleted (a foreign key failure), since the checks above
+	-- is skipped instead of failing the batch
+	INSERT IGNORE INTO signs_in(nuid, booking_id)
+		SELECT nuid, booking_id FROM batch_scans
+			WHERE status = 'pending';
+
+	-- the status comes from what is in signs_in now: signed into by this batch or by the concurrent scan
+	UPDATE batch_scans
+		JOIN signs_in ON signs_in.booking_id = batch_scans.booking_id
+		SET batch_scans.status = 'signed_in'
+		WHERE batch_scans.status = 'pending';
+
+	-- anything still pending was skipped by the insert because its booking was deleted in the meantime
+	UPDATE batch_scans SET status = 'not_found' WHERE status = 'pending';
+
+	SELECT booking_id, nuid, status FROM batch_scans;
+	DROP TEMPORARY TABLE batch_scans;
+END $$
+DELIMITER ;
+
+-- archive_bookings: moves up to batch_size bookings dated before before_date, and their signs_in rows, into the archive tables
+-- run repeatedly (see archiver.py) until it reports 0 rows moved; each call is one short transaction
+-- usage: returns one row (moved)
+DROP PROCEDURE IF EXISTS archive_bookings;
+DELIMITER $$
+CREATE PROCEDURE archive_bookings(before_date DATE, batch_size INT)
+BEGIN
+	DROP TEMPORARY TABLE IF EXISTS archive_batch;
+	CREATE TEMPORARY TABLE archive_batch(booking_id INT PRIMARY KEY);
+
+	-- oldest bookings first, reading them here share-locks them until the transaction ends
+	INSERT INTO archive_batch
+		SELECT booking_id FROM bookings
+			WHERE date < before_date
+			ORDER BY date, start_hour
+			LIMIT batch_size;
+
+	INSERT INTO bookings_archive(nuid, room_number, building_name, start_hour, date, booking_id, organization_name)
+		SELECT bookings.nuid, bookings.room_number, bookings.building_name, bookings.start_hour, bookings.date,
+				bookings.booking_id, bookings.organization_name
+			FROM bookings JOIN archive_batch ON bookings.booking_id = archive_batch.booking_id;
+	INSERT INTO signs_in_archive(nuid, booking_id)
+		SELECT signs_in.nuid, signs_in.booking_id
+			FROM signs_in JOIN archive_batch ON signs_in.booking_id = archive_batch.booking_id;
+
+	DELETE signs_in FROM signs_in JOIN archive_batch ON signs_in.booking_id = archive_batch.booking_id;
+	DELETE bookings FROM bookings JOIN archive_batch ON bookings.booking_id = archive_batch.booking_id;
+
+	SELECT COUNT(*) AS moved FROM archive_batch;
+	DROP TEMPORARY TABLE archive_batch;
+END $$
+DELIMITER ;
+
+-- rebuild_room_availability: (re)builds room_availability for every date from from_date to to_date, e.g. for a new semester
+-- also drops materialized dates before today; run it again for any date range after changing rooms or timeslots
+-- usage: returns one row (dates, free_slots)
+DROP PROCEDURE IF EXISTS rebuild_room_availability;
+DELIMITER $$
+CREATE PROCEDURE rebuild_room_availability(from_date DATE, to_date DATE)
+BEGIN
+	DELETE FROM room_availability WHERE date < CURDATE() OR date BETWEEN from_date AND to_date;
+	DELETE FROM room_availability_dates WHERE date < CURDATE() OR date BETWEEN from_date AND to_date;
+
+	INSERT INTO room_availability_dates(date)
+		WITH RECURSIVE days(day) AS (
+			SELECT from_date
+			UNION ALL
+			SELECT DATE_ADD(day, INTERVAL 1 DAY) FROM days WHERE day < to_date
+		)
+		SELECT day FROM days;
+
+	INSERT INTO room_availability(campus, date, start_hour, ada, projector, club_only, capacity, building, room_number)
+		SELECT buildings.campus, room_availability_dates.date, timeslots.start_hour, rooms.ada, rooms.projector,
+				rooms.club_only, rooms.capacity, rooms.building, rooms.room_number
+			FROM rooms
+				JOIN buildings ON rooms.building = buildings.name
+				JOIN timeslots ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
+				JOIN room_availability_dates ON room_availability_dates.date BETWEEN from_date AND to_date
+			WHERE NOT EXISTS (SELECT * FROM bookings
+								WHERE bookings.room_number = rooms.room_number
+									AND bookings.building_name = rooms.building
+										AND bookings.start_hour = timeslots.start_hour
+											AND bookings.date = room_availability_dates.date);
+
+	SELECT DATEDIFF(to_date, from_date) + 1 AS dates, ROW_COUNT() AS free_slots;
+END $$
+DELIMITER ;
+
+-- get_stale_usage_dates: the summarized days whose bookings or sign ins have changed since, oldest first
+-- usage: returns one row (date) per day to summarize again
+DROP PROCEDURE IF EXISTS get_stale_usage_dates;
+DELIMITER $$
+CREATE PROCEDURE get_stale_usage_dates()
+BEGIN
+	SELECT date FROM usage_stale_dates ORDER BY date;
+END $$
+DELIMITER ;
+
+-- get_usage_watermark: the last day summarized into room_day_usage/hourly_demand (NULL before the first run),
+-- and the date of the earliest booking, hot or archived, to start from on the first run
+-- usage: returns one row (through_date, first_date), both lookups read an index on date
+DROP PROCEDURE IF EXISTS get_usage_watermark;
+DELIMITER $$
+CREATE PROCEDURE get_usage_watermark()
+BEGIN
+	SELECT (SELECT through_date FROM report_watermark WHERE name = 'usage') AS through_date,
+		(SELECT MIN(first_date) FROM (SELECT MIN(date) AS first_date FROM bookings
+										UNION ALL
+										SELECT MIN(date) FROM bookings_archive) AS firsts) AS first_date;
+END $$
+DELIMITER ;
+
+-- summarize_usage_day: (re)writes the room_day_usage and hourly_demand rows of one finished day and advances the watermark
+-- reads that day's bookings, hot and archived, through their date indexes and probes signs_in by primary key, so it costs
+-- one day of bookings however much history there is; run it in READ COMMITTED so the reads take no locks on bookings
+-- also clears the day from usage_stale_dates
+-- usage: returns one row (bookings) with the number of bookings summarized
+DROP PROCEDURE IF EXISTS summarize_usage_day;
+DELIMITER $$
+CREATE PROCEDURE summarize_usage_day(day DATE)
+BEGIN
+	-- first, so a change committed after the day is read below marks the day stale again instead of being lost
+	DELETE FROM usage_stale_dates WHERE date = day;
+
+	DROP TEMPORARY TABLE IF EXISTS usage_day;
+	CREATE TEMPORARY TABLE usage_day(
+		building_name VARCHAR(64),
+		room_number INT,
+		start_hour INT,
+		signed_in BOOLEAN);
+
+	INSERT INTO usage_day
+		SELECT bookings.building_name, bookings.room_number, bookings.start_hour, signs_in.booking_id IS NOT NULL
+			FROM bookings LEFT JOIN signs_in ON signs_in.booking_id = bookings.booking_id
+			WHERE bookings.date = day
+		UNION ALL
+		SELECT bookings_archive.building_name, bookings_archive.room_number, bookings_archive.start_hour,
+				signs_in_archive.booking_id IS NOT NULL
+			FROM bookings_archive LEFT JOIN signs_in_archive ON signs_in_archive.booking_id = bookings_archive.booking_id
+			WHERE bookings_archive.date = day;
+
+	DELETE FROM room_day_usage WHERE date = day;
+	INSERT INTO room_day_usage(date, building_name, room_number, booked_hours, signed_in_hours)
+		SELECT day, building_name, room_number, COUNT(*), SUM(signed_in)
+			FROM usage_day
+			GROUP BY building_name, room_number;
+
+	DELETE FROM hourly_demand WHERE date = day;
+	INSERT INTO hourly_demand(date, campus, start_hour, bookings, signed_in)
+		SELECT day, buildings.campus, usage_day.start_hour, COUNT(*), SUM(usage_day.signed_in)
+			FROM usage_day JOIN buildings ON usage_day.building_name = buildings.name
+			GROUP BY buildings.campus, usage_day.start_hour;
+
+	INSERT INTO report_watermark(name, through_date) VALUES ('usage', day)
+		ON DUPLICATE KEY UPDATE through_date = GREATEST(through_date, day);
+
+	SELECT COUNT(*) AS bookings FROM usage_day;
+	DROP TEMPORARY TABLE usage_day;
+END $$
+DELIMITER ;
+
+-- find_room_page: one page of find_room_with_criteria results, ordered by (capacity, building, room_number)
+-- pass the last row of a page as after_capacity/after_building/after_room (all NULL for the first page) to get the next one
+-- later pages start their range at the cursor's capacity and spell the "after the cursor" test out column by column:
+-- MySQL cannot use a row constructor comparison inside an OR as a range, and would rescan every row up to the cursor
+-- materialized dates read the room_availability primary key in exactly this order
+DROP PROCEDURE IF EXISTS find_room_page;
+DELIMITER $$
+CREATE PROCEDURE find_room_page(cap INT, p_ada BOOL, time INT, day DATE, p_projector BOOL, club BOOL, p_campus VARCHAR(64),
+								after_capacity INT, after_building VARCHAR(64), after_room INT, page_size INT)
+BEGIN
+	IF EXISTS (SELECT * FROM room_availability_dates WHERE date = day) THEN
+		IF after_capacity IS NULL THEN
+			SELECT building, room_number, capacity FROM room_availability
+				WHERE campus = p_campus AND date = day AND start_hour = time
+					AND ada = p_ada AND projector = p_projector AND club_only = club
+					AND capacity >= cap
+				ORDER BY capacity, building, room_number
+				LIMIT page_size;
+		ELSE
+			SELECT building, room_number, capacity FROM room_availability
+				WHERE campus = p_campus AND date = day AND start_hour = time
+					AND ada = p_ada AND projector = p_projector AND club_only = club
+					AND capacity >= GREATEST(cap, after_capacity)
+					AND (capacity > after_capacity
+						OR (capacity = after_capacity
+							AND (building > after_building
+								OR (building = after_building AND room_number > after_room))))
+				ORDER BY capacity, building, room_number
+				LIMIT page_size;
+		END IF;
+	ELSEIF after_capacity IS NULL THEN
+		SELECT rooms.building, rooms.room_number, rooms.capacity FROM rooms
+			JOIN timeslots ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
+			WHERE rooms.capacity >= cap
+				AND rooms.ada = p_ada AND rooms.projector = p_projector AND rooms.club_only = club
+				AND timeslots.start_hour = time
+				AND rooms.building IN (SELECT name FROM buildings WHERE buildings.campus = p_campus)
+				AND NOT EXISTS (SELECT * FROM bookings WHERE bookings.building_name = rooms.building
+									AND bookings.room_number = rooms.room_number
+									AND bookings.date = day AND bookings.start_hour = time)
+			ORDER BY rooms.capacity, rooms.building, rooms.room_number
+			LIMIT page_size;
+	ELSE
+		SELECT rooms.building, rooms.room_number, rooms.capacity FROM rooms
+			JOIN timeslots ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
+			WHERE rooms.capacity >= GREATEST(cap, after_capacity)
+				AND (rooms.capacity > after_capacity
+					OR (rooms.capacity = after_capacity
+						AND (rooms.building > after_building
+							OR (rooms.building = after_building AND rooms.room_number > after_room))))
+				AND rooms.ada = p_ada AND rooms.projector = p_projector AND rooms.club_only = club
+				AND timeslots.start_hour = time
+				AND rooms.building IN (SELECT name FROM buildings WHERE buildings.campus = p_campus)
+				AND NOT EXISTS (SELECT * FROM bookings WHERE bookings.building_name = rooms.building
+									AND bookings.room_number = rooms.room_number
+									AND bookings.date = day AND bookings.start_hour = time)
+			ORDER BY rooms.capacity, rooms.building, rooms.room_number
+			LIMIT page_size;
+	END IF;
+END $$
+DELIMITER ;
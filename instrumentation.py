@@ -0,0 +1,248 @@
+import json
+import logging
+import threading
+import time
+
+import pymysql
+
+# Timing instrumentation for stored procedure calls
+# When an Instrumentation is attached to a ConnectionPool (and enabled), every cursor the pool hands out is
+# wrapped in an InstrumentedCursor, which records for each callproc: the procedure name, the types of its
+# arguments (never their values), the rows returned or affected, the wall time from the call until its
+# results were read, optionally the server side execution time, and the latency of the commit that ended
+# the block. Each call is logged as one JSON line on the 'final_project.sql' logger and added to a
+# MetricsRegistry of counters and latency histograms that can be dumped as JSON or scraped as text.
+# With no Instrumentation attached (the default) or with enabled = False, the pool only pays for one
+# attribute check per cursor.
+#
+# usage:
+#   instrumentation = Instrumentation()
+#   pool.instrumentation = instrumentation
+#   ...
+#   print(json.dumps(instrumentation.registry.snapshot(), indent=2))
+
+logger = logging.getLogger('final_project.sql')
+
+# upper bounds, in milliseconds, of the latency histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# execution time of the connection's most recent CALL, in picoseconds, from the performance schema
+SERVER_TIME_QUERY = """SELECT TIMER_WAIT FROM performance_schema.events_statements_history
+                           WHERE THREAD_ID = PS_CURRENT_THREAD_ID()
+                               AND EVENT_NAME = 'statement/sql/call_procedure'
+                       ORDER BY EVENT_ID DESC LIMIT 1"""
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'count': self.count,
+                'sum': round(self.sum, 3),
+                'mean': round(self.sum / self.count, 3) if self.count else 0.0,
+                'max': round(self.max, 3),
+                'buckets': dict(zip(bounds, self.counts))}
+
+
+# Thread safe counters and histograms, each keyed by (metric name, procedure)
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name: str, procedure: str, amount: int = 1) -> None:
+        with self._lock:
+            key = (name, procedure)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, procedure: str, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get((name, procedure))
+            if histogram is None:
+                histogram = self._histograms[(name, procedure)] = Histogram()
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # Returns {metric name: {procedure: value}}, histograms as count/sum/mean/max/buckets
+    def snapshot(self) -> dict:
+        result = {}
+        with self._lock:
+            for (name, procedure), value in sorted(self._counters.items()):
+                result.setdefault(name, {})[procedure] = value
+            for (name, procedure), histogram in sorted(self._histograms.items()):
+                result.setdefault(name, {})[procedure] = histogram.snapshot()
+        return result
+
+    # Renders every metric in the Prometheus text exposition format, for scraping
+    def render_text(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, procedure), value in sorted(self._counters.items()):
+                lines.append('%s{procedure="%s"} %d' % (name, procedure, value))
+            for (name, procedure), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{procedure="%s",le="%s"} %d' % (name, procedure, bound, cumulative))
+                lines.append('%s_sum{procedure="%s"} %.3f' % (name, procedure, histogram.sum))
+                lines.append('%s_count{procedure="%s"} %d' % (name, procedure, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+class Instrumentation:
+    # server_timing also reads each call's execution time from the performance schema, at the cost of one
+    # extra query per call; it switches itself off if the performance schema is not available
+    def __init__(self, registry: MetricsRegistry = None, server_timing: bool = False, enabled: bool = True):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.server_timing = server_timing
+        self.enabled = enabled
+
+    def wrap(self, cursor) -> 'InstrumentedCursor':
+        return InstrumentedCursor(cursor, self)
+
+    # Adds one finished call to the metrics and the log
+    def record(self, call: dict) -> None:
+        procedure = call['procedure']
+        registry = self.registry
+        registry.increment('sql_calls_total', procedure)
+        if call['error'] is not None:
+            registry.increment('sql_errors_total', procedure)
+        registry.increment('sql_rows_returned_total', procedure, call['rows_returned'])
+        registry.increment('sql_rows_affected_total', procedure, call['rows_affected'])
+        registry.observe('sql_wall_ms', procedure, call['wall_ms'])
+        if call['server_ms'] is not None:
+            registry.observe('sql_server_ms', procedure, call['server_ms'])
+        if call['commit_ms'] is not None:
+            registry.observe('sql_commit_ms', procedure, call['commit_ms'])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(call))
+
+
+# Cursor proxy that times callproc and counts the rows read back, everything else is passed straight through
+class InstrumentedCursor:
+    def __init__(self, cursor, instrumentation: Instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        # the call whose results are being read, as (record, start time)
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def callproc(self, procname: str, args=()):
+        self.finish()
+        call = {'procedure': procname,
+                'args': [type(arg).__name__ for arg in args],
+                'rows_returned': 0,
+                'rows_affected': 0,
+                'wall_ms': 0.0,
+                'server_ms': None,
+                'commit_ms': None,
+                'error': None}
+        start = time.perf_counter()
+        try:
+            result = self._cursor.callproc(procname, args)
+        except Exception as e:
+            call['wall_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            call['error'] = type(e).__name__
+            self._instrumentation.record(call)
+            raise
+        if self._cursor.description is None:
+            call['rows_affected'] = max(self._cursor.rowcount, 0)
+        self._pending = (call, start)
+        return result
+
+    def execute(self, query, args=None):
+        self.finish()
+        return self._cursor.execute(query, args)
+
+    def _count(self, rows: int) -> None:
+        if self._pending is not None:
+            self._pending[0]['rows_returned'] += rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+    def fetchall_unbuffered(self):
+        for row in self._cursor.fetchall_unbuffered():
+            self._count(1)
+            yield row
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count(1)
+            yield row
+
+    # Reads the server side execution time of the connection's last CALL, in milliseconds
+    def _server_ms(self):
+        try:
+            with self._cursor.connection.cursor(pymysql.cursors.Cursor) as cur:
+                cur.execute(SERVER_TIME_QUERY)
+                row = cur.fetchone()
+        except pymysql.err.MySQLError:
+            self._instrumentation.server_timing = False
+            return None
+        return round(row[0] / 1e9, 3) if row is not None else None
+
+    # Stops the clock on the call whose results were being read and returns its record (None if there is none)
+    def _take_pending(self):
+        if self._pending is None:
+            return None
+        call, start = self._pending
+        self._pending = None
+        call['wall_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        if self._instrumentation.server_timing:
+            call['server_ms'] = self._server_ms()
+        return call
+
+    # Records the call whose results were being read, if any
+    def finish(self) -> None:
+        call = self._take_pending()
+        if call is not None:
+            self._instrumentation.record(call)
+
+    # Commits the connection, recording the last call of the block together with the commit latency
+    def commit(self, cxn) -> None:
+        call = self._take_pending()
+        start = time.perf_counter()
+        try:
+            cxn.commit()
+        finally:
+            if call is not None:
+                call['commit_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                self._instrumentation.record(call)
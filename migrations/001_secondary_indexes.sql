@@ -0,0 +1,20 @@
+-- 001_secondary_indexes: secondary and covering indexes for the booking procedures
+-- finalProject.sql creates these for new databases, run this once against a database created before them
+-- usage: mysql -u root -p final_project < migrations/001_secondary_indexes.sql
+USE final_project;
+
+-- get_user_bookings: bookings of one student, in date order
+ALTER TABLE bookings ADD INDEX idx_bookings_nuid_date (nuid, date, start_hour);
+
+-- get_bookings_since and other date range scans, also covers "which rooms are booked at this date and hour"
+ALTER TABLE bookings ADD INDEX idx_bookings_date_hour (date, start_hour, building_name, room_number);
+
+-- find_room_with_criteria: equality on the three flags then a range on capacity
+-- the primary key (room_number, building) is appended by InnoDB, so the index covers the whole search
+ALTER TABLE rooms ADD INDEX idx_rooms_search (ada, projector, club_only, capacity);
+
+-- find_room_with_criteria: all rooms that have a given start hour
+ALTER TABLE timeslots ADD INDEX idx_timeslots_hour (start_hour, building_name, room_number);
+
+-- buildings by campus, covering the building name
+ALTER TABLE buildings ADD INDEX idx_buildings_campus (campus, name);
@@ -0,0 +1,36 @@
+-- 002_booking_versions: per-student booking version, bumped by triggers on bookings
+-- finalProject.sql creates these for new databases, run this once against a database created before them
+-- usage: mysql -u root -p final_project < migrations/002_booking_versions.sql
+USE final_project;
+
+ALTER TABLE students ADD COLUMN booking_version int NOT NULL DEFAULT 0;
+
+DROP TRIGGER IF EXISTS bookings_version_insert;
+DELIMITER $$
+CREATE TRIGGER bookings_version_insert AFTER INSERT ON bookings FOR EACH ROW
+BEGIN
+	IF @skip_booking_version IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_version_update;
+DELIMITER $$
+CREATE TRIGGER bookings_version_update AFTER UPDATE ON bookings FOR EACH ROW
+BEGIN
+	IF @skip_booking_version IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_version_delete;
+DELIMITER $$
+CREATE TRIGGER bookings_version_delete AFTER DELETE ON bookings FOR EACH ROW
+BEGIN
+	IF @skip_booking_version IS NULL THEN
+		UPDATE students SET booking_version = booking_version + 1 WHERE nuid = OLD.nuid;
+	END IF;
+END $$
+DELIMITER ;
@@ -0,0 +1,21 @@
+-- 003_booking_archive: archive tables for past bookings and sign ins
+-- finalProject.sql creates these (and the archive_bookings procedure) for new databases,
+-- run this once against a database created before them, then re-run finalProject.sql for the procedure
+-- usage: mysql -u root -p final_project < migrations/003_booking_archive.sql
+USE final_project;
+
+CREATE TABLE IF NOT EXISTS bookings_archive(
+	nuid int,
+    room_number int,
+    building_name  VARCHAR(64),
+    start_hour int,
+    date date,
+    booking_id int PRIMARY KEY,
+    organization_name VARCHAR(64),
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_bookings_archive_nuid_date (nuid, date),
+    INDEX idx_bookings_archive_date (date));
+
+CREATE TABLE IF NOT EXISTS signs_in_archive(
+	nuid int NOT NULL,
+    booking_id int PRIMARY KEY);
@@ -0,0 +1,69 @@
+-- 004_room_availability: materialized room availability, kept current by triggers on bookings
+-- finalProject.sql creates these (and the updated find_room_with_criteria plus rebuild_room_availability) for new
+-- databases; run this once against a database created before them, re-run finalProject.sql for the procedures,
+-- then build the dates you need with rebuild_availability.py
+-- usage: mysql -u root -p final_project < migrations/004_room_availability.sql
+USE final_project;
+
+-- room_availability: free rooms per (campus, date, start hour), with the room attributes find_room_with_criteria filters on
+-- maintained by the bookings_availability_* triggers for every date in room_availability_dates, rebuilt with rebuild_room_availability
+-- the primary key puts every equality filter first and capacity last, so a search is a single range scan
+CREATE TABLE IF NOT EXISTS room_availability(
+	campus VARCHAR(64),
+    date date,
+    start_hour int,
+    ada boolean,
+    projector boolean,
+    club_only boolean,
+    capacity int,
+    building VARCHAR(64),
+    room_number int,
+    PRIMARY KEY (campus, date, start_hour, ada, projector, club_only, capacity, building, room_number),
+    UNIQUE INDEX idx_room_availability_slot (building, room_number, date, start_hour));
+
+-- dates that room_availability has been built for, searches on other dates fall back to the bookings anti-join
+CREATE TABLE IF NOT EXISTS room_availability_dates(
+	date date PRIMARY KEY);
+
+-- bookings_availability_*: keep room_availability in step with bookings, in the same transaction as the booking change
+-- a booked slot is removed from room_availability, a freed slot is put back if its date is materialized
+DROP TRIGGER IF EXISTS bookings_availability_insert;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_insert AFTER INSERT ON bookings FOR EACH ROW
+BEGIN
+	DELETE FROM room_availability
+		WHERE building = NEW.building_name AND room_number = NEW.room_number
+			AND date = NEW.date AND start_hour = NEW.start_hour;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_availability_update;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_update AFTER UPDATE ON bookings FOR EACH ROW
+BEGIN
+	DELETE FROM room_availability
+		WHERE building = NEW.building_name AND room_number = NEW.room_number
+			AND date = NEW.date AND start_hour = NEW.start_hour;
+	IF EXISTS (SELECT * FROM room_availability_dates WHERE date = OLD.date) THEN
+		INSERT IGNORE INTO room_availability(campus, date, start_hour, ada, projector, club_only, capacity, building, room_number)
+			SELECT buildings.campus, OLD.date, OLD.start_hour, rooms.ada, rooms.projector, rooms.club_only,
+					rooms.capacity, rooms.building, rooms.room_number
+				FROM rooms JOIN buildings ON rooms.building = buildings.name
+				WHERE rooms.building = OLD.building_name AND rooms.room_number = OLD.room_number;
+	END IF;
+END $$
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS bookings_availability_delete;
+DELIMITER $$
+CREATE TRIGGER bookings_availability_delete AFTER DELETE ON bookings FOR EACH ROW
+BEGIN
+	IF EXISTS (SELECT * FROM room_availability_dates WHERE date = OLD.date) THEN
+		INSERT IGNORE INTO room_availability(campus, date, start_hour, ada, projector, club_only, capacity, building, room_number)
+			SELECT buildings.campus, OLD.date, OLD.start_hour, rooms.ada, rooms.projector, rooms.club_only,
+					rooms.capacity, rooms.building, rooms.room_number
+				FROM rooms JOIN buildings ON rooms.building = buildings.name
+				WHERE rooms.building = OLD.building_name AND rooms.room_number = OLD.room_number;
+	END IF;
+END $$
+DELIMITER ;
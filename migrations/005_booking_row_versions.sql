@@ -0,0 +1,7 @@
+-- 005_booking_row_versions: per-booking version, checked and bumped by update_user_booking
+-- finalProject.sql creates this for new databases; run this once against a database created before it,
+-- then re-run finalProject.sql for the updated procedures
+-- usage: mysql -u root -p final_project < migrations/005_booking_row_versions.sql
+USE final_project;
+
+ALTER TABLE bookings ADD COLUMN version int NOT NULL DEFAULT 0;
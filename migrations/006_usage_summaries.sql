@@ -0,0 +1,30 @@
+-- 006_usage_summaries: utilization summary tables for reporting.py
+-- finalProject.sql creates these (and the summarize_usage_day and get_usage_watermark procedures) for new databases;
+-- run this once against a database created before them, re-run finalProject.sql for the procedures,
+-- then fill them with python reporting.py summarize
+-- usage: mysql -u root -p final_project < migrations/006_usage_summaries.sql
+USE final_project;
+
+-- room_day_usage and hourly_demand: utilization summaries written by summarize_usage_day (see reporting.py), bookings and
+-- how many of them were signed into per room and day, and per campus, day and start hour; reports read these instead of bookings
+CREATE TABLE IF NOT EXISTS room_day_usage(
+	date date,
+    building_name VARCHAR(64),
+    room_number int,
+    booked_hours int NOT NULL,
+    signed_in_hours int NOT NULL,
+    PRIMARY KEY (date, building_name, room_number));
+
+CREATE TABLE IF NOT EXISTS hourly_demand(
+	date date,
+    campus VARCHAR(64),
+    start_hour int,
+    bookings int NOT NULL,
+    signed_in int NOT NULL,
+    PRIMARY KEY (date, campus, start_hour));
+
+-- report_watermark: the last day each summary has been brought up to
+CREATE TABLE IF NOT EXISTS report_watermark(
+	name VARCHAR(64) PRIMARY KEY,
+    through_date date NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP);
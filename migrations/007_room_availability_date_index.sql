@@ -0,0 +1,6 @@
+-- 007_room_availability_date_index: lets rebuild_room_availability delete whole dates without scanning room_availability
+-- finalProject.sql creates this for new databases; run this once against a database created before it
+-- usage: mysql -u root -p final_project < migrations/007_room_availability_date_index.sql
+USE final_project;
+
+ALTER TABLE room_availability ADD INDEX idx_room_availability_date (date);
@@ -0,0 +1,10 @@
+-- 008_usage_stale_dates: days to summarize again because their bookings or sign ins changed after they were summarized
+-- finalProject.sql creates this (and the usage_stale_* triggers and get_stale_usage_dates) for new databases;
+-- run this once against a database created before it, then re-run finalProject.sql for the triggers and procedures
+-- usage: mysql -u root -p final_project < migrations/008_usage_stale_dates.sql
+USE final_project;
+
+-- usage_stale_dates: summarized days whose bookings or sign ins changed afterwards, written by the usage_stale_* triggers
+-- and summarized again (and removed) by summarize_usage_day
+CREATE TABLE IF NOT EXISTS usage_stale_dates(
+	date date PRIMARY KEY);
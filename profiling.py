@@ -0,0 +1,169 @@
+import cProfile
+import functools
+import os
+import pstats
+import time
+import tracemalloc
+import types
+
+# Profiling mode for app.py (python app.py --profile session.txt)
+# A SessionProfiler replays a recorded session: input() answers come from the script, one line per prompt,
+# instead of the keyboard, and the password prompt reads FINAL_PROJECT_DB_PASSWORD so scripts never hold
+# one. install() swaps the app module's phase functions (connecting, validating the NUID, each menu operation
+# and the result printers) for timed wrappers, and the report gives for each phase its calls, wall time, the
+# part of it spent in stored procedure calls (from the app's Instrumentation) and the rest, spent in the
+# client. Phases nest, so a menu operation's time includes the printing done inside it.
+# cProfile runs over the whole session, and with trace_memory so does tracemalloc (which makes everything
+# several times slower, so compare timings only between runs with the same setting).
+# Sessions are recorded with python app.py --record session.txt, which saves every answer except passwords.
+#
+# Script lines starting with '#' are comments; blank lines are answers (an empty answer skips optional prompts)
+
+# functions listed in the report, by cumulative time
+TOP_FUNCTIONS = 25
+# allocation sites listed in the report, by size
+TOP_ALLOCATIONS = 15
+
+
+class ScriptExhausted(EOFError):
+    pass
+
+
+# Returns the answers in a session script
+def read_script(path: str) -> list:
+    with open(path) as file:
+        return [line.rstrip('\n') for line in file if not line.startswith('#')]
+
+
+# Returns an input() replacement that also appends every answer to script, an open text file the caller closes
+def recording_input(script, read=input):
+    def record(prompt: str = '') -> str:
+        answer = read(prompt)
+        script.write(answer + '\n')
+        script.flush()
+        return answer
+    return record
+
+
+class SessionProfiler:
+    # started is the time.perf_counter() at which app.py started importing, imports_seconds how long that took
+    def __init__(self, script_path: str, started: float, imports_seconds: float, trace_memory: bool = False):
+        self.script_path = script_path
+        self.answers = read_script(script_path)
+        self.started = started
+        self.imports_seconds = imports_seconds
+        self.trace_memory = trace_memory
+        self.replayed = 0
+        self.ready_seconds = None
+        # phase name -> [calls, wall seconds, sql milliseconds, bytes allocated]
+        self.phases = {}
+        # MetricsRegistry of the app's Instrumentation, for the time spent in stored procedure calls
+        self.registry = None
+        self.profile = cProfile.Profile()
+
+    # Replays the next answer, echoing the prompt and answer like a terminal would
+    def input(self, prompt: str = '') -> str:
+        if self.replayed >= len(self.answers):
+            raise ScriptExhausted('%s has no answer left for: %s' % (self.script_path, prompt.strip()))
+        answer = self.answers[self.replayed]
+        self.replayed += 1
+        print(prompt + answer)
+        return answer
+
+    def getpass(self, prompt: str = '') -> str:
+        print(prompt)
+        return os.environ.get('FINAL_PROJECT_DB_PASSWORD', '')
+
+    # Marks the app as ready for its first menu choice, the end of the cold start
+    def ready(self) -> None:
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.started
+
+    # Total milliseconds spent in stored procedure calls and their commits so far
+    def _sql_ms(self) -> float:
+        if self.registry is None:
+            return 0.0
+        snapshot = self.registry.snapshot()
+        return sum(histogram['sum'] for name in ('sql_wall_ms', 'sql_commit_ms')
+                   for histogram in snapshot.get(name, {}).values())
+
+    # Wraps fn so every call is timed as the named phase
+    def timed(self, name: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            sql_before = self._sql_ms()
+            memory_before = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                phase = self.phases.setdefault(name, [0, 0.0, 0.0, 0])
+                phase[0] += 1
+                phase[1] += elapsed
+                phase[2] += self._sql_ms() - sql_before
+                if self.trace_memory:
+                    phase[3] += tracemalloc.get_traced_memory()[0] - memory_before
+        return wrapper
+
+    # Points the app module at the replayed input and wraps its phase functions
+    # phases maps phase names to the names of the module's functions
+    def install(self, module, phases: dict) -> None:
+        module.input = self.input
+        module.gp = types.SimpleNamespace(getpass=self.getpass)
+        for name, function_name in phases.items():
+            setattr(module, function_name, self.timed(name, getattr(module, function_name)))
+
+    def start(self) -> None:
+        if self.trace_memory:
+            tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    # Writes the cProfile data, for pstats or a viewer like snakeviz
+    def dump_stats(self, path: str) -> None:
+        self.profile.dump_stats(path)
+
+    def report(self) -> dict:
+        phases = {}
+        for name, (calls, seconds, sql_ms, allocated) in self.phases.items():
+            wall_ms = seconds * 1000
+            phases[name] = {'calls': calls,
+                            'wall_ms': round(wall_ms, 3),
+                            'sql_ms': round(sql_ms, 3),
+                            'client_ms': round(max(wall_ms - sql_ms, 0.0), 3)}
+            if self.trace_memory:
+                phases[name]['allocated_kb'] = round(allocated / 1024, 1)
+
+        stats = pstats.Stats(self.profile)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        functions = [{'function': '%s:%d(%s)' % (os.path.basename(filename), line, function),
+                      'calls': calls,
+                      'own_ms': round(own * 1000, 3),
+                      'cumulative_ms': round(cumulative * 1000, 3)}
+                     for (filename, line, function), (_, calls, own, cumulative, _) in top]
+
+        report = {'script': self.script_path,
+                  'answers_replayed': self.replayed,
+                  'startup': {'imports_ms': round(self.imports_seconds * 1000, 3),
+                              'ready_ms': round(self.ready_seconds * 1000, 3)
+                              if self.ready_seconds is not None else None},
+                  'phases': phases,
+                  'top_functions': functions}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # leave out what profiling itself allocates
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+                + [tracemalloc.Filter(False, __file__)])
+            allocations = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            report['memory'] = {'current_kb': round(current / 1024, 1),
+                                'peak_kb': round(peak / 1024, 1),
+                                'top_allocations': [{'line': '%s:%d' % (os.path.basename(stat.traceback[0].filename),
+                                                                        stat.traceback[0].lineno),
+                                                     'kb': round(stat.size / 1024, 1),
+                                                     'blocks': stat.count}
+                                                    for stat in allocations]}
+        return report
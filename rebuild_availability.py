@@ -0,0 +1,54 @@
+#!usr/bin/env python
+import argparse
+import datetime
+import getpass as gp
+import os
+import time
+
+from db import ConnectionPool
+
+# Builds the materialized room_availability table for a range of dates, e.g. a new semester
+# Each chunk of --chunk-days dates is rebuilt by one rebuild_room_availability call in its own transaction,
+# so the booking triggers and searches are never blocked for long. Once a date is built, the bookings
+# triggers keep it current and find_room_with_criteria answers it from room_availability.
+#
+# usage: python rebuild_availability.py --user root --from 2024-09-04 --to 2024-12-20
+
+
+# Rebuilds room_availability from from_date to to_date, chunk_days dates per transaction
+# Returns the number of free (room, date, hour) slots materialized
+def rebuild(pool, from_date: datetime.date, to_date: datetime.date, chunk_days: int = 7) -> int:
+    total = 0
+    chunk_start = from_date
+    while chunk_start <= to_date:
+        chunk_end = min(chunk_start + datetime.timedelta(days=chunk_days - 1), to_date)
+        with pool.cursor() as cur:
+            cur.callproc('rebuild_room_availability', [chunk_start, chunk_end])
+            total += cur.fetchone()['free_slots']
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Materialize room availability for a range of dates')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--from', dest='from_date', default=datetime.date.today().isoformat())
+    parser.add_argument('--to', dest='to_date', required=True)
+    parser.add_argument('--chunk-days', type=int, default=7)
+    args = parser.parse_args()
+
+    password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+    pool = ConnectionPool(host=args.host, user=args.user, password=password, max_size=1)
+    try:
+        start = time.perf_counter()
+        slots = rebuild(pool, datetime.date.fromisoformat(args.from_date), datetime.date.fromisoformat(args.to_date),
+                        args.chunk_days)
+        print('Materialized %d free slots from %s to %s in %.2fs'
+              % (slots, args.from_date, args.to_date, time.perf_counter() - start))
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
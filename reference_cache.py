@@ -0,0 +1,90 @@
+import threading
+import time
+
+# Process-level cache of reference data: campuses, buildings, organizations and rooms
+# These almost never change, so they are loaded once (one get_reference_data call) and kept for ttl seconds,
+# letting BookingService reject unknown campuses, clubs and rooms without a round trip.
+# Names are matched case-insensitively, like MySQL's default collation does, and the lookups return the
+# canonical spelling from the tables.
+# Call invalidate() after changing reference data to force a reload on the next lookup.
+
+
+class ReferenceCache:
+    def __init__(self, pool, ttl: float = 3600.0):
+        self.pool = pool
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # casefolded name -> name, for campuses and organizations
+        self._campuses = {}
+        # building name -> campus
+        self._buildings = {}
+        self._organizations = {}
+        # (casefolded building, room_number) -> room row
+        self._rooms = {}
+
+    # Reads every reference table in one call to get_reference_data
+    def _load(self) -> None:
+        with self.pool.cursor() as cur:
+            cur.callproc('get_reference_data')
+            campuses = cur.fetchall()
+            cur.nextset()
+            buildings = cur.fetchall()
+            cur.nextset()
+            organizations = cur.fetchall()
+            cur.nextset()
+            rooms = cur.fetchall()
+        self._campuses = {row['name'].casefold(): row['name'] for row in campuses}
+        self._buildings = {row['name']: row['campus'] for row in buildings}
+        self._organizations = {row['name'].casefold(): row['name'] for row in organizations}
+        self._rooms = {(row['building'].casefold(), row['room_number']): row for row in rooms}
+        self._loaded_at = time.monotonic()
+
+    # Loads the data if it has never been loaded or is older than ttl seconds
+    def _ensure_loaded(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._load()
+
+    # Forces a reload on the next lookup
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def campuses(self) -> list:
+        self._ensure_loaded()
+        return sorted(self._campuses.values())
+
+    def organizations(self) -> list:
+        self._ensure_loaded()
+        return sorted(self._organizations.values())
+
+    # Returns the campus name as spelled in the campuses table, or None if there is no such campus
+    def campus(self, campus: str):
+        self._ensure_loaded()
+        return self._campuses.get(campus.casefold())
+
+    # Returns the organization name as spelled in the organizations table, or None if there is no such club
+    def club(self, club_name: str):
+        self._ensure_loaded()
+        return self._organizations.get(club_name.casefold())
+
+    def is_valid_campus(self, campus: str) -> bool:
+        return self.campus(campus) is not None
+
+    # Same as the is_valid_club function in finalProject.sql
+    def is_valid_club(self, club_name: str) -> bool:
+        return self.club(club_name) is not None
+
+    # Returns the names of the buildings on a campus
+    def buildings_on_campus(self, campus: str) -> list:
+        self._ensure_loaded()
+        campus = campus.casefold()
+        return sorted(name for name, building_campus in self._buildings.items() if building_campus.casefold() == campus)
+
+    # Returns the room row (building, room_number, capacity, ada, projector, club_only), or None if there is no such room
+    # The row's building is the canonical name
+    def room(self, building: str, room_number: int):
+        self._ensure_loaded()
+        return self._rooms.get((building.casefold(), room_number))
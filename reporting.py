@@ -0,0 +1,251 @@
+#!usr/bin/env python
+import argparse
+import csv
+import datetime
+import getpass as gp
+import os
+import sys
+import time
+
+import pymysql
+
+from db import ConnectionPool, format_db_error
+
+# Utilization reporting over bookings and signs_in
+# `summarize` folds every finished day after the watermark into two summary tables, one short transaction per day
+# (summarize_usage_day): room_day_usage, bookings and sign ins per room and day, and hourly_demand, the same per
+# campus, day and start hour. Reports only read the summary tables plus the small room tables, so they never
+# scan bookings, and the summarizer reads one day of bookings at a time through the date index, in READ COMMITTED
+# so it takes no locks the booking hot path could wait on.
+# The watermark is a date rather than a booking_id: bookings are moved and signed into after they are made, and
+# archived in date order rather than id order, so only a day that is over has final numbers. A finished day is
+# summarized once; a booking or sign in change dated on or before the watermark afterwards (a late sign in, a
+# booking moved into the past) is recorded in usage_stale_dates by triggers, and the next run summarizes that day
+# again first. Pass --rebuild-from to summarize days again by hand, e.g. after loading old data.
+#
+# Reports are streamed to CSV (stdout, or --output) as the rows come off an unbuffered cursor:
+#   rooms, buildings, campuses: booked hours, signed in hours, no shows (booked hours nobody signed into) and their
+#       rate, available hours (timeslots x days) and utilization (booked / available)
+#   hours: bookings per campus and start hour, per day and as a share of the rooms open at that hour
+#
+# usage:
+#   python reporting.py --user root summarize
+#   python reporting.py --user root report rooms --from 2026-09-01 --to 2026-12-20 --output rooms.csv
+#   python reporting.py --user root report rooms --never-signed-in
+#   python reporting.py --user root report hours --campus Boston
+#   python reporting.py --sqlite bench_data report campuses --summarize
+
+REPORTS = ['rooms', 'buildings', 'campuses', 'hours']
+
+# days in a report when --from is not given
+DEFAULT_REPORT_DAYS = 30
+
+# every room with its timeslots per day and its summarized usage between date_from and date_to
+ROOM_USAGE = """SELECT buildings.campus, rooms.building, rooms.room_number, rooms.capacity, slots.hours AS slot_hours,
+                       COALESCE(room_usage.booked_hours, 0) AS booked_hours,
+                       COALESCE(room_usage.signed_in_hours, 0) AS signed_in_hours
+                    FROM rooms
+                        JOIN buildings ON rooms.building = buildings.name
+                        JOIN (SELECT building_name, room_number, COUNT(*) AS hours FROM timeslots
+                                  GROUP BY building_name, room_number) AS slots
+                            ON slots.building_name = rooms.building AND slots.room_number = rooms.room_number
+                        LEFT JOIN (SELECT building_name, room_number, SUM(booked_hours) AS booked_hours,
+                                          SUM(signed_in_hours) AS signed_in_hours
+                                       FROM room_day_usage WHERE date BETWEEN %(date_from)s AND %(date_to)s
+                                       GROUP BY building_name, room_number) AS room_usage
+                            ON room_usage.building_name = rooms.building AND room_usage.room_number = rooms.room_number
+                    WHERE (%(campus)s IS NULL OR buildings.campus = %(campus)s)"""
+
+
+# Returns the query of a utilization report grouped by the given columns of ROOM_USAGE
+def usage_report(group_columns: list) -> str:
+    columns = ', '.join(group_columns)
+    return """SELECT %s, COUNT(*) AS rooms, SUM(booked_hours) AS booked_hours, SUM(signed_in_hours) AS signed_in_hours,
+                     SUM(booked_hours) - SUM(signed_in_hours) AS no_show_hours,
+                     ROUND(1.0 * (SUM(booked_hours) - SUM(signed_in_hours)) / NULLIF(SUM(booked_hours), 0), 4)
+                         AS no_show_rate,
+                     SUM(slot_hours) * %%(days)s AS available_hours,
+                     ROUND(1.0 * SUM(booked_hours) / NULLIF(SUM(slot_hours) * %%(days)s, 0), 4) AS utilization
+                  FROM (%s) AS per_room
+                  GROUP BY %s
+                  HAVING %%(never_signed_in)s = 0 OR (SUM(booked_hours) > 0 AND SUM(signed_in_hours) = 0)
+                  ORDER BY %s""" % (columns, ROOM_USAGE, columns, columns)
+
+
+QUERIES = {
+    'rooms': usage_report(['campus', 'building', 'room_number', 'capacity']),
+    'buildings': usage_report(['campus', 'building']),
+    'campuses': usage_report(['campus']),
+    'hours': """SELECT slots.campus, slots.start_hour, slots.rooms,
+                       COALESCE(demand.bookings, 0) AS bookings, COALESCE(demand.signed_in, 0) AS signed_in,
+                       ROUND(1.0 * COALESCE(demand.bookings, 0) / %(days)s, 2) AS bookings_per_day,
+                       ROUND(1.0 * COALESCE(demand.bookings, 0) / (slots.rooms * %(days)s), 4) AS utilization
+                    FROM (SELECT buildings.campus, timeslots.start_hour, COUNT(*) AS rooms
+                              FROM timeslots JOIN buildings ON timeslots.building_name = buildings.name
+                              GROUP BY buildings.campus, timeslots.start_hour) AS slots
+                        LEFT JOIN (SELECT campus, start_hour, SUM(bookings) AS bookings, SUM(signed_in) AS signed_in
+                                       FROM hourly_demand WHERE date BETWEEN %(date_from)s AND %(date_to)s
+                                       GROUP BY campus, start_hour) AS demand
+                            ON demand.campus = slots.campus AND demand.start_hour = slots.start_hour
+                    WHERE (%(campus)s IS NULL OR slots.campus = %(campus)s)
+                    ORDER BY slots.campus, slots.start_hour""",
+}
+
+
+# Returns (last day summarized or None, date of the earliest booking or None)
+def usage_watermark(pool) -> tuple:
+    with pool.cursor() as cur:
+        cur.callproc('get_usage_watermark')
+        row = cur.fetchone()
+    return row['through_date'], row['first_date']
+
+
+# Returns the summarized days whose bookings or sign ins changed since, oldest first
+def stale_days(pool) -> list:
+    with pool.cursor() as cur:
+        cur.callproc('get_stale_usage_dates')
+        return [row['date'] for row in cur.fetchall()]
+
+
+# Summarizes one day in its own transaction, returns the number of bookings summarized
+def summarize_day(pool, day: datetime.date) -> int:
+    with pool.cursor() as cur:
+        # a consistent read of the day's bookings instead of shared locks on them
+        cur.execute('SET TRANSACTION ISOLATION LEVEL READ COMMITTED')
+        cur.callproc('summarize_usage_day', [day])
+        return cur.fetchone()['bookings']
+
+
+# Summarizes the stale days, then every day after the watermark (or from rebuild_from) through `through`
+# (default: yesterday)
+# pause seconds are slept between days to leave room for the booking hot path
+# Returns (days summarized, bookings summarized)
+def summarize(pool, through: datetime.date = None, rebuild_from: datetime.date = None, pause: float = 0.0) -> tuple:
+    through = through or datetime.date.today() - datetime.timedelta(days=1)
+    watermark, first_date = usage_watermark(pool)
+    if rebuild_from is not None:
+        first = rebuild_from
+    elif watermark is not None:
+        first = watermark + datetime.timedelta(days=1)
+    else:
+        first = first_date
+    days_to_summarize = [day for day in stale_days(pool) if first is None or day < first]
+    if first is not None:
+        days_to_summarize += [first + datetime.timedelta(days=n) for n in range((through - first).days + 1)]
+
+    bookings = 0
+    for n, day in enumerate(days_to_summarize):
+        if pause > 0 and n > 0:
+            time.sleep(pause)
+        bookings += summarize_day(pool, day)
+    return len(days_to_summarize), bookings
+
+
+# Works out the dates a report covers: date_to defaults to the watermark and is capped at it, since later days
+# have no summaries yet, and date_from defaults to DEFAULT_REPORT_DAYS days before date_to and is raised to the
+# first summarized day, since earlier days have no summaries either (and would still count towards the
+# available hours write_report divides by)
+# Returns (date_from, date_to)
+def report_dates(pool, date_from: datetime.date = None, date_to: datetime.date = None) -> tuple:
+    watermark, first_date = usage_watermark(pool)
+    if watermark is None:
+        raise SystemExit('reporting: nothing has been summarized yet, run `reporting.py summarize` first')
+    if date_to is None or date_to > watermark:
+        if date_to is not None:
+            print('reporting: days after %s are not summarized yet, reporting through %s' % (watermark, watermark),
+                  file=sys.stderr)
+        date_to = watermark
+    if date_from is None:
+        date_from = date_to - datetime.timedelta(days=DEFAULT_REPORT_DAYS - 1)
+        if first_date is not None and date_from < first_date:
+            date_from = first_date
+    elif first_date is not None and date_from < first_date:
+        print('reporting: days before %s are not summarized, reporting from %s' % (first_date, first_date),
+              file=sys.stderr)
+        date_from = first_date
+    if date_from > date_to:
+        raise SystemExit('reporting: --from %s is after the last summarized day %s' % (date_from, date_to))
+    return date_from, date_to
+
+
+# Streams a report as CSV to out, header first
+# Returns the number of rows written
+def write_report(pool, name: str, out, date_from: datetime.date, date_to: datetime.date, campus: str = None,
+                 never_signed_in: bool = False) -> int:
+    # pass dates from report_dates, so days only counts summarized days
+    params = {'date_from': date_from, 'date_to': date_to, 'days': (date_to - date_from).days + 1,
+              'campus': campus, 'never_signed_in': never_signed_in}
+    writer = csv.writer(out)
+    count = 0
+    with pool.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute(QUERIES[name], params)
+        writer.writerow([column[0] for column in cur.description])
+        for row in cur.fetchall_unbuffered():
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def parse_date(value: str):
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Room utilization, no show and demand reports')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--sqlite', metavar='DATA_DIR',
+                        help='use an embedded SQLite database loaded from the CSVs in DATA_DIR (report with --summarize)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    summary = commands.add_parser('summarize', help='bring the summary tables up to date')
+    summary.add_argument('--through', help='last day to summarize (default: yesterday)')
+    summary.add_argument('--rebuild-from', help='summarize again from this day, instead of from the watermark')
+    summary.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between days')
+
+    report = commands.add_parser('report', help='write a report as CSV')
+    report.add_argument('report', choices=REPORTS)
+    report.add_argument('--from', dest='from_date', help='first day (default: %d days before --to)' % DEFAULT_REPORT_DAYS)
+    report.add_argument('--to', dest='to_date', help='last day (default: the last summarized day)')
+    report.add_argument('--campus', help='only this campus')
+    report.add_argument('--never-signed-in', action='store_true',
+                        help='only rooms, buildings or campuses that were booked but never signed into')
+    report.add_argument('--output', help='write the CSV to this file instead of stdout')
+    report.add_argument('--summarize', action='store_true', help='bring the summary tables up to date first')
+    args = parser.parse_args()
+
+    backend = None
+    if args.sqlite:
+        from sqlite_backend import SQLiteBackend
+        backend = SQLiteBackend(data_dir=args.sqlite)
+        pool = backend.pool(max_size=1)
+    else:
+        password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+        pool = ConnectionPool(host=args.host, user=args.user, password=password, max_size=1)
+    try:
+        if args.command == 'summarize':
+            start = time.perf_counter()
+            days, bookings = summarize(pool, parse_date(args.through), parse_date(args.rebuild_from), args.pause)
+            print('Summarized %d bookings over %d days in %.2fs' % (bookings, days, time.perf_counter() - start))
+            return
+
+        if args.summarize:
+            days, bookings = summarize(pool)
+            print('Summarized %d bookings over %d days' % (bookings, days), file=sys.stderr)
+        date_from, date_to = report_dates(pool, parse_date(args.from_date), parse_date(args.to_date))
+        if args.output:
+            with open(args.output, 'w', newline='') as file:
+                count = write_report(pool, args.report, file, date_from, date_to, args.campus, args.never_signed_in)
+            print('Wrote %d rows (%s to %s) to %s' % (count, date_from, date_to, args.output), file=sys.stderr)
+        else:
+            write_report(pool, args.report, sys.stdout, date_from, date_to, args.campus, args.never_signed_in)
+    except pymysql.err.MySQLError as e:
+        raise SystemExit(format_db_error(e))
+    finally:
+        pool.close()
+        if backend is not None:
+            backend.close()
+
+
+if __name__ == '__main__':
+    main()
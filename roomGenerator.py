@@ -1,75 +1,214 @@
-import csv
-import random
-# Generate a csv file for import into a MYSQL database of rooms inside on a campus
-# A list of buildings, and their number of floors is provided
-# The csv file will have the following columns:
-    # room_number int,
-    # capacity int,
-    # ada boolean,
-    # projector boolean,
-    # club_only boolean,
-    # building  VARCHAR(64),
-    # FOREIGN KEY (building) REFERENCES buildings(name),
-    # PRIMARY KEY (room_number, building)
-
-buildings = [
-    ["Richards Hall", 4],
-    ["Ell Hall", 4],
-    ["Hayden Hall", 4],
-    ["Churchill Hall", 5],
-    ["Forsyth Hall", 2],
-    ["Snell Engineering", 4],
-    ["Snell Library", 4],
-    ["Shillman Hall", 4],
-    ["West Village H", 17],
-    ["West Village G", 7],
-    ["Mills Hall", 4],
-    ["Rothwell Center", 2],
-    ["Stern Hall", 4],
-    ["Carnegie Hall", 3],
-    ["F.W. Olin Library", 4],
-    ["Lisser Hall", 4],
-    ["Lokey School", 3],
-    ["Sage Hall", 2],
-    ["Cowell", 2],
-    ["Moore Natural Sciences Building", 4],
-    ["Roux Institute", 5],
-    ["First Canadian Place", 12],
-    ["Devon House", 6]
-]
-
-# create the csv file
-with open('rooms.csv', mode='w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(["room_number", "capacity", "ada", "projector", "club_only", "building"])
-    # For each building, generate rooms for each floor
-    for building in buildings:
-        for floor in range(1, building[1] + 1):
-            # For each room, generate random values for capacity, ada, projector, and club_only
-            for room in range(1, 10):
-                capacity = random.randint(10, 100)
-                ada = random.choice([True, False])
-                projector = random.choice([True, False])
-                club_only = random.choice([True, False])
-                writer.writerow([room + floor * 100, capacity, ada, projector, club_only, building[0]])
-                # print([room + floor * 100, capacity, ada, projector, club_only, building[0]])
-
-# Create a csv file for room timeslots
-# a room timeslot will have the following columns:
-# 	room_number int,
-#     building_name  VARCHAR(64),
-#     start_hour int,
-
-# read the rooms.csv file and generate timeslots for each room
-with open('rooms.csv', mode='r') as file:
-    reader = csv.reader(file)
-    next(reader) # skip the header
-    with open('timeslots.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["room_number", "building_name", "start_hour"])
-        for row in reader:
-            # generate a random range of timeslots for each room
-            firstSlot = random.randint(8, 12)
-            lastSlot = random.randint(16, 21)
-            for hour in range(firstSlot, lastSlot):
-                writer.writerow([row[0], row[5], hour])
\ No newline at end of file
+import argparse
+import csv
+import datetime
+import os
+
+import numpy as np
+
+# Generate csv files for import into a MYSQL database of rooms inside the buildings on each campus,
+# the hours each room can be booked for, and (optionally) students and bookings to load test with.
+# Random values are drawn a whole building (or a whole day of bookings) at a time with NumPy, and rows are
+# streamed to disk chunk by chunk, so millions of rooms, timeslots and bookings can be generated.
+#
+# With no arguments this writes rooms.csv and timeslots.csv for the buildings below, 9 rooms per floor.
+# usage:
+#   python roomGenerator.py --seed 42
+#   python roomGenerator.py --seed 42 --buildings-per-campus 200 --rooms-per-floor 40 \
+#       --students 50000 --days 120 --booking-rate 0.3 --out-dir scaled/
+#
+# rooms.csv has the following columns:
+    # room_number int,
+    # capacity int,
+    # ada boolean,
+    # projector boolean,
+    # club_only boolean,
+    # building  VARCHAR(64),
+    # FOREIGN KEY (building) REFERENCES buildings(name),
+    # PRIMARY KEY (room_number, building)
+# timeslots.csv has the following columns:
+# 	room_number int,
+#     building_name  VARCHAR(64),
+#     start_hour int,
+# students.csv and bookings.csv follow the students and bookings tables in finalProject.sql
+
+buildings = [
+    ["Richards Hall", 4],
+    ["Ell Hall", 4],
+    ["Hayden Hall", 4],
+    ["Churchill Hall", 5],
+    ["Forsyth Hall", 2],
+    ["Snell Engineering", 4],
+    ["Snell Library", 4],
+    ["Shillman Hall", 4],
+    ["West Village H", 17],
+    ["West Village G", 7],
+    ["Mills Hall", 4],
+    ["Rothwell Center", 2],
+    ["Stern Hall", 4],
+    ["Carnegie Hall", 3],
+    ["F.W. Olin Library", 4],
+    ["Lisser Hall", 4],
+    ["Lokey School", 3],
+    ["Sage Hall", 2],
+    ["Cowell", 2],
+    ["Moore Natural Sciences Building", 4],
+    ["Roux Institute", 5],
+    ["First Canadian Place", 12],
+    ["Devon House", 6]
+]
+
+# rows written per csv.writer.writerows call
+CHUNK_ROWS = 100000
+
+# campuses.csv, buildings.csv and organizations.csv live next to this script
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Reads a CSV in this repo's format (header row, '//' comment lines, quoted values with spaces after commas)
+def read_reference_csv(path: str) -> list:
+    with open(path, newline='') as file:
+        lines = (line for line in file if not line.lstrip().startswith('//') and line.strip() != '')
+        reader = csv.reader(lines, skipinitialspace=True)
+        header = [column.strip() for column in next(reader)]
+        return [dict(zip(header, row)) for row in reader]
+
+
+# Returns [name, number of floors] for every building to generate rooms for
+# synthetic_per_campus > 0 adds that many made up buildings to every campus, written to generated_buildings.csv
+# (in the same columns as buildings.csv, which is left untouched)
+def building_list(out_dir: str, synthetic_per_campus: int, max_floors: int, rng) -> list:
+    result = [list(building) for building in buildings]
+    if synthetic_per_campus <= 0:
+        return result
+
+    campuses = [row['name'] for row in read_reference_csv(os.path.join(DATA_DIR, 'campuses.csv'))]
+    floors = rng.integers(1, max_floors + 1, size=(len(campuses), synthetic_per_campus))
+    with open(os.path.join(out_dir, 'generated_buildings.csv'), mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "street_number", "street_name", "city", "zipcode", "num_floors", "campus"])
+        for c, campus in enumerate(campuses):
+            for b in range(synthetic_per_campus):
+                name = '%s Building %d' % (campus, b + 1)
+                writer.writerow([name, b + 1, 'Generated St', campus, 0, int(floors[c, b]), campus])
+                result.append([name, int(floors[c, b])])
+    return result
+
+
+# Writes rooms.csv and timeslots.csv, one building at a time
+# Returns the timeslots as parallel arrays (building index, room number, start hour) for generating bookings
+def generate_rooms(out_dir: str, building_rows: list, rooms_per_floor: int, rng):
+    slot_buildings, slot_rooms, slot_hours = [], [], []
+    hours = np.arange(24)
+
+    with open(os.path.join(out_dir, 'rooms.csv'), mode='w', newline='') as rooms_file, \
+            open(os.path.join(out_dir, 'timeslots.csv'), mode='w', newline='') as slots_file:
+        rooms_writer = csv.writer(rooms_file)
+        slots_writer = csv.writer(slots_file)
+        rooms_writer.writerow(["room_number", "capacity", "ada", "projector", "club_only", "building"])
+        slots_writer.writerow(["room_number", "building_name", "start_hour"])
+
+        for b, (name, num_floors) in enumerate(building_rows):
+            # room numbers floor * 100 + 1 .. floor * 100 + rooms_per_floor, for every floor
+            room_numbers = (np.arange(1, num_floors + 1)[:, None] * 100
+                            + np.arange(1, rooms_per_floor + 1)[None, :]).ravel()
+            n = len(room_numbers)
+            capacity = rng.integers(10, 101, size=n)
+            flags = rng.random((3, n)) < 0.5
+            rooms_writer.writerows(zip(room_numbers.tolist(), capacity.tolist(), flags[0].tolist(),
+                                       flags[1].tolist(), flags[2].tolist(), [name] * n))
+
+            # each room can be booked from a random first hour (8-12) up to a random last hour (16-21)
+            first_slot = rng.integers(8, 13, size=n)
+            last_slot = rng.integers(16, 22, size=n)
+            room_index, hour = np.nonzero((hours[None, :] >= first_slot[:, None]) & (hours[None, :] < last_slot[:, None]))
+            slot_rooms_b = room_numbers[room_index]
+            slots_writer.writerows(zip(slot_rooms_b.tolist(), [name] * len(hour), hour.tolist()))
+
+            slot_buildings.append(np.full(len(hour), b, dtype=np.int32))
+            slot_rooms.append(slot_rooms_b.astype(np.int32))
+            slot_hours.append(hour.astype(np.int8))
+
+    return np.concatenate(slot_buildings), np.concatenate(slot_rooms), np.concatenate(slot_hours)
+
+
+# Writes students.csv with nuids first_nuid .. first_nuid + count - 1
+def generate_students(out_dir: str, count: int, first_nuid: int) -> np.ndarray:
+    nuids = np.arange(first_nuid, first_nuid + count)
+    with open(os.path.join(out_dir, 'students.csv'), mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["nuid", "name"])
+        for start in range(0, count, CHUNK_ROWS):
+            chunk = nuids[start:start + CHUNK_ROWS].tolist()
+            writer.writerows((nuid, 'Student %d' % nuid) for nuid in chunk)
+    return nuids
+
+
+# Writes bookings.csv, one day at a time
+# Every timeslot is booked with probability booking_rate, by a random student; about one booking in five
+# is associated with a random organization, the rest have an empty (NULL) organization
+def generate_bookings(out_dir: str, building_rows: list, timeslots, nuids: np.ndarray, start_date: datetime.date,
+                      days: int, booking_rate: float, rng) -> int:
+    slot_buildings, slot_rooms, slot_hours = timeslots
+    organizations = [row['name'] for row in read_reference_csv(os.path.join(DATA_DIR, 'organizations.csv'))]
+    building_names = np.array([name for name, _ in building_rows], dtype=object)
+    booking_id = 0
+
+    with open(os.path.join(out_dir, 'bookings.csv'), mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["nuid", "room_number", "building_name", "start_hour", "date", "booking_id", "organization_name"])
+        for day in range(days):
+            date = (start_date + datetime.timedelta(days=day)).isoformat()
+            booked = np.nonzero(rng.random(len(slot_hours)) < booking_rate)[0]
+            n = len(booked)
+            students = nuids[rng.integers(0, len(nuids), size=n)]
+            club = rng.random(n) < 0.2
+            orgs = np.where(club, np.array(organizations, dtype=object)[rng.integers(0, len(organizations), size=n)], '')
+            ids = np.arange(booking_id + 1, booking_id + n + 1)
+            booking_id += n
+            for start in range(0, n, CHUNK_ROWS):
+                part = slice(start, start + CHUNK_ROWS)
+                rows = booked[part]
+                writer.writerows(zip(students[part].tolist(), slot_rooms[rows].tolist(),
+                                     building_names[slot_buildings[rows]].tolist(), slot_hours[rows].tolist(),
+                                     [date] * len(rows), ids[part].tolist(), orgs[part].tolist()))
+    return booking_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate rooms, timeslots, students and bookings CSV files')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for reproducible datasets')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--buildings-per-campus', type=int, default=0,
+                        help='made up buildings to add to every campus in campuses.csv (written to generated_buildings.csv)')
+    parser.add_argument('--max-floors', type=int, default=10, help='floors of made up buildings are 1..max_floors')
+    parser.add_argument('--rooms-per-floor', type=int, default=9,
+                        help='1..99, rooms are numbered floor * 100 + n')
+    parser.add_argument('--students', type=int, default=0, help='students to write to students.csv')
+    parser.add_argument('--first-nuid', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=0, help='days of bookings to write to bookings.csv')
+    parser.add_argument('--start-date', default=datetime.date.today().isoformat())
+    parser.add_argument('--booking-rate', type=float, default=0.25, help='fraction of timeslots booked each day')
+    args = parser.parse_args()
+    # room 100 of floor 1 would be room 200, the first room of floor 2
+    if not 1 <= args.rooms_per_floor <= 99:
+        parser.error('--rooms-per-floor must be between 1 and 99')
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    building_rows = building_list(args.out_dir, args.buildings_per_campus, args.max_floors, rng)
+    timeslots = generate_rooms(args.out_dir, building_rows, args.rooms_per_floor, rng)
+    print('%d buildings, %d timeslots' % (len(building_rows), len(timeslots[2])))
+
+    if args.students > 0:
+        nuids = generate_students(args.out_dir, args.students, args.first_nuid)
+        print('%d students' % len(nuids))
+        if args.days > 0:
+            count = generate_bookings(args.out_dir, building_rows, timeslots, nuids,
+                                      datetime.date.fromisoformat(args.start_date), args.days,
+                                      args.booking_rate, rng)
+            print('%d bookings' % count)
+
+
+if __name__ == '__main__':
+    main()
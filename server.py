@@ -0,0 +1,278 @@
+#!usr/bin/env python
+import argparse
+import asyncio
+import datetime
+import getpass as gp
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+from booking_service import BookingService, BookingError, BookingConflict, parse_date
+from db import PoolExhaustedError, format_db_error
+from instrumentation import Instrumentation
+
+# Asyncio booking server
+# Serves many clients from one process over a local TCP socket. The protocol is one JSON object per line:
+#   request:  {"op": "find_room_with_criteria", "nuid": 1234, "args": {...}}
+#   response: {"ok": true, "result": ...}  or  {"ok": false, "error": "...", "conflict": true if the slot was taken}
+# pymysql is blocking, so every operation runs on a thread pool sized to match the connection pool.
+# A request's NUID is checked against the students table the first time it is used on a connection.
+# Requests for the same NUID share one BookingService session, so its booking cache survives between requests;
+# the max_sessions most recently used sessions are kept.
+#
+# usage:
+#   python server.py serve --user root
+#   python server.py serve --user root --instrument     (then {"op": "metrics"} returns the per-procedure timings)
+#   python server.py bench --clients 200 --requests 50 --campus Boston --date 2024-04-15
+
+
+# Runs one request against the service, acting for user (the service itself when the request has no NUID)
+# Returns the JSON-serializable result
+def dispatch(service: BookingService, user: BookingService, request: dict):
+    op = request.get('op')
+    args = request.get('args', {})
+
+    if op == 'find_room_with_criteria':
+        return user.find_rooms(int(args['capacity']), bool(args['ada']), int(args['start_hour']),
+                               parse_date(args['date']), bool(args['projector']), bool(args['club']),
+                               args['campus'], limit=int(args.get('limit', 10)))
+    if op == 'find_room_page':
+        rows, cursor = user.find_rooms_page(int(args['capacity']), bool(args['ada']), int(args['start_hour']),
+                                            parse_date(args['date']), bool(args['projector']), bool(args['club']),
+                                            args['campus'], args.get('cursor'), int(args.get('page_size', 10)))
+        return {'rooms': rows, 'cursor': cursor}
+    if op == 'suggest_rooms':
+        return user.suggest_rooms(int(args['capacity']), bool(args['ada']), int(args['start_hour']),
+                                  parse_date(args['date']), bool(args['projector']), bool(args['club']),
+                                  args['campus'], int(args.get('k', 5)), args.get('building'))
+    if op == 'create_booking':
+        return user.create_booking(int(args['room_number']), args['building_name'], int(args['start_hour']),
+                                   parse_date(args['date']), args.get('club_name'))
+    if op == 'create_bookings':
+        return user.create_bookings(int(args['room_number']), args['building_name'],
+                                    [(slot['date'], slot['hour']) for slot in args['slots']],
+                                    args.get('club_name'), bool(args.get('all_or_nothing', False)))
+    if op == 'update_booking':
+        start_hour = args.get('start_hour')
+        version = args.get('version')
+        return user.update_booking(int(args['booking_num']), parse_date(args.get('date')),
+                                   int(start_hour) if start_hour is not None else None,
+                                   int(version) if version is not None else None)
+    if op == 'delete_booking':
+        user.delete_booking(int(args['booking_num']))
+        return None
+    if op == 'check_into_room':
+        user.sign_into_booking(int(args['booking_num']))
+        return None
+    if op == 'check_into_rooms':
+        return user.sign_into_bookings([(scan['booking_id'], scan['nuid']) for scan in args['scans']])
+    if op == 'get_user_bookings':
+        return user.get_bookings()
+    if op == 'metrics':
+        instrumentation = service.pool.instrumentation
+        if instrumentation is None:
+            raise BookingError('Instrumentation is off, start the server with --instrument.')
+        if args.get('format') == 'text':
+            return instrumentation.registry.render_text()
+        return instrumentation.registry.snapshot()
+    raise BookingError('Unknown operation %r.' % (op,))
+
+
+# JSON encoder fallback for dates coming back from MySQL
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class BookingServer:
+    def __init__(self, service: BookingService, workers: int = None, max_sessions: int = 1000):
+        self.service = service
+        # one worker per pooled connection, more would only queue inside the pool
+        self.executor = ThreadPoolExecutor(max_workers=workers or service.pool.max_size)
+        # nuid -> BookingService acting for that user, least recently used first
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self._sessions_lock = threading.Lock()
+
+    # Returns the session acting for nuid, creating it (and dropping the least recently used one) if needed
+    def session(self, nuid: int) -> BookingService:
+        with self._sessions_lock:
+            user = self.sessions.get(nuid)
+            if user is None:
+                user = self.sessions[nuid] = self.service.for_user(nuid)
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(nuid)
+            return user
+
+    # Runs on the executor: validates the request's NUID unless it is in validated (the NUIDs already checked
+    # on this connection), then dispatches the request to its session
+    def run(self, request: dict, validated: set):
+        nuid = request.get('nuid')
+        if nuid is None:
+            return dispatch(self.service, self.service, request)
+        nuid = int(nuid)
+        if nuid not in validated:
+            if not self.service.is_student(nuid):
+                raise BookingError('NUID %s is not in the data.' % (nuid))
+            validated.add(nuid)
+        return dispatch(self.service, self.session(nuid), request)
+
+    # validated is the set of NUIDs already checked on the request's connection
+    async def handle_request(self, request: dict, validated: set = None) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, self.run, request,
+                                                validated if validated is not None else set())
+            return {'ok': True, 'result': result}
+        except BookingConflict as e:
+            return {'ok': False, 'error': str(e), 'conflict': True}
+        except (BookingError, PoolExhaustedError, KeyError, TypeError, ValueError) as e:
+            return {'ok': False, 'error': str(e)}
+        except pymysql.err.MySQLError as e:
+            # from the reference cache and availability index loads, which do not wrap their errors
+            return {'ok': False, 'error': format_db_error(e)}
+
+    # One coroutine per client connection, requests on a connection are answered in order
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        validated = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'ok': False, 'error': 'Malformed request.'}
+                else:
+                    response = await self.handle_request(request, validated)
+                writer.write(json.dumps(response, default=_json_default).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print('Serving on %s:%d' % (host, port))
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.service.close()
+
+
+# Benchmark client: opens `clients` connections, each sending `requests` room searches back to back
+# Reports per-request latency percentiles and overall throughput
+async def run_benchmark(host: str, port: int, clients: int, requests: int, campus: str, date: str) -> dict:
+    latencies = []
+    errors = 0
+
+    async def client() -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for _ in range(requests):
+                request = {'op': 'find_room_with_criteria',
+                           'args': {'capacity': random.randint(10, 60), 'ada': random.random() < 0.5,
+                                    'start_hour': random.randint(8, 20), 'date': date,
+                                    'projector': random.random() < 0.5, 'club': False, 'campus': campus}}
+                start = time.perf_counter()
+                writer.write(json.dumps(request).encode() + b'\n')
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - start)
+                if not response['ok']:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {'clients': clients,
+            'requests': len(latencies),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2),
+            'p99_ms': round(quantiles[98] * 1000, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Asyncio booking server and load generator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run the booking server')
+    serve.add_argument('--db-host', default='localhost')
+    serve.add_argument('--user', default='root')
+    serve.add_argument('--pool-size', type=int, default=16)
+    serve.add_argument('--max-sessions', type=int, default=1000,
+                       help='per-user sessions (and their booking caches) kept between requests')
+    serve.add_argument('--availability-index', action='store_true',
+                       help='answer room searches from the in-process availability index')
+    serve.add_argument('--instrument', action='store_true',
+                       help='time every stored procedure call, served back by the metrics op')
+    serve.add_argument('--server-timing', action='store_true',
+                       help='with --instrument, also read server side execution times from the performance schema')
+    serve.add_argument('--sqlite', metavar='DATA_DIR',
+                       help='serve from an embedded SQLite database loaded from the CSVs in DATA_DIR, not MySQL')
+
+    bench = commands.add_parser('bench', help='benchmark a running booking server')
+    bench.add_argument('--clients', type=int, default=100)
+    bench.add_argument('--requests', type=int, default=20)
+    bench.add_argument('--campus', default='Boston')
+    bench.add_argument('--date', default=datetime.date.today().isoformat())
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        backend = None
+        if args.sqlite:
+            from sqlite_backend import SQLiteBackend
+            backend = SQLiteBackend(data_dir=args.sqlite)
+            service = BookingService(backend.pool(max_size=args.pool_size))
+        else:
+            # the password comes from the environment for unattended runs, otherwise we prompt like app.py does
+            password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+            service = BookingService.connect(host=args.db_host, user=args.user, password=password,
+                                             max_size=args.pool_size)
+        if args.instrument:
+            service.pool.instrumentation = Instrumentation(server_timing=args.server_timing)
+        service.use_reference_cache()
+        if args.availability_index:
+            service.use_availability_index()
+        server = BookingServer(service, max_sessions=args.max_sessions)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            if backend is not None:
+                backend.close()
+    else:
+        result = asyncio.run(run_benchmark(args.host, args.port, args.clients, args.requests,
+                                           args.campus, args.date))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,659 @@
+import datetime
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+
+import pymysql
+
+from bulk_load import DATA_DIR, TABLES, read_csv
+from db import ConnectionPool
+
+# Embedded SQLite stand-in for the final_project MySQL database
+# SQLiteBackend builds a SQLite database with the same tables as finalProject.sql, loads it from the same CSVs
+# as bulk_load.py, and hands out connections that look like pymysql ones to ConnectionPool: cursor(),
+# commit(), rollback(), ping() and close(), with cursors whose callproc() runs a Python implementation of
+# the stored procedure of the same name. Everything above the pool (BookingService, the availability index,
+# the caches, app.py, server.py and bench.py) runs unchanged, with no MySQL server, in seconds.
+# Errors are raised as the pymysql errors MySQL would give (1062 duplicate key, 1452 foreign key failure,
+# 1205 lock wait timeout, 1305 unknown procedure), so callers handle both backends the same way.
+#
+# Not mirrored: room_availability (find_room_with_criteria always uses the rooms/timeslots query),
+# archive_bookings and rebuild_room_availability, and the archive tables (summarize_usage_day reads bookings only).
+# MySQL session settings (SET ...) are accepted and ignored.
+#
+# usage:
+#   backend = SQLiteBackend(data_dir='scaled/')     # a temporary database file, removed by close()
+#   service = BookingService(backend.pool(max_size=8))
+
+SCHEMA = """
+CREATE TABLE campuses(
+    name TEXT PRIMARY KEY,
+    grad_only INTEGER,
+    student_population INTEGER);
+
+CREATE TABLE buildings(
+    name TEXT PRIMARY KEY,
+    street_number INTEGER,
+    street_name TEXT,
+    city TEXT,
+    zipcode INTEGER,
+    num_floors INTEGER,
+    campus TEXT REFERENCES campuses(name) ON DELETE CASCADE ON UPDATE CASCADE);
+CREATE INDEX idx_buildings_campus ON buildings(campus, name);
+
+CREATE TABLE rooms(
+    room_number INTEGER,
+    capacity INTEGER,
+    ada INTEGER,
+    projector INTEGER,
+    club_only INTEGER,
+    building TEXT REFERENCES buildings(name) ON DELETE CASCADE ON UPDATE CASCADE,
+    PRIMARY KEY (room_number, building));
+CREATE INDEX idx_rooms_search ON rooms(ada, projector, club_only, capacity);
+
+CREATE TABLE students(
+    nuid INTEGER PRIMARY KEY,
+    name TEXT,
+    booking_version INTEGER NOT NULL DEFAULT 0);
+
+CREATE TABLE organizations(
+    name TEXT PRIMARY KEY,
+    type TEXT);
+
+CREATE TABLE timeslots(
+    room_number INTEGER,
+    building_name TEXT,
+    start_hour INTEGER CHECK (start_hour >= 0 AND start_hour < 24),
+    PRIMARY KEY (room_number, building_name, start_hour),
+    FOREIGN KEY (room_number, building_name) REFERENCES rooms(room_number, building)
+        ON DELETE CASCADE ON UPDATE CASCADE);
+CREATE INDEX idx_timeslots_hour ON timeslots(start_hour, building_name, room_number);
+
+CREATE TABLE club_officer(
+    nuid INTEGER REFERENCES students(nuid) ON DELETE CASCADE ON UPDATE CASCADE,
+    organization_name TEXT REFERENCES organizations(name) ON DELETE CASCADE ON UPDATE CASCADE,
+    PRIMARY KEY (nuid, organization_name));
+
+CREATE TABLE bookings(
+    nuid INTEGER REFERENCES students(nuid) ON DELETE CASCADE ON UPDATE CASCADE,
+    room_number INTEGER,
+    building_name TEXT,
+    start_hour INTEGER,
+    date DATE,
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    organization_name TEXT REFERENCES organizations(name) ON DELETE CASCADE ON UPDATE CASCADE,
+    version INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (room_number, building_name, start_hour, date),
+    FOREIGN KEY (room_number, building_name, start_hour)
+        REFERENCES timeslots(room_number, building_name, start_hour) ON DELETE CASCADE ON UPDATE CASCADE);
+CREATE INDEX idx_bookings_nuid_date ON bookings(nuid, date, start_hour);
+CREATE INDEX idx_bookings_date_hour ON bookings(date, start_hour, building_name, room_number);
+
+CREATE TABLE signs_in(
+    nuid INTEGER NOT NULL REFERENCES students(nuid),
+    booking_id INTEGER PRIMARY KEY REFERENCES bookings(booking_id));
+
+CREATE TABLE room_day_usage(
+    date DATE,
+    building_name TEXT,
+    room_number INTEGER,
+    booked_hours INTEGER NOT NULL,
+    signed_in_hours INTEGER NOT NULL,
+    PRIMARY KEY (date, building_name, room_number));
+
+CREATE TABLE hourly_demand(
+    date DATE,
+    campus TEXT,
+    start_hour INTEGER,
+    bookings INTEGER NOT NULL,
+    signed_in INTEGER NOT NULL,
+    PRIMARY KEY (date, campus, start_hour));
+
+CREATE TABLE report_watermark(
+    name TEXT PRIMARY KEY,
+    through_date DATE NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP);
+
+CREATE TABLE usage_stale_dates(
+    date DATE PRIMARY KEY);
+"""
+
+# created after the CSVs are loaded, like bulk_load.py skipping them with @bulk_load
+TRIGGERS = """
+CREATE TRIGGER bookings_version_insert AFTER INSERT ON bookings BEGIN
+    UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+END;
+CREATE TRIGGER bookings_version_update AFTER UPDATE ON bookings BEGIN
+    UPDATE students SET booking_version = booking_version + 1 WHERE nuid = NEW.nuid;
+END;
+CREATE TRIGGER bookings_version_delete AFTER DELETE ON bookings BEGIN
+    UPDATE students SET booking_version = booking_version + 1 WHERE nuid = OLD.nuid;
+END;
+CREATE TRIGGER usage_stale_bookings_insert AFTER INSERT ON bookings
+    WHEN NEW.date <= (SELECT through_date FROM report_watermark WHERE name = 'usage') BEGIN
+    INSERT OR IGNORE INTO usage_stale_dates(date) VALUES (NEW.date);
+END;
+CREATE TRIGGER usage_stale_bookings_update AFTER UPDATE ON bookings BEGIN
+    INSERT OR IGNORE INTO usage_stale_dates(date)
+        SELECT date FROM (SELECT OLD.date AS date UNION SELECT NEW.date)
+            WHERE date <= (SELECT through_date FROM report_watermark WHERE name = 'usage');
+END;
+CREATE TRIGGER usage_stale_bookings_delete AFTER DELETE ON bookings
+    WHEN OLD.date <= (SELECT through_date FROM report_watermark WHERE name = 'usage') BEGIN
+    INSERT OR IGNORE INTO usage_stale_dates(date) VALUES (OLD.date);
+END;
+CREATE TRIGGER usage_stale_signs_in_insert AFTER INSERT ON signs_in BEGIN
+    INSERT OR IGNORE INTO usage_stale_dates(date)
+        SELECT date FROM bookings WHERE booking_id = NEW.booking_id
+            AND date <= (SELECT through_date FROM report_watermark WHERE name = 'usage');
+END;
+CREATE TRIGGER usage_stale_signs_in_delete AFTER DELETE ON signs_in BEGIN
+    INSERT OR IGNORE INTO usage_stale_dates(date)
+        SELECT date FROM bookings WHERE booking_id = OLD.booking_id
+            AND date <= (SELECT through_date FROM report_watermark WHERE name = 'usage');
+END;
+"""
+
+# result columns holding dates, SQLite returns them as 'YYYY-MM-DD' text
+DATE_COLUMNS = frozenset(['date', 'old_date', 'new_date', 'through_date', 'first_date'])
+
+# dates are stored as ISO text, which sorts and compares like the dates themselves
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+
+
+# Converts a sqlite3 error to the pymysql error MySQL would have raised
+def mysql_error(e: sqlite3.Error) -> pymysql.err.MySQLError:
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code in (sqlite3.SQLITE_CONSTRAINT_UNIQUE, sqlite3.SQLITE_CONSTRAINT_PRIMARYKEY):
+        return pymysql.err.IntegrityError(1062, 'Duplicate entry: %s' % (e,))
+    if code == sqlite3.SQLITE_CONSTRAINT_FOREIGNKEY:
+        return pymysql.err.IntegrityError(1452, 'Cannot add or update a child row: a foreign key constraint fails')
+    if code == sqlite3.SQLITE_CONSTRAINT_CHECK:
+        return pymysql.err.IntegrityError(3819, 'Check constraint is violated: %s' % (e,))
+    if isinstance(e, sqlite3.IntegrityError):
+        return pymysql.err.IntegrityError(1048, str(e))
+    if code == sqlite3.SQLITE_BUSY or 'locked' in str(e):
+        return pymysql.err.OperationalError(1205, 'Lock wait timeout exceeded; try restarting transaction')
+    return pymysql.err.ProgrammingError(1064, str(e))
+
+
+def _is_duplicate(e: sqlite3.IntegrityError) -> bool:
+    return getattr(e, 'sqlite_errorcode', None) in (sqlite3.SQLITE_CONSTRAINT_UNIQUE,
+                                                    sqlite3.SQLITE_CONSTRAINT_PRIMARYKEY)
+
+
+# Runs a query and returns it as a result set: (column names, rows as tuples)
+def _select(db, sql: str, params=()) -> tuple:
+    cur = db.execute(sql, params)
+    return [column[0] for column in cur.description], cur.fetchall()
+
+
+# A result set with a single row of the given values
+def _row(**values) -> tuple:
+    return list(values), [tuple(values.values())]
+
+
+def _date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+# The stored procedures, as name -> function(db, *args) returning a list of result sets
+# Each one mirrors the procedure of the same name in finalProject.sql, see there for what it returns
+
+def validate_student(db, nuid):
+    return [_select(db, 'SELECT * FROM students WHERE nuid = ?', (nuid,))]
+
+
+def get_user_bookings(db, nuid):
+    return [_select(db, """SELECT booking_id, building_name, room_number, start_hour, date, organization_name, version
+                               FROM bookings WHERE nuid = ? ORDER BY date, start_hour, booking_id""", (nuid,))]
+
+
+def get_booking_version(db, user_nuid):
+    return [_select(db, 'SELECT booking_version FROM students WHERE nuid = ?', (user_nuid,))]
+
+
+def update_booking(db, booking_num, booking_date, booking_time):
+    db.execute("""UPDATE bookings
+                      SET date = IFNULL(?, date), start_hour = IFNULL(?, start_hour), version = version + 1
+                      WHERE booking_id = ? AND (? IS NOT NULL OR ? IS NOT NULL)""",
+               (booking_date, booking_time, booking_num, booking_date, booking_time))
+    return []
+
+
+def display_other_times(db, booking_num, from_date, to_date, after_date, after_hour, page_size):
+    booking = db.execute('SELECT room_number, building_name, date FROM bookings WHERE booking_id = ?',
+                         (booking_num,)).fetchone()
+    columns = ['building_name', 'room_number', 'date', 'start_hour']
+    if booking is None and from_date is None:
+        return [(columns, [])]
+    room_num, b_name, booking_date = booking if booking is not None else (None, None, None)
+    from_date = _date(from_date) or _date(booking_date)
+    to_date = _date(to_date) or from_date + datetime.timedelta(days=6)
+    return [_select(db, """WITH RECURSIVE days(day) AS (
+                               SELECT ? UNION ALL SELECT date(day, '+1 day') FROM days WHERE day < ?)
+                           SELECT timeslots.building_name, timeslots.room_number, days.day AS date, timeslots.start_hour
+                               FROM timeslots JOIN days
+                               WHERE timeslots.room_number = ? AND timeslots.building_name = ?
+                                   AND (? IS NULL OR (days.day, timeslots.start_hour) > (?, ?))
+                                   AND NOT EXISTS (SELECT * FROM bookings
+                                                       WHERE bookings.room_number = timeslots.room_number
+                                                           AND bookings.building_name = timeslots.building_name
+                                                           AND bookings.start_hour = timeslots.start_hour
+                                                           AND bookings.date = days.day)
+                           ORDER BY days.day, timeslots.start_hour
+                           LIMIT ?""",
+                    (from_date, to_date, room_num, b_name, after_date, after_date, after_hour,
+                     page_size if page_size is not None else -1))]
+
+
+def list_free_times(db, booking_num, from_date, to_date):
+    _, rows = display_other_times(db, booking_num, from_date, to_date, None, None, None)[0]
+    return [(['date', 'start_hour'], [row[2:] for row in rows])]
+
+
+FIND_ROOMS = """SELECT rooms.building, rooms.room_number, rooms.capacity FROM rooms
+                    JOIN timeslots ON rooms.room_number = timeslots.room_number AND rooms.building = timeslots.building_name
+                    WHERE rooms.capacity >= ? AND rooms.ada = ? AND rooms.projector = ? AND rooms.club_only = ?
+                        AND timeslots.start_hour = ?
+                        AND rooms.building IN (SELECT name FROM buildings WHERE buildings.campus = ?)
+                        AND NOT EXISTS (SELECT * FROM bookings WHERE bookings.building_name = rooms.building
+                                            AND bookings.room_number = rooms.room_number
+                                            AND bookings.date = ? AND bookings.start_hour = ?)"""
+
+
+def find_room_with_criteria(db, cap, p_ada, time, day, p_projector, club, p_campus):
+    return [_select(db, FIND_ROOMS, (cap, p_ada, p_projector, club, time, p_campus, day, time))]
+
+
+def find_room_page(db, cap, p_ada, time, day, p_projector, club, p_campus, after_capacity, after_building,
+                   after_room, page_size):
+    return [_select(db, FIND_ROOMS + """
+                        AND (? IS NULL OR (rooms.capacity, rooms.building, rooms.room_number) > (?, ?, ?))
+                    ORDER BY rooms.capacity, rooms.building, rooms.room_number
+                    LIMIT ?""",
+                    (cap, p_ada, p_projector, club, time, p_campus, day, time,
+                     after_capacity, after_capacity, after_building, after_room, page_size))]
+
+
+def create_booking(db, user_nuid, r_num, b_name, s_hour, day, org_name):
+    try:
+        cur = db.execute("""INSERT INTO bookings(nuid, room_number, building_name, start_hour, date, organization_name)
+                                VALUES(?, ?, ?, ?, ?, ?)""", (user_nuid, r_num, b_name, s_hour, day, org_name))
+    except sqlite3.IntegrityError as e:
+        return [_row(status='conflict' if _is_duplicate(e) else 'invalid', booking_id=None)]
+    return [_row(status='created', booking_id=cur.lastrowid)]
+
+
+def delete_booking(db, booking_num):
+    db.execute("""DELETE FROM bookings WHERE booking_id = ?
+                      AND NOT EXISTS (SELECT * FROM signs_in WHERE signs_in.booking_id = ?)""",
+               (booking_num, booking_num))
+    return []
+
+
+def validate_booking_num(db, booking_num):
+    return [_select(db, 'SELECT * FROM bookings WHERE booking_id = ?', (booking_num,))]
+
+
+def check_into_room(db, booking_num, user_nuid):
+    db.execute("""INSERT INTO signs_in(nuid, booking_id) SELECT ?, ?
+                      WHERE NOT EXISTS (SELECT * FROM signs_in WHERE booking_id = ?)""",
+               (user_nuid, booking_num, booking_num))
+    return []
+
+
+def create_user(db, user_name, user_nuid):
+    db.execute("""INSERT INTO students(name, nuid) SELECT ?, ?
+                      WHERE NOT EXISTS (SELECT * FROM students WHERE nuid = ?)""", (user_name, user_nuid, user_nuid))
+    return []
+
+
+def add_club_officer(db, user_nuid, club_name):
+    db.execute("""INSERT INTO club_officer(nuid, organization_name) SELECT ?, ?
+                      WHERE NOT EXISTS (SELECT * FROM club_officer WHERE nuid = ? AND organization_name = ?)""",
+               (user_nuid, club_name, user_nuid, club_name))
+    return []
+
+
+def get_room_timeslots(db):
+    return [_select(db, """SELECT rooms.building, rooms.room_number, rooms.capacity, rooms.ada, rooms.projector,
+                                  rooms.club_only, buildings.campus, timeslots.start_hour
+                               FROM rooms
+                                   JOIN buildings ON rooms.building = buildings.name
+                                   JOIN timeslots ON rooms.room_number = timeslots.room_number
+                                       AND rooms.building = timeslots.building_name""")]
+
+
+def get_bookings_since(db, day):
+    return [_select(db, 'SELECT building_name, room_number, date, start_hour FROM bookings WHERE date >= ?', (day,))]
+
+
+def update_user_booking(db, user_nuid, booking_num, booking_date, booking_time, expected_version):
+    status = 'updated'
+    booking = db.execute("""SELECT building_name, room_number, date, start_hour, version FROM bookings
+                                WHERE booking_id = ? AND nuid = ?""", (booking_num, user_nuid)).fetchone()
+    b_name, r_num, old_date, old_hour, old_version = booking if booking is not None else (None,) * 5
+    if booking is None:
+        status = 'not_found'
+    elif expected_version is not None and expected_version != old_version:
+        status = 'stale'
+    elif (booking_date is None or str(booking_date) == old_date) and (booking_time is None or booking_time == old_hour):
+        # dates are ISO text in SQLite, str() of a date is its ISO form
+        status = 'unchanged'
+    else:
+        try:
+            cur = db.execute("""UPDATE bookings SET date = IFNULL(?, ?), start_hour = IFNULL(?, ?), version = version + 1
+                                    WHERE booking_id = ? AND nuid = ? AND version = ?""",
+                             (booking_date, old_date, booking_time, old_hour, booking_num, user_nuid, old_version))
+            if cur.rowcount == 0:
+                status = 'stale'
+        except sqlite3.IntegrityError as e:
+            status = 'conflict' if _is_duplicate(e) else 'invalid'
+    return [_row(status=status, building_name=b_name, room_number=r_num, old_date=old_date, old_hour=old_hour,
+                 new_date=booking_date if booking_date is not None else old_date,
+                 new_hour=booking_time if booking_time is not None else old_hour,
+                 version=old_version + 1 if status == 'updated' else old_version)]
+
+
+def delete_user_booking(db, user_nuid, booking_num):
+    status = 'deleted'
+    booking = db.execute("""SELECT building_name, room_number, date, start_hour FROM bookings
+                                WHERE booking_id = ? AND nuid = ?""", (booking_num, user_nuid)).fetchone()
+    b_name, r_num, b_date, b_hour = booking if booking is not None else (None,) * 4
+    if booking is None:
+        status = 'not_found'
+    elif db.execute('SELECT 1 FROM signs_in WHERE booking_id = ?', (booking_num,)).fetchone() is not None:
+        status = 'signed_in'
+    else:
+        db.execute('DELETE FROM bookings WHERE booking_id = ?', (booking_num,))
+    return [_row(status=status, building_name=b_name, room_number=r_num, date=b_date, start_hour=b_hour)]
+
+
+def check_into_user_booking(db, user_nuid, booking_num):
+    try:
+        cur = db.execute("""INSERT INTO signs_in(nuid, booking_id)
+                                SELECT nuid, booking_id FROM bookings WHERE booking_id = ? AND nuid = ?""",
+                         (booking_num, user_nuid))
+    except sqlite3.IntegrityError:
+        return [_row(status='already_signed_in')]
+    return [_row(status='signed_in' if cur.rowcount > 0 else 'not_found')]
+
+
+def get_reference_data(db):
+    return [_select(db, 'SELECT name FROM campuses'),
+            _select(db, 'SELECT name, campus FROM buildings'),
+            _select(db, 'SELECT name FROM organizations'),
+            _select(db, 'SELECT building, room_number, capacity, ada, projector, club_only FROM rooms')]
+
+
+def create_bookings_batch(db, user_nuid, r_num, b_name, org_name, slots, all_or_nothing):
+    requested = sorted({(_date(slot['date']), int(slot['hour'])) for slot in json.loads(slots)})
+    hours = {row[0] for row in db.execute('SELECT start_hour FROM timeslots WHERE room_number = ? AND building_name = ?',
+                                          (r_num, b_name))}
+    results = {}
+    for date, hour in requested:
+        if hour not in hours:
+            results[(date, hour)] = ('invalid', None)
+            continue
+        existing = db.execute("""SELECT booking_id FROM bookings
+                                     WHERE room_number = ? AND building_name = ? AND start_hour = ? AND date = ?""",
+                              (r_num, b_name, hour, date)).fetchone()
+        results[(date, hour)] = ('conflict', existing[0]) if existing is not None else ('pending', None)
+
+    if all_or_nothing and any(status != 'pending' for status, _ in results.values()):
+        results = {slot: ('skipped', None) if status == 'pending' else (status, booking_id)
+                   for slot, (status, booking_id) in results.items()}
+    else:
+        for (date, hour), (status, _) in results.items():
+            if status != 'pending':
+                continue
+            created = create_booking(db, user_nuid, r_num, b_name, hour, date, org_name)[0][1][0]
+            results[(date, hour)] = created
+    return [(['date', 'start_hour', 'status', 'booking_id'],
+             [(date, hour, status, booking_id) for (date, hour), (status, booking_id) in sorted(results.items())])]
+
+
+def check_into_bookings_batch(db, scans):
+    distinct = {}
+    for scan in json.loads(scans):
+        distinct.setdefault(scan['booking_id'], scan['nuid'])
+    rows = []
+    for booking_id, nuid in sorted(distinct.items()):
+        rows.append((booking_id, nuid, check_into_user_booking(db, nuid, booking_id)[0][1][0][0]))
+    return [(['booking_id', 'nuid', 'status'], rows)]
+
+
+def get_stale_usage_dates(db):
+    return [_select(db, 'SELECT date FROM usage_stale_dates ORDER BY date')]
+
+
+def get_usage_watermark(db):
+    return [_select(db, """SELECT (SELECT through_date FROM report_watermark WHERE name = 'usage') AS through_date,
+                                  (SELECT MIN(date) FROM bookings) AS first_date""")]
+
+
+def summarize_usage_day(db, day):
+    day_bookings = """SELECT bookings.building_name, bookings.room_number, bookings.start_hour,
+                             signs_in.booking_id IS NOT NULL AS signed_in
+                          FROM bookings LEFT JOIN signs_in ON signs_in.booking_id = bookings.booking_id
+                          WHERE bookings.date = :day"""
+    db.execute('DELETE FROM usage_stale_dates WHERE date = :day', {'day': day})
+    db.execute('DELETE FROM room_day_usage WHERE date = :day', {'day': day})
+    db.execute("""INSERT INTO room_day_usage(date, building_name, room_number, booked_hours, signed_in_hours)
+                      SELECT :day, building_name, room_number, COUNT(*), SUM(signed_in)
+                          FROM (%s) GROUP BY building_name, room_number""" % day_bookings, {'day': day})
+    db.execute('DELETE FROM hourly_demand WHERE date = :day', {'day': day})
+    db.execute("""INSERT INTO hourly_demand(date, campus, start_hour, bookings, signed_in)
+                      SELECT :day, buildings.campus, usage_day.start_hour, COUNT(*), SUM(usage_day.signed_in)
+                          FROM (%s) AS usage_day JOIN buildings ON usage_day.building_name = buildings.name
+                          GROUP BY buildings.campus, usage_day.start_hour""" % day_bookings, {'day': day})
+    db.execute("""INSERT INTO report_watermark(name, through_date) VALUES ('usage', :day)
+                      ON CONFLICT(name) DO UPDATE SET through_date = MAX(through_date, excluded.through_date),
+                                                      updated_at = CURRENT_TIMESTAMP""", {'day': day})
+    return [_select(db, 'SELECT COUNT(*) AS bookings FROM bookings WHERE date = ?', (day,))]
+
+
+PROCEDURES = {procedure.__name__: procedure for procedure in [
+    validate_student, get_user_bookings, get_booking_version, update_booking, display_other_times, list_free_times,
+    find_room_with_criteria, find_room_page, create_booking, delete_booking, validate_booking_num, check_into_room,
+    create_user, add_club_officer, get_room_timeslots, get_bookings_since, update_user_booking, delete_user_booking,
+    check_into_user_booking, get_reference_data, create_bookings_batch, check_into_bookings_batch,
+    get_stale_usage_dates, get_usage_watermark, summarize_usage_day]}
+
+# procedures that write, their transactions take the write lock up front instead of upgrading to it midway
+WRITES = frozenset(['update_booking', 'create_booking', 'delete_booking', 'check_into_room', 'create_user',
+                    'add_club_officer', 'update_user_booking', 'delete_user_booking', 'check_into_user_booking',
+                    'create_bookings_batch', 'check_into_bookings_batch', 'summarize_usage_day'])
+
+
+class SQLiteCursor:
+    def __init__(self, connection: 'SQLiteConnection', dict_rows: bool = True):
+        self.connection = connection
+        self._dict_rows = dict_rows
+        self._result_sets = []
+        self._rows = []
+        self._position = 0
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Makes the next result set current, its rows converted to dicts (or tuples) with dates parsed
+    def _next_result(self) -> bool:
+        if not self._result_sets:
+            self.description = None
+            self._rows = []
+            return False
+        columns, rows = self._result_sets.pop(0)
+        dates = [i for i, column in enumerate(columns) if column in DATE_COLUMNS]
+        if dates:
+            rows = [tuple(_date(value) if i in dates else value for i, value in enumerate(row)) for row in rows]
+        self._rows = [dict(zip(columns, row)) for row in rows] if self._dict_rows else [tuple(row) for row in rows]
+        self._position = 0
+        self.description = tuple((column, None, None, None, None, None, None) for column in columns)
+        return True
+
+    def callproc(self, procname: str, args=()):
+        procedure = PROCEDURES.get(procname)
+        if procedure is None:
+            raise pymysql.err.ProgrammingError(1305, 'PROCEDURE final_project.%s does not exist' % procname)
+        db = self.connection.db
+        self.connection.begin(procname in WRITES)
+        before = db.total_changes
+        try:
+            self._result_sets = list(procedure(db, *args))
+        except sqlite3.Error as e:
+            raise mysql_error(e) from e
+        changes = db.total_changes - before
+        self._next_result()
+        self.rowcount = len(self._rows) if self.description is not None else changes
+        return args
+
+    # Runs one SQL statement, written with pymysql's %s / %(name)s placeholders
+    def execute(self, query: str, args=None):
+        if query.lstrip().upper().startswith('SET '):
+            return 0
+        query = re.sub(r'%\((\w+)\)s', r':\1', query).replace('%s', '?').replace('%%', '%')
+        self.connection.begin(not query.lstrip().upper().startswith(('SELECT', 'WITH')))
+        try:
+            cur = self.connection.db.execute(query, args if args is not None else ())
+        except sqlite3.Error as e:
+            raise mysql_error(e) from e
+        self.lastrowid = cur.lastrowid
+        self._result_sets = [([column[0] for column in cur.description], cur.fetchall())] if cur.description else []
+        self._next_result()
+        self.rowcount = len(self._rows) if self.description is not None else cur.rowcount
+        return self.rowcount
+
+    def nextset(self):
+        return True if self._next_result() else None
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size: int = None):
+        size = size or 1
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    def fetchall_unbuffered(self):
+        return iter(self.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self) -> None:
+        self._result_sets = []
+        self._rows = []
+
+
+class SQLiteConnection:
+    def __init__(self, path: str, timeout: float = 30.0):
+        # autocommit mode, transactions are started explicitly by begin()
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        # used by bench.py to sample rows, the seed is ignored
+        self.db.create_function('RAND', -1, lambda *seed: random.random())
+
+    # Cursors return dicts unless a non-dict pymysql cursor class is asked for
+    def cursor(self, cursorclass=None) -> SQLiteCursor:
+        dict_rows = cursorclass is None or issubclass(cursorclass, pymysql.cursors.DictCursorMixin)
+        return SQLiteCursor(self, dict_rows)
+
+    # Starts a transaction if none is open; writers take the database write lock right away
+    def begin(self, write: bool = False) -> None:
+        if not self.db.in_transaction:
+            try:
+                self.db.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            except sqlite3.Error as e:
+                raise mysql_error(e) from e
+
+    def commit(self) -> None:
+        if self.db.in_transaction:
+            self.db.execute('COMMIT')
+
+    def rollback(self) -> None:
+        if self.db.in_transaction:
+            self.db.execute('ROLLBACK')
+
+    def ping(self, reconnect: bool = True) -> None:
+        pass
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class SQLiteBackend:
+    # path is the database file, a temporary file (removed by close()) if not given
+    # data_dir holds the roomGenerator.py output; campuses, buildings and organizations come from this repo's CSVs
+    # An existing database file at path is used as is
+    def __init__(self, path: str = None, data_dir: str = DATA_DIR):
+        self.temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='final_project_', suffix='.db')
+            os.close(fd)
+        self.path = path
+
+        db = sqlite3.connect(path, isolation_level=None)
+        try:
+            if db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'bookings'").fetchone()[0] == 0:
+                db.execute('PRAGMA journal_mode = WAL')
+                db.executescript(SCHEMA)
+                self.load_csvs(db, data_dir)
+                db.executescript(TRIGGERS)
+        finally:
+            db.close()
+
+    # Loads every CSV bulk_load.py would, in one transaction
+    # Returns a list of (table, file, rows)
+    @staticmethod
+    def load_csvs(db, data_dir: str) -> list:
+        results = []
+        db.execute('BEGIN')
+        for table, filename, reference in TABLES:
+            path = os.path.join(DATA_DIR if reference else data_dir, filename)
+            if not os.path.exists(path):
+                continue
+            for header, rows in read_csv(path):
+                cur = db.executemany('INSERT INTO %s (%s) VALUES (%s)'
+                                     % (table, ', '.join(header), ', '.join(['?'] * len(header))), rows)
+                results.append((table, filename, cur.rowcount))
+        db.execute('COMMIT')
+        return results
+
+    def connect(self) -> SQLiteConnection:
+        return SQLiteConnection(self.path)
+
+    # Returns a ConnectionPool of connections to this database
+    def pool(self, **pool_kwargs) -> ConnectionPool:
+        return ConnectionPool(host=None, user=None, password=None, database=self.path, connect=self.connect,
+                              **pool_kwargs)
+
+    # Deletes the database file if it is a temporary one
+    def close(self) -> None:
+        if self.temporary:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,96 @@
+#!usr/bin/env python
+import argparse
+import getpass as gp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from booking_service import BookingService, BookingError, BookingConflict
+
+# Concurrency stress test for create_booking
+# Many workers try to book the same (room, start hour, date) at the same moment. Exactly one of them must
+# get a booking id, every other one must see a clean conflict, and no worker may fail with any other error.
+# The winning booking is deleted afterwards so the script can be re-run.
+#
+# usage: python stress.py --user root --nuid 1234 --room 101 --building "Richards Hall" --hour 9 --date 2030-01-07
+
+
+# Runs one round of the stress test, returns (booking ids created, conflicts, other errors)
+def hammer_slot(service: BookingService, nuid: int, room_number: int, building_name: str, start_hour: int,
+                date: str, workers: int):
+    created, conflicts, errors = [], 0, []
+    lock = threading.Lock()
+    # release every worker at once so the inserts really race
+    start_line = threading.Barrier(workers)
+
+    def worker() -> None:
+        nonlocal conflicts
+        user = service.for_user(nuid)
+        start_line.wait()
+        try:
+            booking_id = user.create_booking(room_number, building_name, start_hour, date)
+            with lock:
+                created.append(booking_id)
+        except BookingConflict:
+            with lock:
+                conflicts += 1
+        except BookingError as e:
+            with lock:
+                errors.append(str(e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker) for _ in range(workers)]
+    # anything else a worker raised (a pool timeout, a broken barrier, a bug) is an error of the round too
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            errors.append('%s: %s' % (type(e).__name__, e))
+    return created, conflicts, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Hammer one booking slot from many concurrent workers')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--nuid', type=int, required=True)
+    parser.add_argument('--room', type=int, required=True)
+    parser.add_argument('--building', required=True)
+    parser.add_argument('--hour', type=int, required=True)
+    parser.add_argument('--date', required=True)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    password = os.environ.get('FINAL_PROJECT_DB_PASSWORD') or gp.getpass("Enter DB password: \n")
+    service = BookingService.connect(host=args.host, user=args.user, password=password,
+                                     max_size=args.workers, acquire_timeout=60)
+    failed = False
+    try:
+        for round_num in range(1, args.rounds + 1):
+            start = time.perf_counter()
+            created, conflicts, errors = hammer_slot(service, args.nuid, args.room, args.building,
+                                                     args.hour, args.date, args.workers)
+            elapsed = time.perf_counter() - start
+            print('round %d: %d created, %d conflicts, %d errors in %.3fs'
+                  % (round_num, len(created), conflicts, len(errors), elapsed))
+            for error in errors:
+                print('  error:', error)
+            if len(created) != 1 or len(errors) != 0:
+                failed = True
+            # clean up so the next round races for a free slot again
+            for booking_id in created:
+                service.for_user(args.nuid).delete_booking(booking_id)
+    finally:
+        service.close()
+
+    if failed:
+        print('FAILED: expected exactly one booking and no errors per round')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+import os
+
+import pymysql
+import pytest
+
+
+# A connection to the final_project database on a real server, skipped when none is reachable
+# Connects with FINAL_PROJECT_DB_HOST / FINAL_PROJECT_DB_USER / FINAL_PROJECT_DB_PASSWORD
+@pytest.fixture
+def cxn():
+    try:
+        cxn = pymysql.connect(host=os.environ.get('FINAL_PROJECT_DB_HOST', 'localhost'),
+                              user=os.environ.get('FINAL_PROJECT_DB_USER', 'root'),
+                              password=os.environ.get('FINAL_PROJECT_DB_PASSWORD', ''),
+                              database='final_project', charset='utf8mb4', local_infile=True, connect_timeout=2)
+    except pymysql.err.MySQLError as e:
+        pytest.skip('no MySQL server: %s' % (e,))
+    yield cxn
+    cxn.close()
@@ -0,0 +1,99 @@
+import datetime
+import os
+import subprocess
+import sys
+
+import pytest
+
+from booking_service import BookingService, BookingError, BookingConflict, weekly_slots
+from sqlite_backend import SQLiteBackend
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NUID = 1000000
+OTHER_NUID = 1000001
+# generated rooms have timeslots from 8:00 on
+ROOM, BUILDING, HOUR = 101, 'Richards Hall', 9
+DAY = datetime.date(2030, 1, 7)
+
+
+# A small generated dataset, rooms and students only, shared by every test
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp('data')
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'roomGenerator.py'), '--seed', '1', '--students', '20',
+                    '--out-dir', str(out_dir)], check=True, stdout=subprocess.DEVNULL)
+    return str(out_dir)
+
+
+# A fresh embedded database per test, with a service signed in as NUID
+@pytest.fixture
+def service(data_dir):
+    backend = SQLiteBackend(data_dir=data_dir)
+    service = BookingService(backend.pool(max_size=2), NUID)
+    service.use_reference_cache()
+    yield service
+    service.close()
+    backend.close()
+
+
+def test_create_booking_and_double_book(service):
+    booking_id = service.create_booking(ROOM, BUILDING, HOUR, DAY)
+    assert [row['booking_id'] for row in service.get_bookings()] == [booking_id]
+
+    with pytest.raises(BookingConflict):
+        service.for_user(OTHER_NUID).create_booking(ROOM, BUILDING, HOUR, DAY)
+    assert service.for_user(OTHER_NUID).get_bookings() == []
+
+
+def test_update_booking_with_stale_version(service):
+    booking_id = service.create_booking(ROOM, BUILDING, HOUR, DAY)
+    listed = service.get_bookings()[0]
+
+    assert service.update_booking(booking_id, DAY + datetime.timedelta(days=1), None, listed['version'])
+    # the version listed before the move is stale now
+    with pytest.raises(BookingConflict):
+        service.update_booking(booking_id, DAY + datetime.timedelta(days=2), None, listed['version'])
+
+    moved = service.get_bookings()[0]
+    assert (moved['date'], moved['version']) == (DAY + datetime.timedelta(days=1), listed['version'] + 1)
+    assert not service.update_booking(booking_id, None, None, moved['version'])
+
+
+def test_delete_booking(service):
+    booking_id = service.create_booking(ROOM, BUILDING, HOUR, DAY)
+    with pytest.raises(BookingError):
+        service.for_user(OTHER_NUID).delete_booking(booking_id)
+
+    service.delete_booking(booking_id)
+    assert service.get_bookings() == []
+    # the slot is free again
+    service.for_user(OTHER_NUID).create_booking(ROOM, BUILDING, HOUR, DAY)
+
+
+def test_create_bookings_batch(service):
+    taken = service.for_user(OTHER_NUID).create_booking(ROOM, BUILDING, HOUR, DAY + datetime.timedelta(weeks=1))
+    results = service.create_bookings(ROOM, BUILDING, weekly_slots(DAY, [HOUR], 3))
+    assert [(result['date'], result['status']) for result in results] == [
+        (DAY, 'created'), (DAY + datetime.timedelta(weeks=1), 'conflict'), (DAY + datetime.timedelta(weeks=2), 'created')]
+    assert results[1]['booking_id'] == taken
+    assert len(service.get_bookings()) == 2
+
+    with pytest.raises(BookingConflict):
+        service.create_bookings(ROOM, BUILDING, weekly_slots(DAY + datetime.timedelta(weeks=1), [HOUR + 1, HOUR], 1),
+                                all_or_nothing=True)
+    assert len(service.get_bookings()) == 2
+
+
+def test_sign_into_bookings_batch(service):
+    mine = service.create_booking(ROOM, BUILDING, HOUR, DAY)
+    theirs = service.for_user(OTHER_NUID).create_booking(ROOM, BUILDING, HOUR + 1, DAY)
+    service.sign_into_booking(mine)
+
+    results = service.sign_into_bookings([(theirs, OTHER_NUID), (mine, NUID), (theirs, OTHER_NUID),
+                                          (theirs, NUID), (999999, NUID)])
+    assert [(result['booking_id'], result['status']) for result in results] == [
+        (theirs, 'signed_in'), (mine, 'already_signed_in'), (999999, 'not_found')]
+    # signed into bookings cannot be deleted
+    with pytest.raises(BookingError):
+        service.for_user(OTHER_NUID).delete_booking(theirs)
@@ -0,0 +1,21 @@
+import io
+
+from bulk_load import load_data_infile, write_load_data
+
+
+def test_load_data_file_uses_bare_null_marker():
+    file = io.StringIO()
+    write_load_data(file, [[1, None, 'back\\slash', 'tab\there', 'two\nlines']])
+    assert file.getvalue() == '1\t\\N\tback\\\\slash\ttab\\there\ttwo\\nlines\n'
+
+
+# Round trip through a real server (the cxn fixture in conftest.py), skipped when none is reachable
+def test_load_data_reads_back_null(cxn):
+    with cxn.cursor() as cur:
+        cur.execute('CREATE TEMPORARY TABLE load_data_test(id int, organization_name VARCHAR(64), note VARCHAR(64))')
+        count = load_data_infile(cur, 'load_data_test', ['id', 'organization_name', 'note'],
+                                 [[1, None, 'a\\b\tc'], [2, 'Generate', None]])
+        cur.execute('SELECT id, organization_name, note FROM load_data_test ORDER BY id')
+        rows = cur.fetchall()
+    assert count == 2
+    assert rows == ((1, None, 'a\\b\tc'), (2, 'Generate', None))
@@ -0,0 +1,143 @@
+import datetime
+import json
+import os
+import re
+
+import pymysql
+import pytest
+
+# Query plan regression test
+# Calls every stored procedure in finalProject.sql with real ids from the loaded database and reads back, from the
+# performance schema, each statement the procedure (and the triggers and functions it set off) ran: any statement
+# that read a table without an index and examined at least MIN_ROWS rows fails the test. The statements are the
+# procedure bodies themselves, so there is no second copy of the SQL to keep in sync.
+# Every call runs in a transaction that is rolled back. Load a scaled dataset first (roomGenerator.py + the bulk
+# loader): small tables are always scanned by MySQL, and a database without bookings skips the test.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# statements examining fewer rows than this are not reported, whatever their plan
+MIN_ROWS = 1000
+
+# stored programs that scan by design, and why
+ALLOWED_SCANS = {
+    'get_room_timeslots': 'reads every timeslot, to load the availability index',
+    'get_reference_data': 'reads every campus, building, organization and room, to load the reference cache',
+    'rebuild_room_availability': 'builds every room and timeslot of the dates it is given',
+    'summarize_usage_day': "groups its temporary table of the day's bookings",
+}
+
+
+# (procedure, arguments) for every call the test makes, from the sample booking of sample_parameters()
+def procedure_calls(p: dict) -> list:
+    next_day = p['date'] + datetime.timedelta(days=1)
+    return [
+        ('validate_student', [p['nuid']]),
+        ('get_user_bookings', [p['nuid']]),
+        ('get_booking_version', [p['nuid']]),
+        ('validate_booking_num', [p['booking_id']]),
+        ('get_bookings_since', [p['date']]),
+        ('display_other_times', [p['booking_id'], None, None, None, None, None]),
+        ('list_free_times', [p['booking_id'], None, None]),
+        ('find_room_with_criteria', [10, True, p['start_hour'], p['date'], True, False, p['campus']]),
+        ('find_room_page', [10, True, p['start_hour'], p['date'], True, False, p['campus'], None, None, None, 10]),
+        # a later page, after the sample booking's room
+        ('find_room_page', [10, True, p['start_hour'], p['date'], True, False, p['campus'],
+                            p['capacity'], p['building_name'], p['room_number'], 10]),
+        ('create_booking', [p['nuid'], p['room_number'], p['building_name'], p['start_hour'], next_day, None]),
+        ('create_bookings_batch', [p['nuid'], p['room_number'], p['building_name'], None,
+                                   json.dumps([{'date': next_day.isoformat(), 'hour': p['start_hour']}]), False]),
+        ('update_booking', [p['booking_id'], next_day, None]),
+        ('update_user_booking', [p['nuid'], p['booking_id'], next_day, None, None]),
+        ('check_into_room', [p['booking_id'], p['nuid']]),
+        ('check_into_user_booking', [p['nuid'], p['booking_id']]),
+        ('check_into_bookings_batch', [json.dumps([{'booking_id': p['booking_id'], 'nuid': p['nuid']}])]),
+        ('delete_booking', [p['booking_id']]),
+        ('delete_user_booking', [p['nuid'], p['booking_id']]),
+        ('create_user', ['Plan Check', 2147483647]),
+        ('add_club_officer', [p['nuid'], 'Generate']),
+        ('get_room_timeslots', []),
+        ('get_reference_data', []),
+        ('archive_bookings', [p['date'], 100]),
+        ('rebuild_room_availability', [next_day, next_day]),
+        ('get_stale_usage_dates', []),
+        ('get_usage_watermark', []),
+        ('summarize_usage_day', [p['date']]),
+    ]
+
+
+# The names of the procedures finalProject.sql defines
+def defined_procedures() -> set:
+    with open(os.path.join(REPO_DIR, 'finalProject.sql')) as file:
+        return set(re.findall(r'^CREATE PROCEDURE (\w+)', file.read(), re.MULTILINE))
+
+
+# Picks a real booking (and its student, room, capacity and campus) to call the procedures with
+def sample_parameters(cur) -> dict:
+    cur.execute("""SELECT bookings.booking_id, bookings.nuid, bookings.room_number, bookings.building_name,
+                          bookings.date, bookings.start_hour, buildings.campus, rooms.capacity
+                       FROM bookings JOIN buildings ON bookings.building_name = buildings.name
+                           JOIN rooms ON bookings.room_number = rooms.room_number AND bookings.building_name = rooms.building
+                   ORDER BY bookings.booking_id DESC LIMIT 1""")
+    return cur.fetchone()
+
+
+# Turns on the statement history the test reads, skips the test if that is not allowed
+def enable_statement_history(cur) -> None:
+    try:
+        cur.execute("""UPDATE performance_schema.setup_consumers SET ENABLED = 'YES'
+                           WHERE NAME = 'events_statements_history_long'""")
+        cur.execute("UPDATE performance_schema.setup_instruments SET ENABLED = 'YES' WHERE NAME LIKE 'statement/%'")
+    except pymysql.err.MySQLError as e:
+        pytest.skip('cannot enable the performance schema statement history: %s' % (e,))
+
+
+# Returns the last statement event id of this connection
+def last_event_id(cur) -> int:
+    cur.execute("""SELECT IFNULL(MAX(EVENT_ID), 0) AS event_id FROM performance_schema.events_statements_history_long
+                       WHERE THREAD_ID = PS_CURRENT_THREAD_ID()""")
+    return cur.fetchone()['event_id']
+
+
+# Returns (stored program, statement, rows examined) for every statement run inside a stored program since
+# event_id that read a table without an index
+def unindexed_statements(cur, event_id: int) -> list:
+    cur.execute("""SELECT OBJECT_NAME, SQL_TEXT, ROWS_EXAMINED FROM performance_schema.events_statements_history_long
+                       WHERE THREAD_ID = PS_CURRENT_THREAD_ID() AND EVENT_ID > %s AND NESTING_EVENT_ID IS NOT NULL
+                           AND (NO_INDEX_USED = 1 OR SELECT_SCAN > 0 OR SELECT_FULL_JOIN > 0)""", (event_id,))
+    return [(row['OBJECT_NAME'], row['SQL_TEXT'], row['ROWS_EXAMINED']) for row in cur.fetchall()]
+
+
+def test_every_procedure_is_checked():
+    # a fake booking is enough to list the calls
+    called = {procedure for procedure, _ in procedure_calls({'booking_id': 1, 'nuid': 1, 'room_number': 101,
+                                                              'building_name': '', 'date': datetime.date.today(),
+                                                              'start_hour': 9, 'campus': '', 'capacity': 10})}
+    assert called == defined_procedures()
+
+
+def test_no_full_scans(cxn):
+    failures = []
+    with cxn.cursor(pymysql.cursors.DictCursor) as cur:
+        params = sample_parameters(cur)
+        if params is None:
+            pytest.skip('the bookings table is empty, load a dataset first')
+        enable_statement_history(cur)
+        cxn.commit()
+
+        for procedure, args in procedure_calls(params):
+            event_id = last_event_id(cur)
+            try:
+                cur.callproc(procedure, args)
+                while cur.nextset():
+                    pass
+            except pymysql.err.IntegrityError:
+                # e.g. the legacy update_booking finding the next day's slot taken, what ran is still recorded
+                pass
+            finally:
+                cxn.rollback()
+            for program, statement, rows in unindexed_statements(cur, event_id):
+                if program not in ALLOWED_SCANS and rows >= MIN_ROWS:
+                    failures.append('%s (called from %s) examined %d rows: %s'
+                                    % (program, procedure, rows, ' '.join(statement.split())))
+    assert failures == []